@@ -4,17 +4,48 @@ import json
 import time
 import enum
 import tempfile
-from typing import List, Dict, Any, Optional
+import multiprocessing
+import subprocess
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 import requests
-from PIL import Image
-from io import BytesIO
-from langdetect import detect, DetectorFactory
-from pydantic import BaseModel, field_validator
 from google import genai
 import pandas as pd
 import numpy as np
 from pathlib import Path 
 
+from models import usage_type, District, City, Address, PropertyDetails, PublicNotice, COPIES_FIELD, SOURCE_TEXT_FIELD
+from pipeline import (
+    DEFAULT_MODEL_ID,
+    DEFAULT_MAX_WORKERS,
+    MAX_WORKERS_LIMIT,
+    DEFAULT_RERANK_CANDIDATES,
+    DEFAULT_PIPELINE_MODE,
+    FUSED,
+    PIPELINE_MODES,
+    extract_notice_cached,
+    rerank_candidates as rerank_with_gemini,
+)
+from result_cache import ResultCache
+from search_index import AddressIndex, compact_address
+from fielded_search import FieldedQueryEngine, MATCH_MODES
+from trigram_index import TrigramIndex
+from land_records import ParcelIndex
+from store import PropertyStore, SUMMARY_COLUMNS, SUMMARY_SORTS
+from exporter import EXPORT_FORMATS, LAST_EXPORT_META, export_file_name, export_store, write_export
+from importer import ImportReport, import_database
+from gemini_client import RateLimitedClient
+from preprocess import OUTPUT_FORMATS, PreprocessOptions
+from segmentation import split_upload
+from dedup import DUPLICATE_OF_FIELD, is_duplicate
+from watchlist import ALERT_STATES, NEW, REVIEWED, Watchlist
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, api_key_id
+from normalize import derived_fields, normalize_record
+from overlay import OverlayDatabase, OverlayIndex, SharedDatabase, SEARCH_INDEX_TYPES
+from snapshot import DEFAULT_SNAPSHOT_PATH
+
 # Set page configuration
 st.set_page_config(
     page_title="HeyThatsMyLand - Continuous Monitoring",
@@ -23,172 +54,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize langdetect with seed for reproducible results
-DetectorFactory.seed = 0
-
-# Define enums for data validation
-class usage_type(enum.Enum):
-    RESIDENTIAL = "Residential"
-    COMMERCIAL = "Commercial"
-    INDUSTRIAL = "Industrial"
-    AGRICULTURAL = "Agricultural"
-    OTHER = "Other"
-
-class District(enum.Enum):
-    AKOLA = "Akola"
-    AMRAVATI = "Amravati"
-    BULDHANA = "Buldhana"
-    YAVATMAL = "Yavatmal"
-    WASHIM = "Washim"
-    AURANGABAD = "Aurangabad"
-    BEED = "Beed"
-    JALNA = "Jalna"
-    OSMANABAD = "Osmanabad"
-    NANDED = "Nanded"
-    LATUR = "Latur"
-    PARBHANI = "Parbhani"
-    HINGOLI = "Hingoli"
-    BOMBAY = "Mumbai City / Suburban"
-    BOMBAY_SUBURBAN = "Mumbai City / Suburban"
-    MUMBAI_CITY = "Mumbai City / Suburban"
-    MUMBAI_SUBURBAN = "Mumbai City / Suburban"
-    THANE = "Thane"
-    PALGHAR = "Palghar"
-    RAIGAD = "Raigad"
-    RATNAGIRI = "Ratnagiri"
-    SINDHUDURG = "Sindhudurg"
-    BHANDARA = "Bhandara"
-    CHANDRAPUR = "Chandrapur"
-    GADCHIROLI = "Gadchiroli"
-    GONDIA = "Gondia"
-    NAGPUR = "Nagpur"
-    WARDHA = "Wardha"
-    AHMEDNAGAR = "Ahmednagar"
-    DHULE = "Dhule"
-    JALGAON = "Jalgaon"
-    NANDURBAR = "Nandurbar"
-    NASHIK = "Nashik"
-    SANGLI = "Sangli"
-    SATARA = "Satara"
-    SOLAPUR = "Solapur"
-    KOLHAPUR = "Kolhapur"
-    PUNE = "Pune"
-    NA = "n/a"
-
-class City(enum.Enum):
-    MUMBAI = "Mumbai"
-    PUNE = "Pune"
-    NAGPUR = "Nagpur"
-    THANE = "Thane"
-    PIMPRI_CHINCHWAD = "Pimpri-Chinchwad"
-    NASHIK = "Nashik"
-    KALYAN_DOMBIVLI = "Kalyan-Dombivli"
-    VASAI_VIRAR = "Vasai-Virar"
-    AURANGABAD = "Aurangabad"
-    NAVI_MUMBAI = "Navi Mumbai"
-    SOLAPUR = "Solapur"
-    MIRA_BHAYANDAR = "Mira-Bhayandar"
-    JALGAON = "Jalgaon"
-    DHULE = "Dhule"
-    AMRAVATI = "Amravati"
-    NANDED_WAGHALA = "Nanded-Waghala"
-    KOLHAPUR = "Kolhapur"
-    ULHASNAGAR = "Ulhasnagar"
-    SANGLI = "Sangli"
-    MALEGAON = "Malegaon"
-    AKOLA = "Akola"
-    LATUR = "Latur"
-    BHIWANDI_NIZAMPUR = "Bhiwandi-Nizampur"
-    AHMEDNAGAR = "Ahmednagar"
-    CHANDRAPUR = "Chandrapur"
-    PARBHANI = "Parbhani"
-    ICHALKARANJI = "Ichalkaranji"
-    JALNA = "Jalna"
-    AMBARNATH = "Ambernath"
-    BHUSAWAL = "Bhusawal"
-    PANVEL = "Panvel"
-    BADLAPUR = "Badlapur"
-    BOISAR = "Boisar"
-    GONDIA = "Gondia"
-    SATARA = "Satara"
-    BARSHI = "Barshi"
-    YAVATMAL = "Yavatmal"
-    ACHALPUR = "Achalpur"
-    OSMANABAD = "Osmanabad"
-    NANDURBAR = "Nandurbar"
-    WARDHA = "Wardha"
-    UDGIR = "Udgir"
-    HINGANGHAT = "Hinganghat"
-    NA = "n/a"
-
-# Define Pydantic models for data validation and structure
-class Address(BaseModel):
-    flat_or_apartment_numbers: str
-    office_or_shop_numbers: str
-    floor_numbers: str
-    building_wing_or_tower_or_number: str
-    building_number_on_street: str
-    plot_number: str
-    bungalow_or_house_number: str
-    gut_or_gat_number: str
-    survey_or_cs_or_cts_number: str
-    building_name: str
-    society_or_complex_name: str
-    street_or_road_or_marg: str
-    sub_locality_or_city_divsion: str
-    locality_or_area_or_neighbourhood: str
-    village: str
-    taluka: str
-    district_and_or_sub_district: District
-    city: City
-    state: str
-    pin_code: str
-
-    # Assigns n/a if value is not 1/36 districts
-    @field_validator("district_and_or_sub_district", mode="before")
-    def validate_district(cls, value):
-        for district in District:
-            if value.lower() == district.value.lower():
-                return district
-        return District.NA
+# Rows per page offered in the Database tab listing
+DATABASE_PAGE_SIZES = [25, 50, 100, 250]
 
-    # Assigns n/a if value is not 1/43 cities
-    @field_validator("city", mode="before")
-    def validate_city(cls, value):
-        for city in City:
-            if value.lower() == city.value.lower():
-                return city
-        return City.NA
-
-class PropertyDetails(BaseModel):
-    address: Address
-    property_usage_type: usage_type
-    type_of_property: str
-    area: str
-
-class GeneralNoticeInfo(BaseModel):
-    date_of_notice_in_DDMMYY_format: str
-    num_days_to_respond: int
-    ai_generated_50_word_summary: str
-
-class SellerDetails(BaseModel):
-    person_name: str
-    person_address: str
-    company_name: str
-    company_address: str
-
-class AdvocateDetails(BaseModel):
-    advocate_name: str
-    firm_name: str
-    advocate_or_firm_phone_number: str
-    advocate_or_firm_email: str
-    advocate_or_firm_address: str
-
-class PublicNotice(BaseModel):
-    property_details: PropertyDetails
-    general_notice_info: GeneralNoticeInfo
-    seller_details: SellerDetails
-    advocate_details: AdvocateDetails
+# Seconds between status polls while queued notices are processing, and the
+# number of recent batches shown
+JOB_POLL_SECONDS = 2
+JOB_BATCHES_SHOWN = 5
 
 # Function to load the sample database
 def load_sample_database():
@@ -246,6 +118,82 @@ def load_sample_database():
                 }
             }
 
+# Result cache shared by every session in this process
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    return ResultCache()
+
+# Sample database parsed once per process and shared read-only by every session
+@st.cache_resource
+def get_sample_database() -> Dict[str, Any]:
+    return {key: normalize_record(record) for key, record in load_sample_database().items()}
+
+# Process pool for image preprocessing, shared by every session in this process
+@st.cache_resource
+def get_preprocess_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+
+# Gemini client for an API key, shared by every session using that key so they draw
+# on one rate limit. Calls are throttled, retried with backoff on 429s and transient
+# server errors, and their concurrency adapts to throttling.
+@st.cache_resource
+def get_gemini_client(api_key: str) -> RateLimitedClient:
+    return RateLimitedClient(genai.Client(api_key=api_key))
+
+# Job queue shared with the background workers
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    return JobQueue()
+
+# Worker processes started by the app, as {API key id: (process, threads)}, for
+# deployments where no worker is run separately. The lock keeps two sessions from
+# starting a worker for the same key at once.
+@st.cache_resource
+def get_local_workers() -> Tuple[threading.Lock, Dict[str, Tuple[subprocess.Popen, int]]]:
+    return threading.Lock(), {}
+
+# Watched client properties and their alerts, shared with the workers
+@st.cache_resource
+def get_watchlist() -> Watchlist:
+    return Watchlist()
+
+# Make sure a worker using this session's API key is draining its jobs. Jobs are
+# queued under the key, so they are only processed on its quota: by a worker run
+# separately with the same key, or else by a local worker the app starts. A local
+# worker is restarted when the thread count changes; the old one finishes the
+# notices it has in flight before exiting.
+def ensure_worker():
+    key_id = api_key_id(st.session_state.api_key)
+    threads = st.session_state.max_workers
+    lock, workers = get_local_workers()
+    with lock:
+        process, running_threads = workers.get(key_id, (None, 0))
+        if process is not None and process.poll() is None:
+            if running_threads == threads:
+                return
+            process.terminate()
+        elif get_job_queue().live_workers(key_id=key_id):
+            return
+        process = subprocess.Popen([sys.executable, str(Path(__file__).parent / "worker.py"), "--threads", str(threads)],
+                                   env={**os.environ, "GEMINI_API_KEY": st.session_state.api_key})
+        workers[key_id] = (process, threads)
+
+# Persistent property store shared by every session in this process. A new
+# store is seeded with the sample database the first time it is opened.
+@st.cache_resource
+def get_store() -> PropertyStore:
+    store = PropertyStore()
+    if store.get_meta("initialized") is None:
+        store.replace_all(get_sample_database())
+        store.set_meta("initialized", str(time.time()))
+    return store
+
+# The store and its search indexes, loaded once per process from the snapshot
+# (or rebuilt if it is missing or stale) and shared read-only
+@st.cache_resource
+def get_shared_database() -> SharedDatabase:
+    return SharedDatabase(get_store(), SEARCH_INDEX_TYPES, DEFAULT_SNAPSHOT_PATH)
+
 # Function to initialize session state variables
 def init_session_state():
     if 'api_key' not in st.session_state:
@@ -258,305 +206,212 @@ def init_session_state():
     if 'client' not in st.session_state:
         st.session_state.client = None
     if 'model_id' not in st.session_state:
-        st.session_state.model_id = "gemini-2.0-flash"
+        st.session_state.model_id = DEFAULT_MODEL_ID
     if 'processed_data' not in st.session_state:
-        # Load sample database by default
-        st.session_state.processed_data = load_sample_database()
+        # Session view over the shared database; only this session's changes are held here
+        st.session_state.processed_data = OverlayDatabase(get_store())
+    if 'local_indexes' not in st.session_state:
+        st.session_state.local_indexes = get_shared_database().local_indexes()
     if 'search_results' not in st.session_state:
         st.session_state.search_results = []
+    if 'search_scores' not in st.session_state:
+        st.session_state.search_scores = {}
+    if 'rerank_candidates' not in st.session_state:
+        st.session_state.rerank_candidates = DEFAULT_RERANK_CANDIDATES
     if 'processing_status' not in st.session_state:
         st.session_state.processing_status = None
     if 'current_tab' not in st.session_state:
         st.session_state.current_tab = "Home"
     if 'upload_progress' not in st.session_state:
         st.session_state.upload_progress = 0
+    if 'max_workers' not in st.session_state:
+        st.session_state.max_workers = DEFAULT_MAX_WORKERS
+    if 'use_result_cache' not in st.session_state:
+        st.session_state.use_result_cache = True
+    if 'preprocess_images' not in st.session_state:
+        st.session_state.preprocess_images = True
+    if 'preprocess_options' not in st.session_state:
+        st.session_state.preprocess_options = PreprocessOptions()
+    if 'pipeline_mode' not in st.session_state:
+        st.session_state.pipeline_mode = DEFAULT_PIPELINE_MODE
+    if 'job_batches' not in st.session_state:
+        st.session_state.job_batches = []
+    if 'collected_jobs' not in st.session_state:
+        st.session_state.collected_jobs = set()
+    if 'collected_through' not in st.session_state:
+        st.session_state.collected_through = {}
+    if 'segment_pages' not in st.session_state:
+        st.session_state.segment_pages = False
+    if 'skip_duplicates' not in st.session_state:
+        st.session_state.skip_duplicates = True
+    if 'linked_duplicates' not in st.session_state:
+        st.session_state.linked_duplicates = {}
     if 'database_initialized' not in st.session_state:
         st.session_state.database_initialized = True
 
+# Search indexes over processed_data. The shared indexes cover the base database;
+# each session only indexes its own overlay additions.
+def get_index(name: str) -> OverlayIndex:
+    shared = get_shared_database()
+    return OverlayIndex(shared.indexes[name], st.session_state.local_indexes[name],
+                        st.session_state.processed_data, shared.lock)
+
+# Every notice about the same property as key, oldest first. Notices added in this
+# session are only grouped with each other until they are saved.
+def property_history(key: str) -> List[str]:
+    view = st.session_state.processed_data
+    keys = [member for member in dict.fromkeys(get_index("property_clusters").history(key)) if member in view]
+    dates = {member: derived_fields(view[member])["notice_date"] for member in keys}
+    return sorted(keys, key=lambda member: (not dates[member], dates[member] or "", member))
+
+# Functions to modify the database while keeping the search indexes in sync.
+# Newly processed notices are saved to the shared database straight away and
+# checked against the watchlist.
+def add_record(key: str, record: Dict[str, Any]):
+    view = st.session_state.processed_data
+    record = normalize_record(record)
+    get_shared_database().upsert(key, record)
+    get_watchlist().check(key, record)
+    if view.hide_base:
+        # The session is looking at its own database, so keep the notice visible there too
+        view[key] = record
+        for index in st.session_state.local_indexes.values():
+            index.add(key, record)
+    else:
+        view.forget(key)
+        for index in st.session_state.local_indexes.values():
+            index.remove(key)
+
+# Batch version of add_record used by the database importer, which normalises records itself
+def add_records(records: List[Tuple[str, Dict[str, Any]]]):
+    view = st.session_state.processed_data
+    get_shared_database().upsert_many(records)
+    get_watchlist().check_many(records)
+    for key, record in records:
+        if view.hide_base:
+            view[key] = record
+            for index in st.session_state.local_indexes.values():
+                index.add(key, record)
+        else:
+            view.forget(key)
+            for index in st.session_state.local_indexes.values():
+                index.remove(key)
+
+# Apply deletions from an imported delta export to the shared database
+def remove_records(keys: List[str]):
+    view = st.session_state.processed_data
+    for key in keys:
+        get_shared_database().delete(key)
+        if key in view.additions:
+            del view[key]
+        for index in st.session_state.local_indexes.values():
+            index.remove(key)
+
+# Deletions stay in the session until saved with commit_changes
+def delete_record(key: str):
+    del st.session_state.processed_data[key]
+    for index in st.session_state.local_indexes.values():
+        index.remove(key)
+
+# Replace this session's view of the database without touching the shared copy
+def replace_database(data: Dict[str, Any]):
+    st.session_state.processed_data.replace_view(data)
+    st.session_state.local_indexes = get_shared_database().local_indexes(data)
+
+# Save or discard this session's overlay changes
+def commit_changes():
+    get_shared_database().commit(st.session_state.processed_data)
+    st.session_state.local_indexes = get_shared_database().local_indexes()
+
+def discard_changes():
+    st.session_state.processed_data.revert()
+    st.session_state.local_indexes = get_shared_database().local_indexes()
+
 # Function to set up the API client
 def setup_client():
     if st.session_state.api_key and not st.session_state.client:
         try:
-            st.session_state.client = genai.Client(api_key=st.session_state.api_key)
+            st.session_state.client = get_gemini_client(st.session_state.api_key)
             return True
         except Exception as e:
             st.error(f"Error setting up the API client: {e}")
             return False
     return bool(st.session_state.client)
 
-# OCR function using Gemini
-def conduct_ocr(image_data) -> str:
-    if not setup_client():
-        st.error("API client not configured. Please check your API key.")
-        return "OCR failed"
-    
-    try:
-        image = Image.open(BytesIO(image_data))
-        ocr_prompt = """
-        Perform OCR to extract all text from this scanned Public Notice in a Maharashtra Newspaper.
-        Remove unnecessary whitespace before and after the text, and return the text.
-        """
-        response = st.session_state.client.models.generate_content(
-            model=st.session_state.model_id, 
-            contents=[image, ocr_prompt]
-        )
-        return response.text
-    except Exception as e:
-        st.error(f"Error conducting OCR: {e}")
-        return "OCR failed"
-
-# Language detection and translation
-def detect_and_translate(text):
-    if not setup_client():
-        st.error("API client not configured. Please check your API key.")
-        return text
-    
-    try:
-        # Detect the language of the text
-        if detect(text) != 'en':
-            # Text is not in English; call the translation function
-            trans_prompt = f"""
-                  I have performed OCR to extract all text from a scanned Public Notice in a
-                  Maharashtra Newspaper, it is attached below. It is in Hindi or Marathi , and
-                  may use Legalese. Translate it to english maintaining 100% of the meaning.
-                  Do not editorialize. Translate exactly as written and return the text.
-
-                  Rules:
-                  1. "गृहनिर्माण संस्था मर्यादित लिमिटेडच्या" translates to "Housing Society Limited".
-
-                  {text}
-            """
-            trans_response = st.session_state.client.models.generate_content(
-                model=st.session_state.model_id, 
-                contents=[trans_prompt]
-            )
-            return trans_response.text
-        else:
-            # Text is already in English; return it as is
-            return text
-    except Exception as e:
-        st.error(f"Error detecting language: {e}")
-        return text
-
 # Extract structured data using Gemini
 def extract_structured_data(text: str) -> Dict:
     if not setup_client():
         st.error("API client not configured. Please check your API key.")
         return {}
     
-    # PROMPT
-    prompt = f"""
-    A. GOAL:
-
-    I have used OCR to extract text from a Public Notice in a Maharashtra Newspaper, it is in the section "FINAL_EXTRACTED_TEXT" below.
-    Acting as an experienced regional real estate lawyer, I need you to extract and parse structured data from the text.
-    Note, you must strictly adhere to the specified JSON response schema.
-
-    B. RULES:
-
-    1. Since public notices may contain multiple addresses, here are rules about how to store each address:
-        (1-a) Main property address i.e. where the title investigation is occuring will be mentioned - to be stored in "property_details.address" as an Address object.
-              If any address components are not clearly and explicitly mentioned, leave it as "n/a" instead of using components of other addresses.
-        (1-b) The seller's (person) address if they live elsewhere may be mentioned - to be stored in "seller_details.person_address" as a single string.
-        (1-c) The seller's (company) registered office address may be mentioned - to be stored in "seller_details.company_address" as a single string.
-        (1-d) The advocate (person or law firm) address will be mentioned - to be stored in "advocate_details.advocate_or_firm_address" as a single string.
-        (1-e) Any other address is not to be stored or extracted.
-        (1-f) Be extremely careful not to confuse any of the addresses you see in the text.
-    2. If a Public Notice includes multiple units (flats, shops, offices, etc.), capture data for all units without fail.
-       Some fields in the JSON response apply to each unit individually, while others are common. Carefully analyze the notice to assign values correctly.
-       For example, if flats #101 and #201 are listed, "property_details.address.flat_or_apartment_numbers" should be "Flat No. 101, Flat No. 201". If both are in the same building
-       "Pitale Prasad," "property_details.address.building_name" should be "Pitale Prasad". Ensure accurate field assignment based on shared or unit-specific details.
-    3. The following are examples of local governance bodies, and therefore should be excluded from your parsing - Pune Municipal Corporation, BMC, Gram Panchayats, Nagar Parishad,
-       Nagar Palika, Municipality, Zilla Parishad etc.
-    4. If pin code IS NOT explicitly mentioned for the Main property i.e. in "property_details.address", but IS mentioned for others (advocate / seller address), do not confuse,
-       leave "property_details.address.pin_code" as "n/a".
-    5. If you see a pattern like "Plot bearing S. No. 240, H. No. 3,4,5,6,7,8" follow these 2 rules:
-        (5-a) The "H. No." refers to Hissa number not House number, and should be placed in "property_details.survey_or_cs_or_cts_number" and not in "property_details.address.bungalow_or_house_number".
-        (5-b) The "Plot bearing S. No. 240" refers to a plot number and should be placed in "property_details.address.plot_number".
-
-
-    C. DESCRIPTIONS OF ADDRESS CLASS PROPERTIES:
-
-    flat_or_apartment_numbers: Identifier(s) of an individual unit within a residential building or area. Can contain multiple values if there are multiple units.
-                               (Examples: "Flat No. 202", "2", "Apt. 2a", "3A", "61 A", "C-602", "Flat No. 2 and Flat No. 3", "Flt. 5", "Flat #1, Apt#2")
-    office_or_shop_numbers: Identifier(s) of an individual unit within a commercial building or area. Can contain multiple values if there are multiple units.
-                            (Examples: "Shop No. 5", "Shop No. 1, 2, 3 & 4; Office No. 102", "Tenement No. 398/49", "Office #101", "Office 12")
-    floor_numbers: Identifier(s) of the floor number where the unit(s) are located within a building. Can contain multiple values if there are multiple units.
-                            (Examples: "5th floor", "First floor","Ground flr", "Ground", "floor 3")
-    building_wing_or_tower_or_number: Identifier of a single building amongst many within a society or building complex. Can contain multiple values if there are multiple units.
-                            (Examples: "Tower D", "B-3", "A", "C wing", "2", "Bldg. 5")
-    building_number_on_street: Identitifer of a building on a specific street. Can contain multiple values if there are multiple units.
-                               (Examples: ["57" from "57, Linking Road"], ["46" from "46, Embassy Apt, LG Marg"], ["9" from "9 Cannaught Rd"], ["FJ-11" from "Building No. FJ-11"])
-    plot_number: Identitifer of a residential or industrial plot of land or factory or shed. Can contain multiple values if needed.
-                 (Examples: "Final Plot No. 123-B1", "Final Plot Nos. 10", "Plot 5-C", "Plot No:40", "Plot bearing S. No. 185B", "Plot bearing S. No. 120")
-    bungalow_or_house_number: Identitifer of a bungalow or house. Do not confuse this with survey numbers. Can contain multiple values if needed.
-                 (Examples: "Bungalow 12", "House 819", "House No.331-334-335")
-    gut_or_gat_number: It is a unique land identification number assigned by the state's revenue department, usually for rural parcels of land.
-                       (Examples: "Gat No. 100", "Gut No. 339")
-    survey_or_cs_or_cts_number: It is an umbrella term for a variety of official identifiers of a parcel of land.
-                                (Examples: "Survey Number 60/AA", "Old Survey Number 5/121", "New Survey Number 12", "S. No 1A/294", "Svy. No 250 (part)", "C.S. No. 46/1",
-                                            "Survey No. 112, Hissa No. 3", "S. No. 112, H. No. 1,2,3,5,8", "Survey No. 121 (Hissa No. 5)", "City Survey No. 1176 (part)",
-                                            "Cadastral Survey No. 3", "Chain and Triangulation Survey No. 1A", "C. Survey. No. 2016/57")
-    building_name: Name of a residential / commerical / industrial building. Can contain multiple values if needed.
-                  (Examples: "Jeevan Niwas", "Prasad", "Lodha Supremus", "Sangita", "Nul Naka Ghar", "Sun-n-Sea", "Vivarea", "Gokul")
-    society_or_complex_name:  Name of a residential / commerical / industrial society or complex containing multiple buildings, plots, wings, houses, or offices.
-                              (Examples: "Ganjawala CHS Ltd.", "Rajdoot Co-op. Hsng. Soc", "Peninsula Corporate Park", "Sindh Co-operative Housing Society", "Kanjirapole CHS",
-                                         "Tarapur M.I.D.C", "Pravin Rita CHSL")
-    street_or_road_or_marg: Name or Identifier of a thoroughfare such as a street, road, lane, marg of the property.
-                            (Examples: "Laxmibai Jagmohandas Marg", "J.P. Road", "Hughes Rd.", "5th Street", "BMC Street No. 23-23B", "17th Road", "Venus Lane", "Chimbai Ln")
-    sub_locality_or_city_divsion: Name of Sub-locality, sub-area, or neighbourhood, or divisions within city limits. Be sure not to confuse this with "locality_or_area_or_neighbourhood".
-                                  (Examples: "Versova", "Kala Ghoda", "Pali Hill", "Phase 2", "Bhuleshwar Division", "Malabar Hill Div.")
-    locality_or_area_or_neighbourhood: Name of Locality, area, or neighbourhood. Be sure not to confuse this with village name.
-                                       (Examples: "Andheri (West)", "Goregaon W", "Shivajinagar", "Worli", "Aundh")
-    village: Official name of the village in which the property is located. Must be explicitly mentioned, else leave it as "n/a".
-             (Examples: "Village - Chatgaon", "Ranga Reddy Guda Village", "Vil-Somatane", "Vlg Ashti")
-    taluka: Official name of the taluka in which the property is located. Must be explicitly mentioned, else leave it as "n/a".
-            (Examples: "Taluka - Maval", "Andheri Taluka", "Tal-Akot", "Tlk Chikli")
-    district_and_or_sub_district: Official name of the district and/ or sub-district in which the property is located. Must be explicitly mentioned, else leave it as "n/a".
-                              (Examples: "District - Amravati", "Pune District", "Dist-Latur", "Registration District and Sub-district Mumbai City & Mumbai Suburban", "Sindhudurg Dist.")
-    city: Official name of the city in which the property is located.
-          (Examples: "Mumbai", "Pune", "Nagpur", "Nashik", "Aurangabad")
-    state: Official name of the state in which the property is located.
-           (Examples: "MH", "Maharashtra", "M.H", "Telangana", "Bihar", "GJ", "MP")
-    pin_code: 6-digit number representing postal code. Edge case: If 2-digit number found, append "4000" to it (edge case example, if "16" found, pin code is "400016").
-              (Example: "400030", "411 007", "16", "400 001")
-
-    D. FINAL_EXTRACTED_TEXT:
-
-    {text}
-    """
-    
     try:
-        # Convert pydantic_model to JSON
-        jsonified_pydantic = PublicNotice.model_json_schema()
-
-        # Call on Gemini
-        response = st.session_state.client.models.generate_content(
-            model=st.session_state.model_id,
-            contents=[prompt],
-            config={'response_mime_type': 'application/json',
-                    'response_schema': jsonified_pydantic}
-        )
-
-        # Return the parsed response
-        return response.parsed
+        cache = get_result_cache() if st.session_state.use_result_cache else None
+        return extract_notice_cached(st.session_state.client, st.session_state.model_id, text, cache)
     except Exception as e:
         st.error(f"Error extracting structured data: {e}")
         return {}
 
-# Process a single file
-def process_file(file_data, file_name):
-    # Step 1: OCR
-    with st.spinner(f"Performing OCR on {file_name}..."):
-        ocr_text = conduct_ocr(file_data)
-        if ocr_text == "OCR failed":
-            return None
-
-    # Step 2: Language Detection & Translation
-    with st.spinner(f"Translating text if needed..."):
-        executable_text = detect_and_translate(ocr_text)
-
-    # Step 3: Extract structured data
-    with st.spinner(f"Extracting structured data..."):
-        result_json = extract_structured_data(executable_text)
-        
-    return result_json
-
 # Search function - Simple search
-def simple_search(query: str, data: Dict[str, Any], top_n: int = 3) -> List[str]:
+def simple_search(query: str, data: Dict[str, Any], top_n: int = 3,
+                  index: Optional[AddressIndex] = None,
+                  name_index: Optional[TrigramIndex] = None,
+                  parcel_index: Optional[ParcelIndex] = None,
+                  rerank_candidates: int = DEFAULT_RERANK_CANDIDATES) -> List[str]:
     if not data:
         return []
     
     # Debug - show number of properties in database
     st.info(f"Searching through {len(data)} properties")
     
-    # Extract location elements from query
-    query_lower = query.lower()
-    
-    # Keywords that might be in the query - especially looking for location matches
-    location_keywords = ["manivali", "khalapur", "raigad", "chowk"]
+    # Land identifier queries ("CTS 459/89B Pune") are answered by exact parcel lookup
+    if parcel_index is None:
+        parcel_index = ParcelIndex.build(data)
+    parcel_matches = parcel_index.search(query)
+    if parcel_matches:
+        return parcel_matches[:top_n]
     
-    # Manual scoring of properties based on match quality
-    matching_scores = {}
+    # Rank properties with the address index (BM25 over weighted address fields)
+    if index is None:
+        index = AddressIndex.build(data)
+    if name_index is None:
+        name_index = TrigramIndex.build(data)
+    ranked = index.search(query, top_n=top_n * 5)
     
-    for key, prop_data in data.items():
-        score = 0
-        
-        # Check if this is the new format or old format
-        if "property_details" in prop_data and "address" in prop_data["property_details"]:
-            address = prop_data["property_details"]["address"]
-        elif "address" in prop_data:
-            address = prop_data["address"]
-        else:
-            continue
-        
-        # Check for village, taluka, district matches
-        village = str(address.get("village", "")).lower()
-        taluka = str(address.get("taluka", "")).lower()
-        district = str(address.get("district_and_or_sub_district", "")).lower()
-        
-        # If district is an object with a value property, extract the value
-        if isinstance(district, dict) and "value" in district:
-            district = str(district["value"]).lower()
-        
-        # Check for location keywords in these fields
-        for keyword in location_keywords:
-            if keyword in query_lower:
-                # Check if the keyword is in any of the location fields
-                if keyword in village or keyword in taluka or keyword in district:
-                    score += 30  # High score for direct location matches
-                
-        # Add general matching score for any field
-        address_str = str(address).lower()
-        if any(word in address_str for word in query_lower.split()):
-            score += 10
-            
-        # If we have a match, record the score
-        if score > 0:
-            matching_scores[key] = score
+    # Add trigram similarity of building / society / locality / village names so
+    # spelling variants ("Rajdoot CHS" vs "Rajdoot Co-op. Hsng. Soc") still match
+    scores = {}
+    if ranked:
+        best_score = ranked[0][1]
+        for key, score in ranked:
+            scores[key] = score / best_score
+    for key, field, similarity in name_index.search(query, top_n=top_n * 5):
+        scores[key] = scores.get(key, 0.0) + similarity
     
-    # If we have manual matches, use them
-    if matching_scores:
-        # Sort by score (highest first) and get top matches
-        sorted_matches = sorted(matching_scores.items(), key=lambda x: x[1], reverse=True)
-        top_matches = [k for k, v in sorted_matches[:top_n]]
-        return top_matches
+    # If we have index matches, use them
+    if scores:
+        sorted_matches = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        return [k for k, v in sorted_matches[:top_n]]
         
+    # Otherwise retrieve a bounded candidate set locally and let Gemini rerank it
     if setup_client():
-        # Format prompt with cleaner syntax
-        prompt = f"""
-        Using the provided JSON dictionary of addresses below and the query below, return only the top {top_n} matching addresses
-        (keys only) in JSON format without any additional code.
-    
-        JSON dictionary of addresses: {json.dumps(data)}.
-    
-        query: "{query}"
-        """
+        candidate_keys = index.retrieve(query, top_k=rerank_candidates)
+        if not candidate_keys:
+            return []
+        candidates = {key: compact_address(data[key]) for key in candidate_keys if key in data}
         
         try:
-            # Call Gemini for semantic search
-            response = st.session_state.client.models.generate_content(
-                model=st.session_state.model_id, 
-                contents=[prompt]
-            )
-            
-            # Extract the keys from the response
-            response_text = response.text
-            matching_keys = []
-            for key in data.keys():
-                if key in response_text:
-                    matching_keys.append(key)
-                    
-            # Limit to top_n results
-            return matching_keys[:top_n]
+            # Call Gemini for semantic reranking
+            return rerank_with_gemini(st.session_state.client, st.session_state.model_id,
+                                      query, candidates, top_n)
         except Exception as e:
             st.error(f"Error performing search: {e}")
             return []
             
     return []
     
-# Advanced search function
-def advanced_search(criteria: Dict[str, str], data: Dict[str, Any], top_n: int = 3) -> List[str]:
+# Advanced search function - scores the criteria against local per-field indexes
+def advanced_search(criteria: Dict[str, str], data: Dict[str, Any], top_n: int = 3,
+                    mode: str = "prefix", engine: Optional[FieldedQueryEngine] = None) -> List[Tuple[str, float]]:
     if not data:
         return []
     
@@ -566,41 +421,91 @@ def advanced_search(criteria: Dict[str, str], data: Dict[str, Any], top_n: int =
     if not filtered_criteria:
         return []
     
-    # Prepare search prompt with detailed criteria
-    criteria_str = ", ".join([f"{k}: {v}" for k, v in filtered_criteria.items()])
-    
-    prompt = f"""
-    Using the provided JSON dictionary of addresses below and the search criteria below, 
-    return only the top {top_n} matching addresses (keys only) in JSON format without any additional code.
-    
-    JSON dictionary of addresses: {json.dumps(data)}.
-    
-    Search criteria: {criteria_str}
-    
-    Find properties that best match these criteria, giving higher weight to exact matches.
-    """
+    if engine is None:
+        engine = FieldedQueryEngine.build(data)
+    return engine.search(filtered_criteria, mode, top_n=top_n)
+
+# Make notices finished by the workers visible in this session. The workers write
+# them to the store; the shared indexes pick them up on refresh, and a session
+# looking at its own database gets them added to its view like add_record does.
+# Copies of existing notices were linked to the original record rather than stored,
+# and are listed per batch in linked_duplicates.
+# Each poll only reads the jobs after collected_through[batch], the id up to which
+# every job of the batch has finished and been collected, and only parses the
+# results of newly finished ones.
+def collect_job_results(batch: str):
+    view = st.session_state.processed_data
+    collected = st.session_state.collected_jobs
+    queue = get_job_queue()
+    new_jobs = []
+    through = st.session_state.collected_through.get(batch, 0)
+    advancing = True
+    for job in queue.jobs(batch, after_id=through):
+        if job["status"] == DONE and job["id"] not in collected:
+            new_jobs.append(job)
+        advancing = advancing and job["status"] in (DONE, FAILED)
+        if advancing:
+            through = job["id"]
+    st.session_state.collected_through[batch] = through
+    if not new_jobs:
+        return
+    results = queue.results(job["id"] for job in new_jobs)
+    get_shared_database().refresh()
+    for job in new_jobs:
+        collected.add(job["id"])
+        key = job["name"]
+        result = results.get(job["id"])
+        if result is None:
+            continue
+        if is_duplicate(result):
+            st.session_state.linked_duplicates.setdefault(batch, []).append((key, result[DUPLICATE_OF_FIELD]))
+        elif view.hide_base:
+            view[key] = result
+            for index in st.session_state.local_indexes.values():
+                index.add(key, result)
+        else:
+            view.forget(key)
+            for index in st.session_state.local_indexes.values():
+                index.remove(key)
+
+# Status of this session's recent batches, polled until they finish
+def display_jobs():
+    queue = get_job_queue()
+    st.subheader("Processing Queue")
+    active = False
+    for batch in reversed(st.session_state.job_batches[-JOB_BATCHES_SHOWN:]):
+        counts = queue.counts(batch)
+        total = sum(counts.values())
+        finished = counts[DONE] + counts[FAILED]
+        st.progress(finished / max(total, 1),
+                    text=f"{counts[DONE]} done, {counts[FAILED]} failed, {counts[RUNNING]} running, "
+                         f"{counts[QUEUED]} queued of {total} notices")
+        collect_job_results(batch)
+        duplicates = st.session_state.linked_duplicates.get(batch, [])
+        if duplicates:
+            with st.expander(f"{len(duplicates)} notices were copies of notices already in the database"):
+                for name, original in duplicates:
+                    st.markdown(f"- {name} → {original}")
+        failed_jobs = queue.jobs(batch, status=FAILED)
+        for job in failed_jobs:
+            st.error(f"Failed to process {job['name']} after {job['attempts']} attempts: {job['error']}")
+        if failed_jobs and st.button("Retry Failed", key=f"retry_{batch}"):
+            queue.retry_failed(batch)
+            # The retried jobs are behind the collected watermark
+            st.session_state.collected_through.pop(batch, None)
+            ensure_worker()
+            st.rerun()
+        active = active or finished < total
     
-    try:
-        # Call Gemini for search
-        response = st.session_state.client.models.generate_content(
-            model=st.session_state.model_id, 
-            contents=[prompt]
-        )
-        
-        # Extract the keys from the response
-        response_text = response.text
-        matching_keys = []
-        for key in data.keys():
-            if key in response_text:
-                matching_keys.append(key)
-                
-        # Limit to top_n results
-        return matching_keys[:top_n]
-    except Exception as e:
-        st.error(f"Error performing advanced search: {e}")
-        return []
+    if active:
+        if not queue.live_workers(key_id=api_key_id(st.session_state.api_key)):
+            st.warning("Waiting for a worker to start. Workers can also be run separately with `python worker.py`.")
+        # Poll again shortly; leaving the page or refreshing doesn't stop the workers
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+    else:
+        st.info("Processed notices were saved to the database. Export it from the Database tab.")
 
-# Function to create a formatted display of property details
 # Function to create a formatted display of property details
 def display_property_details(property_data, file_name=None):
     if not property_data:
@@ -618,6 +523,8 @@ def display_property_details(property_data, file_name=None):
         return
     
     address = property_details.get("address", {})
+    # Display strings precomputed when the record was added to the database
+    derived = derived_fields(property_data)
     
     # Create expandable sections for property details
     if file_name:
@@ -629,104 +536,16 @@ def display_property_details(property_data, file_name=None):
     with col1:
         st.markdown("#### Property Details")
         
-        # Property type and usage
-        usage_type_value = property_details.get("property_usage_type", "")
-        if isinstance(usage_type_value, dict) and "value" in usage_type_value:
-            usage_type_value = usage_type_value.get("value", "")
-        
         # Display property info
         st.markdown(f"**Type:** {property_details.get('type_of_property', 'N/A')}")
-        st.markdown(f"**Usage:** {usage_type_value}")
+        st.markdown(f"**Usage:** {derived['usage_type'] or 'N/A'}")
         st.markdown(f"**Area:** {property_details.get('area', 'N/A')}")
         
         # Display address details
         st.markdown("#### Address")
         
-        # Extract district and city values
-        district_value = "N/A"
-        if isinstance(address.get("district_and_or_sub_district"), dict):
-            district_value = address.get("district_and_or_sub_district", {}).get("value", "N/A")
-        elif isinstance(address.get("district_and_or_sub_district"), str):
-            district_value = address.get("district_and_or_sub_district", "N/A")
-        
-        city_value = "N/A"
-        if isinstance(address.get("city"), dict):
-            city_value = address.get("city", {}).get("value", "N/A")
-        elif isinstance(address.get("city"), str):
-            city_value = address.get("city", "N/A")
-        
-        # Format address components
-        address_components = []
-        
-        # Apartment/shop info
-        flat_apt = address.get("flat_or_apartment_numbers", "")
-        if flat_apt and flat_apt != "n/a":
-            address_components.append(flat_apt)
-            
-        office_shop = address.get("office_or_shop_numbers", "")
-        if office_shop and office_shop != "n/a":
-            address_components.append(office_shop)
-        
-        # Floor
-        floor = address.get("floor_numbers", "")
-        if floor and floor != "n/a":
-            address_components.append(f"{floor} Floor")
-        
-        # Building info
-        bldg_wing = address.get("building_wing_or_tower_or_number", "")
-        if bldg_wing and bldg_wing != "n/a":
-            address_components.append(f"Wing/Tower {bldg_wing}")
-        
-        bldg_name = address.get("building_name", "")
-        if bldg_name and bldg_name != "n/a":
-            address_components.append(bldg_name)
-        
-        society = address.get("society_or_complex_name", "")
-        if society and society != "n/a":
-            address_components.append(society)
-        
-        # Street and locality
-        street = address.get("street_or_road_or_marg", "")
-        if street and street != "n/a":
-            address_components.append(street)
-        
-        bldg_num = address.get("building_number_on_street", "")
-        if bldg_num and bldg_num != "n/a":
-            address_components.append(f"Building No. {bldg_num}")
-        
-        locality = address.get("locality_or_area_or_neighbourhood", "")
-        if locality and locality != "n/a":
-            address_components.append(locality)
-        
-        sub_locality = address.get("sub_locality_or_city_divsion", "")
-        if sub_locality and sub_locality != "n/a":
-            address_components.append(sub_locality)
-        
-        # Village and administrative divisions
-        village = address.get("village", "")
-        if village and village != "n/a":
-            address_components.append(f"Village: {village}")
-        
-        taluka = address.get("taluka", "")
-        if taluka and taluka != "n/a":
-            address_components.append(f"Taluka: {taluka}")
-        
-        if district_value and district_value != "n/a":
-            address_components.append(f"District: {district_value}")
-        
-        if city_value and city_value != "n/a":
-            address_components.append(city_value)
-        
-        state = address.get("state", "")
-        if state and state != "n/a":
-            address_components.append(state)
-        
-        pin_code = address.get("pin_code", "")
-        if pin_code and pin_code != "n/a":
-            address_components.append(pin_code)
-        
         # Display complete address
-        st.markdown(f"**Complete Address:** {', '.join(address_components)}")
+        st.markdown(f"**Complete Address:** {derived['display_address']}")
         
         # Display survey details
         survey_num = address.get("survey_or_cs_or_cts_number", "")
@@ -796,65 +615,314 @@ def display_property_details(property_data, file_name=None):
         st.markdown("#### Notice Information")
         
         notice_date = notice_info.get("date_of_notice_in_DDMMYY_format", "")
-        if notice_date and notice_date != "n/a":
+        if derived["notice_date"]:
+            st.markdown(f"**Date:** {derived['notice_date']}")
+        elif notice_date and notice_date != "n/a":
             st.markdown(f"**Date:** {notice_date}")
         
         days_to_respond = notice_info.get("num_days_to_respond", "")
         if days_to_respond:
             st.markdown(f"**Days to Respond:** {days_to_respond}")
         
+        if derived["response_deadline"]:
+            st.markdown(f"**Respond By:** {derived['response_deadline']}")
+        
         notice_summary = notice_info.get("ai_generated_50_word_summary", "")
         if notice_summary and notice_summary != "n/a":
             st.markdown(f"**Summary:** {notice_summary}")
+    
+    # OCR and English text the record was extracted from, kept for audit
+    source_text = property_data.get(SOURCE_TEXT_FIELD)
+    if source_text:
+        st.markdown("#### Source Text")
+        ocr_tab, english_tab = st.tabs(["OCR Text", "English Text"])
+        with ocr_tab:
+            st.text(source_text.get("ocr_text", ""))
+        with english_tab:
+            st.text(source_text.get("english_text", ""))
+    
+    # Earlier and later notices about the same property (sale, release, lost documents, ...)
+    history = property_history(file_name) if file_name else []
+    if len(history) > 1:
+        st.markdown("#### Notice History")
+        view = st.session_state.processed_data
+        for key in history:
+            record = view[key]
+            notice_info = record.get("general_notice_info", {})
+            summary = notice_info.get("ai_generated_50_word_summary", "") if isinstance(notice_info, dict) else ""
+            label = derived_fields(record)["notice_date"] or "Undated"
+            current = " (this notice)" if key == file_name else ""
+            st.markdown(f"- **{label}** {key}{current}" + (f": {summary}" if summary and summary != "n/a" else ""))
+    
+    # Other uploads found to be copies of this notice (other newspapers, reprints)
+    copies = property_data.get(COPIES_FIELD)
+    if copies:
+        st.markdown("#### Also Published As")
+        for copy in copies:
+            st.markdown(f"- {copy.get('key', '')} ({copy.get('match', '')} match, {copy.get('similarity', 0):.0%} similar)")
 
-# Function to save data to file
+# Paginated listing of the database. Only one page of precomputed one-line summaries
+# is fetched per rerun, and full details are rendered for the selected record only.
+def display_database_page():
+    view = st.session_state.processed_data
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        text_filter = st.text_input("Filter by name or address", key="db_text_filter")
+    with col2:
+        district_filter = st.selectbox("District", [""] + [district.value for district in District if district != District.NA],
+                                       key="db_district_filter")
+    with col3:
+        usage_filter = st.selectbox("Usage", [""] + [usage.value for usage in usage_type], key="db_usage_filter")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sort_by = st.selectbox("Sort by", list(SUMMARY_SORTS), key="db_sort_by",
+                               format_func=lambda name: name.replace("_", " ").capitalize())
+    with col2:
+        descending = st.checkbox("Descending", key="db_descending")
+    with col3:
+        page_size = st.selectbox("Rows per page", DATABASE_PAGE_SIZES, key="db_page_size")
+    
+    # Go back to the first page whenever the filters or sort order change
+    listing = (text_filter, district_filter, usage_filter, sort_by, descending, page_size)
+    if st.session_state.get("db_listing") != listing:
+        st.session_state.db_listing = listing
+        st.session_state.db_page = 1
+    
+    _, total = view.summaries(0, 0, sort_by, descending, text_filter,
+                              district=district_filter, usage_type=usage_filter)
+    num_pages = max((total + page_size - 1) // page_size, 1)
+    st.session_state.db_page = min(st.session_state.get("db_page", 1), num_pages)
+    page = st.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, key="db_page")
+    rows, total = view.summaries(page_size, (page - 1) * page_size, sort_by, descending, text_filter,
+                                 district=district_filter, usage_type=usage_filter)
+    st.caption(f"{total} matching properties")
+    if not rows:
+        return
+    
+    table = pd.DataFrame(rows, columns=["key"] + SUMMARY_COLUMNS)
+    table.insert(0, "select", False)
+    edited = st.data_editor(
+        table,
+        key=f"db_table_{page}_{hash(listing)}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=["key"] + SUMMARY_COLUMNS,
+        column_config={
+            "select": st.column_config.CheckboxColumn("Select"),
+            "key": "Name",
+            "address": "Address",
+            "district": "District",
+            "city": "City",
+            "usage_type": "Usage",
+            "notice_date": "Notice Date",
+        },
+    )
+    selected = edited.loc[edited["select"], "key"].tolist()
+    
+    # Bulk delete stays in the session until saved, like single deletions
+    if selected and st.button(f"Delete Selected ({len(selected)})", type="primary"):
+        for key in selected:
+            delete_record(key)
+        st.success(f"Deleted {len(selected)} properties")
+        st.rerun()
+    
+    # Full details for one record on this page
+    detail_key = st.selectbox("Show details for", [""] + table["key"].tolist(), key="db_detail_key")
+    if detail_key and detail_key in view:
+        display_property_details(view[detail_key], detail_key)
+        if st.button(f"Delete {detail_key}", key=f"delete_{detail_key}"):
+            delete_record(detail_key)
+            st.success(f"Deleted {detail_key}")
+            st.rerun()
+
+# Function to save data to file. The export is only generated when requested, and
+# is streamed to a temporary file rather than built as one string in memory.
 def save_data_to_file():
     data_to_save = st.session_state.processed_data
     if not data_to_save:
         st.warning("No data to save.")
         return
     
-    # Convert the data to JSON format
-    try:
-        # Handle complex objects like enums by converting to dict first
-        serializable_data = {}
-        for key, value in data_to_save.items():
-            serializable_data[key] = json.loads(json.dumps(value, default=lambda o: o.dict() if hasattr(o, 'dict') else str(o)))
-        
-        json_str = json.dumps(serializable_data, indent=4)
-        
-        # Create a downloadable link
-        st.download_button(
-            label="Download Data as JSON",
-            data=json_str,
-            file_name="property_database.json",
-            mime="application/json"
-        )
-    except Exception as e:
-        st.error(f"Error saving data: {e}")
+    col1, col2 = st.columns(2)
+    with col1:
+        delta = st.checkbox("Only changes since a previous export",
+                            help="Exports saved notices added, updated or deleted after the given version, for incremental syncs")
+    with col2:
+        formats = [name for name in EXPORT_FORMATS if not (delta and name == "json")]
+        export_format = st.selectbox("Export format", formats, help="NDJSON writes one notice per line; .gz compresses it")
+    since = None
+    if delta:
+        last_version = get_store().get_meta(LAST_EXPORT_META)
+        since = st.number_input("Changes since version", min_value=0.0,
+                                value=float(last_version) if last_version else 0.0, format="%.6f")
+    
+    if st.button("Prepare Export"):
+        try:
+            previous = st.session_state.get("export_file")
+            if previous and os.path.exists(previous[0]):
+                os.remove(previous[0])
+            with st.spinner("Writing export..."):
+                with tempfile.NamedTemporaryFile(delete=False, suffix=EXPORT_FORMATS[export_format]["extension"]) as f:
+                    path = f.name
+                    if delta:
+                        # Deltas cover the shared database, so unsaved session changes are not included
+                        version = export_store(get_store(), path, export_format, since=since)
+                        get_store().set_meta(LAST_EXPORT_META, repr(version))
+                        st.info(f"Export is complete up to version {version:.6f}; use it for the next delta.")
+                    else:
+                        write_export(f, data_to_save.items(), export_format)
+            st.session_state.export_file = (path, export_file_name(export_format, since), EXPORT_FORMATS[export_format]["mime"])
+        except Exception as e:
+            st.error(f"Error saving data: {e}")
+    
+    if st.session_state.get("export_file"):
+        path, file_name, mime = st.session_state.export_file
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                st.download_button(
+                    label=f"Download {file_name}",
+                    data=f,
+                    file_name=file_name,
+                    mime=mime
+                )
 
 # Function to load data from file
 def load_data_from_file(uploaded_file):
     if uploaded_file is not None:
+        # Records are parsed, validated and saved to the database in batches, so the
+        # file is never decoded into memory as a whole
+        total_bytes = max(uploaded_file.size, 1)
+        progress_bar = st.progress(0.0)
+        status = st.empty()
+
+        def show_progress(report: ImportReport):
+            progress_bar.progress(min(report.bytes_read / total_bytes, 1.0))
+            status.text(f"Imported {report.imported} properties, deleted {report.deleted} ({report.rejected} rejected)")
+
         try:
-            # Read the file content
-            content = uploaded_file.read()
-            decoded_content = content.decode('utf-8')
-            
-            # Parse the JSON content
-            loaded_data = json.loads(decoded_content)
-            
-            # Update session state
-            st.session_state.processed_data = loaded_data
-            st.success(f"Successfully loaded database with {len(loaded_data)} properties.")
+            uploaded_file.seek(0)
+            report = import_database(uploaded_file, add_records, progress=show_progress,
+                                     file_name=uploaded_file.name, delete_keys=remove_records)
         except Exception as e:
             st.error(f"Error loading data: {e}")
+            return
+
+        progress_bar.progress(1.0)
+        st.success(f"Successfully imported {report.imported} properties into the database.")
+        if report.rejected:
+            st.warning(f"{report.rejected} records failed validation and were skipped.")
+            with st.expander("Rejected records"):
+                for key, message in report.errors:
+                    st.write(f"**{key}**: {message}")
+                if report.rejected > len(report.errors):
+                    st.write(f"... and {report.rejected - len(report.errors)} more")
+
+# Address fields asked for when watching a property by hand; a CSV upload may use any Address field
+WATCH_FORM_FIELDS = [
+    ("flat_or_apartment_numbers", "Flat/Apartment Number"),
+    ("office_or_shop_numbers", "Office/Shop Number"),
+    ("building_wing_or_tower_or_number", "Wing/Tower"),
+    ("building_name", "Building Name"),
+    ("society_or_complex_name", "Society/Complex Name"),
+    ("survey_or_cs_or_cts_number", "Survey/CTS Number"),
+    ("locality_or_area_or_neighbourhood", "Locality/Area"),
+    ("village", "Village"),
+    ("district_and_or_sub_district", "District"),
+    ("pin_code", "PIN Code"),
+]
+
+# Register client properties to monitor, one at a time or from a CSV file
+def display_watchlist():
+    watchlist = get_watchlist()
+    st.subheader(f"Watched Properties ({len(watchlist)})")
+    
+    with st.expander("Add a property"):
+        with st.form("add_watch", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            client = col1.text_input("Client")
+            label = col2.text_input("Label", placeholder="e.g., loan account or property reference")
+            address = {}
+            for i, (field, field_label) in enumerate(WATCH_FORM_FIELDS):
+                address[field] = (col1 if i % 2 == 0 else col2).text_input(field_label)
+            if st.form_submit_button("Watch Property"):
+                if not any(address.values()):
+                    st.warning("Enter at least one address field")
+                else:
+                    watchlist.add(client or "Unassigned", label or "Property", address)
+                    st.success("Property added to the watchlist")
+    
+    with st.expander("Import properties from CSV"):
+        st.caption("One property per row, with `client` and `label` columns and any Address fields as "
+                   "columns (e.g. `flat_or_apartment_numbers`, `building_name`, `pin_code`)")
+        uploaded_csv = st.file_uploader("Watchlist CSV", type=["csv"])
+        if uploaded_csv and st.button("Import Watchlist"):
+            table = pd.read_csv(uploaded_csv, dtype=str).fillna("")
+            rows = table.to_dict("records")
+            ids = watchlist.add_many((row.get("client") or "Unassigned", row.get("label") or "Property", row) for row in rows)
+            st.success(f"Added {len(ids)} properties to the watchlist")
+    
+    watched = watchlist.watched()
+    if watched:
+        table = pd.DataFrame([{"select": False, "id": watch.id, "client": watch.client, "label": watch.label,
+                               "address": ", ".join(watch.address.values())} for watch in watched])
+        edited = st.data_editor(table, key="watch_table", hide_index=True, use_container_width=True,
+                                disabled=["id", "client", "label", "address"],
+                                column_config={"select": st.column_config.CheckboxColumn("Select"), "id": None})
+        selected = edited.loc[edited["select"], "id"].tolist()
+        if selected and st.button(f"Stop Watching ({len(selected)})"):
+            watchlist.remove(selected)
+            st.rerun()
+
+# Notices that matched watched properties, newest first
+def display_alerts():
+    watchlist = get_watchlist()
+    counts = watchlist.alert_counts()
+    st.subheader(f"Alerts ({counts[NEW]} new)")
+    status = st.radio("Show", ALERT_STATES + ["all"], horizontal=True, key="alert_status")
+    alerts = watchlist.alerts(None if status == "all" else status)
+    if not alerts:
+        st.info("No alerts. New notices are checked against the watchlist as they are processed.")
+        return
+    
+    table = pd.DataFrame([{
+        "select": False,
+        "id": alert.id,
+        "date": time.strftime("%Y-%m-%d %H:%M", time.localtime(alert.created_at)),
+        "client": alert.client,
+        "property": alert.label,
+        "notice": alert.notice_key,
+        "score": alert.score,
+        "matched on": ", ".join(alert.reasons),
+        "status": alert.status,
+    } for alert in alerts])
+    edited = st.data_editor(table, key=f"alert_table_{status}", hide_index=True, use_container_width=True,
+                            disabled=[column for column in table.columns if column != "select"],
+                            column_config={"select": st.column_config.CheckboxColumn("Select"), "id": None,
+                                           "score": st.column_config.ProgressColumn("Score", min_value=0.0, max_value=1.0)})
+    selected = edited.loc[edited["select"], "id"].tolist()
+    if selected and st.button(f"Mark Reviewed ({len(selected)})"):
+        watchlist.set_status(selected, REVIEWED)
+        st.rerun()
+    
+    # The matching notice in full
+    view = st.session_state.processed_data
+    notice_key = st.selectbox("Show notice", [""] + list(dict.fromkeys(alert.notice_key for alert in alerts)), key="alert_notice")
+    if notice_key:
+        if notice_key in view:
+            display_property_details(view[notice_key], notice_key)
+        else:
+            st.warning(f"{notice_key} is no longer in the database")
 
 # Main app function
 def main():
     # Initialize session state
     init_session_state()
     
+    # Pick up notices written by workers and ingest runs since the last rerun
+    get_shared_database().refresh()
+    
     # Sidebar for navigation and configuration
     with st.sidebar:
         st.title("HeyThatsMyLand")
@@ -872,12 +940,25 @@ def main():
             
         # Navigation
         st.subheader("Navigation")
-        tabs = ["Home", "Upload & Process", "Search", "Database"]
+        tabs = ["Home", "Upload & Process", "Search", "Alerts", "Database"]
         selected_tab = st.radio("Go to", tabs, index=tabs.index(st.session_state.current_tab))
         
         if selected_tab != st.session_state.current_tab:
             st.session_state.current_tab = selected_tab
         
+        new_alerts = get_watchlist().alert_counts()[NEW]
+        if new_alerts:
+            st.warning(f"{new_alerts} new watchlist alerts")
+        
+        # Gemini call statistics for this API key
+        if isinstance(st.session_state.client, RateLimitedClient):
+            with st.expander("API Usage"):
+                stats = st.session_state.client.stats()
+                st.caption(f"Calls: {stats['calls']} ({stats['succeeded']} succeeded, {stats['failed']} failed)")
+                st.caption(f"Retries: {stats['retries']} ({stats['throttled']} rate limited, {stats['server_errors']} server errors)")
+                st.caption(f"Waited for rate limit: {stats['wait_seconds']:.1f}s")
+                st.caption(f"Concurrent calls allowed: {stats['concurrency_limit']}")
+        
         # Display app information
         st.markdown("---")
         st.caption("Developed by Vedant Nevatia & Pranav Jain")
@@ -899,7 +980,8 @@ def main():
         1. Enter your Google Gemini API Key in the sidebar
         2. Navigate to "Upload & Process" to process notice images
         3. Use "Search" to find properties in your database
-        4. Manage your database in the "Database" section
+        4. Register client properties under "Alerts" to be alerted to new notices about them
+        5. Manage your database in the "Database" section
         
         ### Requirements
         - Google Gemini API Key
@@ -934,53 +1016,95 @@ def main():
                                          accept_multiple_files=True)
         
         if uploaded_files:
+            # Number of notices the app's background worker sends to Gemini at once
+            st.session_state.max_workers = st.slider(
+                "Files processed in parallel",
+                min_value=1,
+                max_value=MAX_WORKERS_LIMIT,
+                value=st.session_state.max_workers,
+                help="Higher values finish large batches faster. Calls are still throttled to the API rate limit and retried if rate limited. Applies when the app starts its own worker"
+            )
+            st.session_state.pipeline_mode = st.radio(
+                "Pipeline",
+                PIPELINE_MODES,
+                index=PIPELINE_MODES.index(st.session_state.pipeline_mode),
+                format_func=lambda mode: "Fused (one call per notice)" if mode == FUSED else "Three-stage (OCR, translation, extraction)",
+                horizontal=True,
+                help="Fused mode reads, translates and extracts each notice in a single Gemini call, which is faster and uses fewer tokens"
+            )
+            st.session_state.use_result_cache = st.checkbox(
+                "Reuse results for previously processed notices",
+                value=st.session_state.use_result_cache,
+                help="Skips Gemini for images or notice text that were already processed with the same model and prompts"
+            )
+            
+            st.session_state.segment_pages = st.checkbox(
+                "Split newspaper pages into notices",
+                value=st.session_state.segment_pages,
+                help="Finds the bordered notice boxes on full-page scans and processes each one as a separate notice"
+            )
+            
+            st.session_state.skip_duplicates = st.checkbox(
+                "Skip notices already in the database",
+                value=st.session_state.skip_duplicates,
+                help="Copies of a notice (the same scan, or the same text in another newspaper's layout) are linked to the existing record instead of being extracted again"
+            )
+            
+            # Image preprocessing settings
+            with st.expander("Image Preprocessing"):
+                st.session_state.preprocess_images = st.checkbox(
+                    "Shrink images before OCR",
+                    value=st.session_state.preprocess_images,
+                    help="Large photos and scans are reduced before upload, which is faster and uses fewer image tokens"
+                )
+                options = st.session_state.preprocess_options
+                col1, col2 = st.columns(2)
+                with col1:
+                    exif_transpose = st.checkbox("Apply EXIF orientation", value=options.exif_transpose)
+                    grayscale = st.checkbox("Convert to greyscale", value=options.grayscale)
+                    deskew = st.checkbox("Straighten skewed scans", value=options.deskew)
+                    crop_borders = st.checkbox("Crop empty borders", value=options.crop_borders)
+                with col2:
+                    max_long_edge = st.slider("Longest side (pixels)", min_value=800, max_value=4000,
+                                              value=options.max_long_edge, step=100)
+                    output_format = st.selectbox("Format", OUTPUT_FORMATS, index=OUTPUT_FORMATS.index(options.output_format))
+                    quality = st.slider("Quality", min_value=40, max_value=95, value=options.quality)
+                st.session_state.preprocess_options = options._replace(
+                    exif_transpose=exif_transpose, grayscale=grayscale, deskew=deskew, crop_borders=crop_borders,
+                    max_long_edge=max_long_edge, output_format=output_format, quality=quality
+                )
+            
             # Display a process button
             process_button = st.button("Process Selected Files")
             
             if process_button:
-                # Create a progress bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # Process each file
-                total_files = len(uploaded_files)
-                processed_count = 0
-                
-                for uploaded_file in uploaded_files:
-                    # Update status
-                    file_name = uploaded_file.name
-                    status_text.text(f"Processing {file_name}... ({processed_count+1}/{total_files})")
-                    
-                    # Read file data
-                    file_data = uploaded_file.read()
-                    
-                    # Process the file
-                    result = process_file(file_data, file_name)
-                    
-                    if result:
-                        # Store the result
-                        st.session_state.processed_data[file_name] = result
-                        st.success(f"Successfully processed {file_name}")
-                    else:
-                        st.error(f"Failed to process {file_name}")
-                    
-                    # Update progress
-                    processed_count += 1
-                    progress_bar.progress(processed_count / total_files)
+                # Read all file data up front
+                files = [(uploaded_file.name, uploaded_file.read()) for uploaded_file in uploaded_files]
                 
-                # Final status update
-                status_text.text(f"Processed {processed_count} out of {total_files} files")
+                # Cut full pages into one crop per notice on the process pool
+                if st.session_state.segment_pages:
+                    with st.spinner(f"Finding notices on {len(files)} pages..."):
+                        pages = len(files)
+                        files = [crop for crops in get_preprocess_pool().map(split_upload, *zip(*files)) for crop in crops]
+                    st.caption(f"Found {len(files)} notices on {pages} pages")
                 
-                # Option to save the processed data
-                if processed_count > 0:
-                    st.subheader("Save Processed Data")
-                    save_data_to_file()
-                    
-                    # Show a sample of processed data
-                    if st.session_state.processed_data:
-                        st.subheader("Sample Processed Data")
-                        sample_key = list(st.session_state.processed_data.keys())[0]
-                        display_property_details(st.session_state.processed_data[sample_key], sample_key)
+                # Queue the notices for the background workers; they keep going across reruns
+                queue = get_job_queue()
+                batch = queue.new_batch_id()
+                queue.enqueue(batch, files, {
+                    "model_id": st.session_state.model_id,
+                    "mode": st.session_state.pipeline_mode,
+                    "use_cache": st.session_state.use_result_cache,
+                    "preprocess": st.session_state.preprocess_options._asdict() if st.session_state.preprocess_images else None,
+                    "dedup": st.session_state.skip_duplicates,
+                }, key_id=api_key_id(st.session_state.api_key))
+                st.session_state.job_batches.append(batch)
+                ensure_worker()
+                st.success(f"Queued {len(files)} notices for processing")
+            
+        # Progress of this session's queued notices
+        if st.session_state.job_batches:
+            display_jobs()
         
         # Option to process text directly
         st.markdown("---")
@@ -1000,14 +1124,11 @@ def main():
                     
                     if result:
                         # Store the result
-                        st.session_state.processed_data[text_name] = result
+                        add_record(text_name, result)
                         st.success(f"Successfully processed text as {text_name}")
                         
                         # Display the processed data
                         display_property_details(result, text_name)
-                        
-                        # Option to save
-                        save_data_to_file()
                     else:
                         st.error("Failed to process the text")
     
@@ -1020,8 +1141,8 @@ def main():
             
             # Option to load a database
             st.subheader("Load Database")
-            uploaded_db = st.file_uploader("Upload a property database JSON file", type=["json"])
-            if uploaded_db:
+            uploaded_db = st.file_uploader("Upload a property database JSON file", type=["json", "ndjson", "jsonl", "gz"])
+            if uploaded_db and st.button("Import Database", key="import_database_search"):
                 load_data_from_file(uploaded_db)
             
             return
@@ -1034,14 +1155,26 @@ def main():
             # Simple search
             st.markdown("Enter an address or property description to find matching properties.")
             search_query = st.text_input("Search Query", placeholder="e.g., Flat 202, Khar West, Mumbai")
+            st.session_state.rerank_candidates = st.slider(
+                "Candidates sent to Gemini when no direct match is found",
+                min_value=5,
+                max_value=100,
+                value=st.session_state.rerank_candidates,
+                help="Only this many closest addresses are sent for semantic reranking, however large the database"
+            )
             
             if st.button("Search", key="simple_search_button"):
                 if search_query:
                     with st.spinner("Searching..."):
-                        results = simple_search(search_query, st.session_state.processed_data)
+                        results = simple_search(search_query, st.session_state.processed_data,
+                                                index=get_index("search_index"),
+                                                name_index=get_index("name_index"),
+                                                parcel_index=get_index("parcel_index"),
+                                                rerank_candidates=st.session_state.rerank_candidates)
                         
                         if results:
                             st.session_state.search_results = results
+                            st.session_state.search_scores = {}
                             st.success(f"Found {len(results)} matching properties")
                         else:
                             st.info("No matching properties found")
@@ -1071,6 +1204,9 @@ def main():
                 property_type = st.text_input("Property Type", placeholder="e.g., Flat, Shop, Land")
                 survey_number = st.text_input("Survey/CTS Number", placeholder="e.g., CTS No. E/525")
             
+            match_mode = st.radio("Match mode", MATCH_MODES, index=MATCH_MODES.index("prefix"), horizontal=True,
+                                  help="exact: whole values only, prefix: also words starting with the query, fuzzy: also close spellings")
+            
             # Construct search criteria
             search_criteria = {
                 "flat_or_apartment_numbers": flat_apt,
@@ -1089,10 +1225,12 @@ def main():
                 # Check if at least one field is filled
                 if any(value for value in search_criteria.values()):
                     with st.spinner("Searching..."):
-                        results = advanced_search(search_criteria, st.session_state.processed_data)
+                        results = advanced_search(search_criteria, st.session_state.processed_data,
+                                                  mode=match_mode, engine=get_index("field_index"))
                         
                         if results:
-                            st.session_state.search_results = results
+                            st.session_state.search_results = [key for key, score in results]
+                            st.session_state.search_scores = dict(results)
                             st.success(f"Found {len(results)} matching properties")
                         else:
                             st.info("No matching properties found")
@@ -1107,17 +1245,53 @@ def main():
             # Debug information to see what results we have
             st.write(f"Debug - Results keys: {st.session_state.search_results}")
             
-            for idx, result_key in enumerate(st.session_state.search_results):
-                with st.expander(f"Result {idx+1}: {result_key}"):
+            # Hits on notices about the same property are shown once, as that property
+            shown = set()
+            idx = 0
+            for result_key in st.session_state.search_results:
+                if result_key in shown:
+                    continue
+                history = property_history(result_key)
+                shown.update(history)
+                idx += 1
+                score = st.session_state.search_scores.get(result_key)
+                score_label = f" (score {score:.2f})" if score is not None else ""
+                history_label = f", {len(history)} notices for this property" if len(history) > 1 else ""
+                with st.expander(f"Result {idx}: {result_key}{score_label}{history_label}"):
                     # Check if the key exists in the processed_data
                     if result_key in st.session_state.processed_data:
                         display_property_details(st.session_state.processed_data[result_key], result_key)
                     else:
                         st.error(f"Property data not found for key: {result_key}")
             
+    elif st.session_state.current_tab == "Alerts":
+        st.title("Watchlist Alerts")
+        st.markdown("Client properties registered here are matched against every new notice as it is processed.")
+        display_alerts()
+        st.markdown("---")
+        display_watchlist()
+    
     elif st.session_state.current_tab == "Database":
         st.title("Property Database Management")
         
+        # Unsaved changes made in this session
+        view = st.session_state.processed_data
+        if view.is_modified:
+            changes = f"{len(view.additions)} added, {len(view.deletions)} deleted"
+            if view.hide_base:
+                changes += ", replacing the shared database"
+            st.warning(f"This session has unsaved changes ({changes}). Other users still see the shared database.")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Save Changes to Shared Database", type="primary"):
+                    commit_changes()
+                    st.success("Changes saved to the shared database")
+                    st.rerun()
+            with col2:
+                if st.button("Discard Changes"):
+                    discard_changes()
+                    st.rerun()
+        
         # Database statistics
         if st.session_state.processed_data:
             num_properties = len(st.session_state.processed_data)
@@ -1132,35 +1306,27 @@ def main():
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("Reset to Sample Database", help="Restore the original sample database"):
-                    st.session_state.processed_data = load_sample_database()
+                    replace_database(get_sample_database())
                     st.success("Database reset to sample data")
-                    st.experimental_rerun()
+                    st.rerun()
             
             with col2:
                 # Option to clear the database
                 if st.button("Clear Database", type="primary", help="Warning: This will delete all property data"):
-                    st.session_state.processed_data = {}
+                    replace_database({})
                     st.success("Database cleared successfully")
-                    st.experimental_rerun()
+                    st.rerun()
             
             # Display all properties
             st.subheader("All Properties")
-            for property_key in st.session_state.processed_data.keys():
-                with st.expander(property_key):
-                    display_property_details(st.session_state.processed_data[property_key], property_key)
-                    
-                    # Option to delete individual property
-                    if st.button(f"Delete {property_key}", key=f"delete_{property_key}"):
-                        del st.session_state.processed_data[property_key]
-                        st.success(f"Deleted {property_key}")
-                        st.experimental_rerun()
+            display_database_page()
         else:
             st.warning("Your property database is empty. Please process some public notices first or load an existing database.")
         
         # Option to load a database
         st.subheader("Load Database")
-        uploaded_db = st.file_uploader("Upload a property database JSON file", type=["json"])
-        if uploaded_db:
+        uploaded_db = st.file_uploader("Upload a property database JSON file", type=["json", "ndjson", "jsonl", "gz"])
+        if uploaded_db and st.button("Import Database", key="import_database"):
             load_data_from_file(uploaded_db)
 
 # Run the app
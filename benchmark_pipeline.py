@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from models import SOURCE_TEXT_FIELD
+from normalize import clean_value
+from pipeline import DEFAULT_MODEL_ID, PIPELINE_MODES, process_notice
+from preprocess import preprocess_image
+from search_index import DERIVED_FIELD, field_text
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Sections compared for agreement; derived and source_text differ by construction
+IGNORED_SECTIONS = {DERIVED_FIELD, SOURCE_TEXT_FIELD}
+
+# Wraps a genai.Client and records the duration and token usage of every
+# generate_content call, so API time can be told apart from rate-limiter waits
+class UsageRecorder:
+    def __init__(self, client: Any):
+        self.client = client
+        self.models = _RecordingModels(self)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def reset(self):
+        with self._lock:
+            self.usage = {"calls": 0, "api_seconds": 0.0, "prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+    def record(self, seconds: float, usage: Any):
+        with self._lock:
+            self.usage["calls"] += 1
+            self.usage["api_seconds"] += seconds
+            self.usage["prompt_tokens"] += getattr(usage, "prompt_token_count", None) or 0
+            self.usage["output_tokens"] += getattr(usage, "candidates_token_count", None) or 0
+            self.usage["total_tokens"] += getattr(usage, "total_token_count", None) or 0
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.usage)
+
+class _RecordingModels:
+    def __init__(self, owner: UsageRecorder):
+        self.owner = owner
+
+    def generate_content(self, **kwargs) -> Any:
+        started = time.perf_counter()
+        response = self.owner.client.models.generate_content(**kwargs)
+        self.owner.record(time.perf_counter() - started, getattr(response, "usage_metadata", None))
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.owner.client.models, name)
+
+# {"section.field": normalised text} for every leaf of a notice record
+def flatten_fields(record: Mapping[str, Any], prefix: str = "") -> Dict[str, str]:
+    fields = {}
+    for key, value in record.items():
+        if not prefix and key in IGNORED_SECTIONS:
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, Mapping) and not set(value) <= {"name", "value"}:
+            fields.update(flatten_fields(value, f"{name}."))
+        else:
+            fields[name] = " ".join(field_text(clean_value(value)).lower().split())
+    return fields
+
+# Fields on which two records agree, out of the fields either of them has
+def field_agreement(a: Mapping[str, Any], b: Mapping[str, Any]) -> Dict[str, bool]:
+    a_fields, b_fields = flatten_fields(a), flatten_fields(b)
+    return {name: a_fields.get(name) == b_fields.get(name) for name in sorted(set(a_fields) | set(b_fields))}
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def find_images(paths: Iterable[str]) -> List[Path]:
+    images = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            images.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS))
+        else:
+            images.append(path)
+    return images
+
+# Run every image through each pipeline mode, one notice at a time and without the
+# result cache, and collect per-notice latency, calls, tokens and the results
+def run_benchmark(client: Any, recorder: UsageRecorder, model_id: str, images: List[Path],
+                  modes: List[str] = PIPELINE_MODES, preprocess: bool = False) -> Dict[str, Any]:
+    runs: Dict[str, List[Dict[str, Any]]] = {mode: [] for mode in modes}
+    for image in images:
+        data = image.read_bytes()
+        if preprocess:
+            data = preprocess_image(data).data
+        for mode in modes:
+            recorder.reset()
+            started = time.perf_counter()
+            run = {"image": image.name}
+            try:
+                run["result"] = process_notice(client, model_id, data, mode=mode)
+            except Exception as e:
+                run["error"] = str(e)
+            run["wall_seconds"] = time.perf_counter() - started
+            run.update(recorder.snapshot())
+            runs[mode].append(run)
+            print(f"{image.name} [{mode}]: {run['api_seconds']:.2f}s API, {run['calls']} calls, "
+                  f"{run['total_tokens']} tokens{' - ' + run['error'] if 'error' in run else ''}", file=sys.stderr)
+    return runs
+
+def summarize(runs: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"modes": {}}
+    for mode, mode_runs in runs.items():
+        ok = [run for run in mode_runs if "result" in run]
+        latencies = [run["api_seconds"] for run in ok]
+        summary["modes"][mode] = {
+            "notices": len(mode_runs),
+            "failed": len(mode_runs) - len(ok),
+            "mean_seconds": statistics.mean(latencies) if latencies else None,
+            "median_seconds": statistics.median(latencies) if latencies else None,
+            "p95_seconds": _percentile(latencies, 0.95) if latencies else None,
+            "mean_calls": statistics.mean(run["calls"] for run in ok) if ok else None,
+            "mean_prompt_tokens": statistics.mean(run["prompt_tokens"] for run in ok) if ok else None,
+            "mean_output_tokens": statistics.mean(run["output_tokens"] for run in ok) if ok else None,
+            "mean_total_tokens": statistics.mean(run["total_tokens"] for run in ok) if ok else None,
+        }
+
+    # Field-level agreement between the first mode and each other mode, per notice and per field
+    modes = list(runs)
+    for other in modes[1:]:
+        per_notice, per_field = [], {}
+        for base_run, other_run in zip(runs[modes[0]], runs[other]):
+            if "result" not in base_run or "result" not in other_run:
+                continue
+            agreement = field_agreement(base_run["result"], other_run["result"])
+            per_notice.append(sum(agreement.values()) / max(len(agreement), 1))
+            for name, agrees in agreement.items():
+                per_field.setdefault(name, []).append(agrees)
+        summary[f"agreement_{modes[0]}_vs_{other}"] = {
+            "notices_compared": len(per_notice),
+            "mean_field_agreement": statistics.mean(per_notice) if per_notice else None,
+            "fields": {name: sum(values) / len(values)
+                       for name, values in sorted(per_field.items(), key=lambda item: sum(item[1]) / len(item[1]))},
+        }
+    return summary
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"{'mode':<12} {'notices':>7} {'failed':>6} {'mean s':>7} {'p95 s':>7} {'calls':>6} {'prompt tok':>10} {'output tok':>10} {'total tok':>10}")
+    for mode, stats in summary["modes"].items():
+        if stats["mean_seconds"] is None:
+            print(f"{mode:<12} {stats['notices']:>7} {stats['failed']:>6}")
+            continue
+        print(f"{mode:<12} {stats['notices']:>7} {stats['failed']:>6} {stats['mean_seconds']:>7.2f} {stats['p95_seconds']:>7.2f} "
+              f"{stats['mean_calls']:>6.1f} {stats['mean_prompt_tokens']:>10.0f} {stats['mean_output_tokens']:>10.0f} {stats['mean_total_tokens']:>10.0f}")
+    for name, agreement in summary.items():
+        if not name.startswith("agreement_") or agreement["mean_field_agreement"] is None:
+            continue
+        print(f"\n{name}: {agreement['mean_field_agreement']:.1%} of fields agree over {agreement['notices_compared']} notices")
+        print("Least agreed fields:")
+        for field, rate in list(agreement["fields"].items())[:10]:
+            print(f"  {rate:>6.1%}  {field}")
+
+# Compare the fused and three-stage pipelines on a set of notice images
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the fused pipeline against the three-stage pipeline.")
+    parser.add_argument("images", nargs="+", help="Notice images, or directories of them")
+    parser.add_argument("--model", default=DEFAULT_MODEL_ID)
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY"),
+                        help="Gemini API key (default: $GEMINI_API_KEY or $GOOGLE_API_KEY)")
+    parser.add_argument("--modes", nargs="+", choices=PIPELINE_MODES, default=PIPELINE_MODES)
+    parser.add_argument("--preprocess", action="store_true", help="Preprocess images as the app does before OCR")
+    parser.add_argument("--out", help="Write the summary and every result to this JSON file")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("a Gemini API key is required (--api-key or $GEMINI_API_KEY)")
+    images = find_images(args.images)
+    if not images:
+        parser.error("no images found")
+
+    from google import genai
+    from gemini_client import RateLimitedClient
+
+    # The recorder sits inside the rate limiter, so latencies exclude throttling waits
+    recorder = UsageRecorder(genai.Client(api_key=args.api_key))
+    client = RateLimitedClient(recorder)
+    runs = run_benchmark(client, recorder, args.model, images, args.modes, args.preprocess)
+    summary = summarize(runs)
+    print_summary(summary)
+    if args.out:
+        Path(args.out).write_text(json.dumps({"summary": summary, "runs": runs}, indent=2, ensure_ascii=False), encoding="utf-8")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from models import SOURCE_TEXT_FIELD
+from script_detect import DEVANAGARI, NEUTRAL, classify_lines, text_script
+from store import PropertyStore
+
+TEXT_EXTENSIONS = {".txt", ".md"}
+
+# Disagreements listed in the report
+MAX_REPORTED_DISAGREEMENTS = 10
+
+# Notice texts from text files / directories of them, and the OCR text kept with
+# the records of a property store
+def load_texts(paths: Iterable[str], db_path: Optional[str] = None) -> List[Tuple[str, str]]:
+    texts = []
+    for path in map(Path, paths):
+        files = sorted(p for p in path.iterdir() if p.suffix.lower() in TEXT_EXTENSIONS) if path.is_dir() else [path]
+        texts.extend((f.name, f.read_text(encoding="utf-8")) for f in files)
+    if db_path:
+        store = PropertyStore(db_path)
+        for key, record in store.items():
+            ocr_text = (record.get(SOURCE_TEXT_FIELD) or {}).get("ocr_text")
+            if ocr_text:
+                texts.append((key, ocr_text))
+        store.close()
+    return texts
+
+def _timed(function: Callable[[str], object], texts: List[str]) -> Tuple[List[object], List[float]]:
+    results, seconds = [], []
+    for text in texts:
+        started = time.perf_counter()
+        try:
+            results.append(function(text))
+        except Exception:
+            results.append(None)
+        seconds.append(time.perf_counter() - started)
+    return results, seconds
+
+# Whether each detector would send the text for translation. langdetect raises on
+# text without letters, which the pipeline treated as "no translation".
+def _langdetect_translates(language: Optional[str]) -> bool:
+    return language is not None and language != "en"
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Devanagari-ratio script detector against langdetect.")
+    parser.add_argument("texts", nargs="*", help="OCR text files, or directories of them")
+    parser.add_argument("--db", help="Also use the OCR text kept with the records of this property store")
+    args = parser.parse_args(argv)
+
+    try:
+        from langdetect import DetectorFactory, detect
+        from langdetect.detector_factory import init_factory
+    except ImportError:
+        parser.error("langdetect is needed for the comparison: pip install langdetect")
+    DetectorFactory.seed = 0
+    init_factory()
+
+    named = load_texts(args.texts, args.db)
+    if not named:
+        parser.error("no notice texts found")
+    texts = [text for _, text in named]
+
+    # Whole-notice decisions and timings, after one warm-up call of each detector
+    detect(texts[0])
+    classify_lines(texts[0])
+    ld_languages, ld_seconds = _timed(detect, texts)
+    scripts, sd_seconds = _timed(text_script, texts)
+    notice_agree = [_langdetect_translates(language) == (script == DEVANAGARI)
+                    for language, script in zip(ld_languages, scripts)]
+
+    # Per-line decisions, on lines with letters
+    line_pairs = []
+    for name, text in named:
+        for line, script in zip(text.split("\n"), classify_lines(text)):
+            if script == NEUTRAL:
+                continue
+            try:
+                language = detect(line)
+            except Exception:
+                language = None
+            line_pairs.append((name, line, language, script))
+    line_agree = [_langdetect_translates(language) == (script == DEVANAGARI) for _, _, language, script in line_pairs]
+
+    mean_ld, mean_sd = statistics.mean(ld_seconds), statistics.mean(sd_seconds)
+    print(f"{len(texts)} notices, {sum(len(t) for t in texts)} characters, {len(line_pairs)} lines with letters")
+    print(f"langdetect:      {mean_ld * 1e3:8.3f} ms per notice")
+    print(f"script detector: {mean_sd * 1e3:8.3f} ms per notice, deciding every line ({mean_ld / max(mean_sd, 1e-9):.0f}x faster)")
+    print(f"Translate / skip agreement: {sum(notice_agree) / len(notice_agree):.1%} of notices, "
+          f"{sum(line_agree) / max(len(line_agree), 1):.1%} of lines")
+    print(f"Notices sent for translation: langdetect {sum(map(_langdetect_translates, ld_languages))}, "
+          f"script detector {sum(script == DEVANAGARI for script in scripts)}")
+
+    disagreements = [(name, line, language, script) for (name, line, language, script), agrees
+                     in zip(line_pairs, line_agree) if not agrees]
+    if disagreements:
+        print("\nLine disagreements (langdetect / script detector):")
+        for name, line, language, script in disagreements[:MAX_REPORTED_DISAGREEMENTS]:
+            print(f"  {name}: {language or '-'} / {script}: {line.strip()[:80]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
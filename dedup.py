@@ -0,0 +1,220 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, MutableMapping, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from models import COPIES_FIELD
+from store import DEFAULT_DB_PATH
+
+DEFAULT_DEDUP_PATH = DEFAULT_DB_PATH.with_name("dedup.sqlite3")
+
+# Result field marking a notice as a copy of an existing record; the record lists
+# its copies under models.COPIES_FIELD
+DUPLICATE_OF_FIELD = "duplicate_of"
+
+# Perceptual hash: the low 8x8 DCT frequencies of a 32x32 greyscale thumbnail, one
+# bit per coefficient above the median. Scans within this many bits are the same image.
+HASH_SIZE = 8
+HASH_IMAGE_SIZE = 32
+IMAGE_DISTANCE_THRESHOLD = 6
+
+# MinHash signature length, split into LSH bands of rows each. Texts whose estimated
+# Jaccard similarity (over word shingles) reaches the threshold are the same notice.
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_WORDS = 3
+TEXT_SIMILARITY_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_PERMUTATION_SEED = 1
+_rng = np.random.RandomState(_PERMUTATION_SEED)
+# a < 2^31 and shingle hashes < 2^32 keep a * x + b within 64 bits
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+# Words of the text: letters and digits in any script, including Devanagari vowel signs
+_WORD = re.compile(r"[\w\u0900-\u097F]+")
+
+class DuplicateMatch(NamedTuple):
+    key: str
+    # "image" or "text"
+    match: str
+    similarity: float
+
+def _dct_matrix(size: int) -> np.ndarray:
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix(HASH_IMAGE_SIZE)
+
+# 64-bit perceptual hash (pHash) of an encoded image
+def image_hash(image_data: bytes) -> int:
+    image = ImageOps.exif_transpose(Image.open(BytesIO(image_data))).convert("L")
+    pixels = np.asarray(image.resize((HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term only measures overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+# Overlapping runs of SHINGLE_WORDS words of the lower-cased text, so OCR line breaks,
+# hyphenation and column layout don't change the set much
+def text_shingles(text: str) -> List[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+# MinHash signature of the text's shingles, or None for text without words
+def text_signature(text: str) -> Optional[np.ndarray]:
+    shingles = set(text_shingles(text))
+    if not shingles:
+        return None
+    hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big")
+                       for shingle in shingles], dtype=np.uint64)
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % np.uint64(_MERSENNE_PRIME)
+    return permuted.min(axis=1)
+
+def signature_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+def _bands(signature: np.ndarray) -> List[str]:
+    return [hashlib.blake2b(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(), digest_size=8).hexdigest()
+            for band in range(LSH_BANDS)]
+
+# Image hashes and text signatures of the notices already in the database, kept in
+# SQLite so every process (app, workers, ingest runs) checks against the same set.
+# Each process holds them in memory and reads rows added by others before a lookup.
+# exists(key) reports whether a record is still in the database; matches whose
+# record has since been deleted are ignored.
+class DuplicateIndex:
+    def __init__(self, path: Union[str, Path] = DEFAULT_DEDUP_PATH, exists: Optional[Callable[[str], bool]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.exists = exists or (lambda key: True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                image_hash INTEGER,
+                signature BLOB
+            )
+        """)
+        self._conn.commit()
+        self._synced_id = 0
+        self._image_keys: List[str] = []
+        self._image_hashes = np.zeros(0, dtype=np.uint64)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, str], set] = {}
+
+    def _sync(self):
+        rows = self._conn.execute("SELECT id, key, image_hash, signature FROM fingerprints WHERE id > ? ORDER BY id",
+                                  (self._synced_id,)).fetchall()
+        if not rows:
+            return
+        hashes = []
+        for row_id, key, hash_value, signature in rows:
+            self._synced_id = row_id
+            if hash_value is not None:
+                self._image_keys.append(key)
+                hashes.append(hash_value & 0xFFFFFFFFFFFFFFFF)
+            if signature is not None:
+                self._add_signature(key, np.frombuffer(signature, dtype=np.uint64))
+        if hashes:
+            self._image_hashes = np.concatenate([self._image_hashes, np.array(hashes, dtype=np.uint64)])
+
+    def _add_signature(self, key: str, signature: np.ndarray):
+        self._signatures[key] = signature
+        for band, bucket in enumerate(_bands(signature)):
+            self._buckets.setdefault((band, bucket), set()).add(key)
+
+    # Closest stored image within IMAGE_DISTANCE_THRESHOLD bits, other than exclude
+    def find_image(self, hash_value: int, exclude: Optional[str] = None) -> Optional[DuplicateMatch]:
+        with self._lock:
+            self._sync()
+            if not self._image_keys:
+                return None
+            distances = _popcount(self._image_hashes ^ np.uint64(hash_value))
+            keys = self._image_keys
+        for i in np.argsort(distances, kind="stable"):
+            if distances[i] > IMAGE_DISTANCE_THRESHOLD:
+                break
+            if keys[i] != exclude and self.exists(keys[i]):
+                return DuplicateMatch(keys[i], "image", 1.0 - distances[i] / (HASH_SIZE * HASH_SIZE))
+        return None
+
+    # Most similar stored text at or above TEXT_SIMILARITY_THRESHOLD, other than exclude.
+    # Candidates come from the LSH buckets; only they are compared in full.
+    def find_text(self, signature: Optional[np.ndarray], exclude: Optional[str] = None) -> Optional[DuplicateMatch]:
+        if signature is None:
+            return None
+        with self._lock:
+            self._sync()
+            candidates = set()
+            for band, bucket in enumerate(_bands(signature)):
+                candidates |= self._buckets.get((band, bucket), set())
+            scored = sorted(((signature_similarity(signature, self._signatures[key]), key) for key in candidates if key != exclude),
+                            reverse=True)
+        for similarity, key in scored:
+            if similarity < TEXT_SIMILARITY_THRESHOLD:
+                break
+            if self.exists(key):
+                return DuplicateMatch(key, "text", similarity)
+        return None
+
+    # Remember a processed notice's image hash and / or text signature
+    def add(self, key: str, hash_value: Optional[int] = None, signature: Optional[np.ndarray] = None):
+        if hash_value is None and signature is None:
+            return
+        with self._lock:
+            # Stored as a signed 64-bit integer, which is what SQLite holds
+            stored_hash = hash_value - (1 << 64) if hash_value is not None and hash_value >= 1 << 63 else hash_value
+            self._conn.execute("INSERT INTO fingerprints (key, image_hash, signature) VALUES (?, ?, ?)",
+                               (key, stored_hash, signature.tobytes() if signature is not None else None))
+            self._conn.commit()
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def duplicate_result(match: DuplicateMatch) -> Dict[str, Any]:
+    return {DUPLICATE_OF_FIELD: match.key, "match": match.match, "similarity": round(match.similarity, 3)}
+
+def is_duplicate(result: Mapping[str, Any]) -> bool:
+    return isinstance(result, Mapping) and DUPLICATE_OF_FIELD in result
+
+# Link a duplicate notice to the record it copies instead of storing it again: the
+# copy's key is added to the record's COPIES_FIELD section. Returns the updated record,
+# or None if the record no longer exists.
+def link_duplicate(store: MutableMapping[str, Any], key: str, result: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    original_key = result[DUPLICATE_OF_FIELD]
+    if original_key not in store:
+        return None
+    record = dict(store[original_key])
+    copies = [copy for copy in record.get(COPIES_FIELD) or [] if copy.get("key") != key]
+    copies.append({"key": key, "match": result["match"], "similarity": result["similarity"]})
+    record[COPIES_FIELD] = copies
+    store[original_key] = record
+    return record
+
+# A reprocessed notice keeps the copies linked to its previous record
+def keep_copies(store: Mapping[str, Any], key: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    previous = store[key] if key in store else None
+    if previous and previous.get(COPIES_FIELD):
+        record = dict(record, **{COPIES_FIELD: previous[COPIES_FIELD]})
+    return record
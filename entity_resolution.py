@@ -0,0 +1,244 @@
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Set, Tuple
+
+from land_records import EQUIVALENT_SCHEMES, LandParcel, record_parcels
+from normalize import derived_fields
+from search_index import field_text, get_address
+from trigram_index import normalize_name, trigrams
+
+# Names that identify the building or complex a property is in
+PROPERTY_NAME_FIELDS = ["building_name", "society_or_complex_name"]
+
+# Fields naming the unit within a building. Two notices naming different units
+# are about different properties, however alike the rest of the address is.
+UNIT_FIELDS = [
+    "flat_or_apartment_numbers",
+    "office_or_shop_numbers",
+    "bungalow_or_house_number",
+    "building_wing_or_tower_or_number",
+]
+
+# Administrative fields a block is qualified with, so a name or parcel is only
+# compared within the same area
+AREA_FIELDS = ["village", "taluka", "district_and_or_sub_district", "city"]
+
+# Name words shorter than this are not used as blocking keys on their own
+MIN_BLOCK_WORD = 4
+
+# Blocks holding more records than this are too unspecific to compare within
+# (e.g. a common word in a large district); matches must come from another block
+MAX_BLOCK_SIZE = 500
+
+# Two records are linked when their best name similarity (trigram Jaccard) or
+# a shared land parcel reaches this score and nothing about them conflicts
+MATCH_THRESHOLD = 0.7
+
+_UNIT_TOKEN_RE = re.compile(r"\d+[a-z]?|\b[a-z]\b")
+_PIN_RE = re.compile(r"\b\d{6}\b")
+
+BlockKey = Tuple[str, ...]
+
+# What a record is compared on, extracted once when it is added
+class PropertyFeatures(NamedTuple):
+    names: Tuple[str, ...]
+    name_grams: Tuple[FrozenSet[str], ...]
+    parcels: Tuple[LandParcel, ...]
+    units: Tuple[Tuple[str, FrozenSet[str]], ...]
+    pin: str
+    district: str
+    areas: Tuple[str, ...]
+
+def _unit_tokens(value: str) -> FrozenSet[str]:
+    return frozenset(_UNIT_TOKEN_RE.findall(value.lower().replace("no.", " ")))
+
+def _scheme(scheme: str) -> str:
+    return EQUIVALENT_SCHEMES.get(scheme, (scheme,))[0]
+
+def record_features(record: Mapping[str, Any]) -> PropertyFeatures:
+    address = get_address(record) or {}
+    names = tuple(dict.fromkeys(name for name in (normalize_name(field_text(address.get(field)))
+                                                  for field in PROPERTY_NAME_FIELDS) if name))
+    units = tuple((field, _unit_tokens(field_text(address.get(field)))) for field in UNIT_FIELDS)
+    pin = _PIN_RE.search(field_text(address.get("pin_code")).replace(" ", ""))
+    areas = [normalize_name(field_text(address.get(field))) for field in AREA_FIELDS]
+    return PropertyFeatures(
+        names=names,
+        name_grams=tuple(frozenset(trigrams(name)) for name in names),
+        parcels=tuple(record_parcels(record)),
+        units=tuple((field, tokens) for field, tokens in units if tokens),
+        pin=pin.group(0) if pin else "",
+        district=normalize_name(field_text(address.get("district_and_or_sub_district"))),
+        areas=tuple(dict.fromkeys(area for area in areas if area)),
+    )
+
+# Blocking keys of a record: its building / society names (whole, without spaces,
+# and by each longer word) and its land parcels, each qualified by every area the
+# record names (PIN, village, taluka, district, city). Only records sharing a block
+# are ever compared. With unqualified, whole names and parcels are also keyed without
+# an area, for lookups against records that may name different areas.
+def blocking_keys(features: PropertyFeatures, unqualified: bool = False) -> List[BlockKey]:
+    areas = [area for area in (features.pin, *features.areas) if area] or [""]
+    keys: Dict[BlockKey, None] = {}
+    for area in areas:
+        for name in features.names:
+            keys[("name", area, name.replace(" ", ""))] = None
+            for word in name.split():
+                if len(word) >= MIN_BLOCK_WORD:
+                    keys[("word", area, word)] = None
+        for parcel in features.parcels:
+            keys[("parcel", area, _scheme(parcel.scheme), parcel.number)] = None
+    if unqualified and areas != [""]:
+        for name in features.names:
+            keys[("name", "", name.replace(" ", ""))] = None
+        for parcel in features.parcels:
+            keys[("parcel", "", _scheme(parcel.scheme), parcel.number)] = None
+    return list(keys)
+
+def _same_parcel(a: LandParcel, b: LandParcel) -> bool:
+    if _scheme(a.scheme) != _scheme(b.scheme) or a.number != b.number:
+        return False
+    return not a.subdivision or not b.subdivision or a.subdivision == b.subdivision
+
+def shares_parcel(a: PropertyFeatures, b: PropertyFeatures) -> bool:
+    return any(_same_parcel(x, y) for x in a.parcels for y in b.parcels)
+
+# Best trigram Jaccard similarity between the two records' building / society names
+def name_similarity(a: PropertyFeatures, b: PropertyFeatures) -> float:
+    best = 0.0
+    for grams_a in a.name_grams:
+        for grams_b in b.name_grams:
+            shared = len(grams_a & grams_b)
+            if shared:
+                best = max(best, shared / (len(grams_a) + len(grams_b) - shared))
+    return best
+
+# True if the two records are in different PIN codes or districts
+def areas_conflict(a: PropertyFeatures, b: PropertyFeatures) -> bool:
+    if a.pin and b.pin and a.pin != b.pin:
+        return True
+    return bool(a.district and b.district and not set(a.district.split()) & set(b.district.split()))
+
+# True if both records name a unit of the same kind (flat, shop, wing, ...) and no number is shared
+def units_conflict(a: PropertyFeatures, b: PropertyFeatures) -> bool:
+    units_b = dict(b.units)
+    return any(field in units_b and not tokens & units_b[field] for field, tokens in a.units)
+
+# Similarity of two records as the same property, 0 if they conflict
+def match_score(a: PropertyFeatures, b: PropertyFeatures) -> float:
+    # A notice about a whole building or plot is not a notice about one flat in it
+    if areas_conflict(a, b) or bool(a.units) != bool(b.units) or units_conflict(a, b):
+        return 0.0
+    if shares_parcel(a, b):
+        return 1.0
+    return name_similarity(a, b)
+
+# Groups records into property clusters: the connected components of the links
+# between records that match_score says are the same property. Candidates for a
+# new record come from its blocking keys, so adding a record costs the size of its
+# blocks rather than the size of the database. Clusters are kept up to date as
+# records are added and removed; removing a record re-splits only its own cluster.
+class PropertyClusters:
+    def __init__(self):
+        self.blocks: Dict[BlockKey, Set[str]] = {}
+        self.features: Dict[str, PropertyFeatures] = {}
+        self.links: Dict[str, Set[str]] = {}
+        self.dates: Dict[str, str] = {}
+        self.cluster_of: Dict[str, int] = {}
+        self.clusters: Dict[int, Set[str]] = {}
+        self._next_id = 0
+
+    @classmethod
+    def build(cls, data: Mapping[str, Any]) -> "PropertyClusters":
+        index = cls()
+        for key, record in data.items():
+            index.add(key, record)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def _candidates(self, features: PropertyFeatures) -> Set[str]:
+        candidates: Set[str] = set()
+        for block in blocking_keys(features):
+            members = self.blocks.get(block)
+            if members and len(members) <= MAX_BLOCK_SIZE:
+                candidates |= members
+        return candidates
+
+    def _new_cluster(self, keys: Iterable[str]) -> int:
+        cluster_id = self._next_id
+        self._next_id += 1
+        self.clusters[cluster_id] = set(keys)
+        for key in self.clusters[cluster_id]:
+            self.cluster_of[key] = cluster_id
+        return cluster_id
+
+    def add(self, key: str, record: Mapping[str, Any]):
+        if key in self.features:
+            self.remove(key)
+        features = record_features(record)
+        links = {other for other in self._candidates(features) if match_score(features, self.features[other]) >= MATCH_THRESHOLD}
+
+        self.features[key] = features
+        self.dates[key] = derived_fields(record).get("notice_date") or ""
+        for block in blocking_keys(features):
+            self.blocks.setdefault(block, set()).add(key)
+        self.links[key] = links
+        for other in links:
+            self.links[other].add(key)
+
+        # Join the clusters of every linked record, relabelling the smaller ones
+        cluster_ids = sorted({self.cluster_of[other] for other in links}, key=lambda cid: -len(self.clusters[cid]))
+        if not cluster_ids:
+            self._new_cluster([key])
+            return
+        target = cluster_ids[0]
+        for cluster_id in cluster_ids[1:]:
+            for member in self.clusters.pop(cluster_id):
+                self.cluster_of[member] = target
+                self.clusters[target].add(member)
+        self.clusters[target].add(key)
+        self.cluster_of[key] = target
+
+    def remove(self, key: str):
+        features = self.features.pop(key, None)
+        if features is None:
+            return
+        self.dates.pop(key, None)
+        for block in blocking_keys(features):
+            members = self.blocks.get(block)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self.blocks[block]
+        for other in self.links.pop(key, set()):
+            self.links[other].discard(key)
+
+        # The rest of the cluster may have been held together by this record
+        remaining = self.clusters.pop(self.cluster_of.pop(key))
+        remaining.discard(key)
+        while remaining:
+            start = remaining.pop()
+            component, frontier = {start}, [start]
+            while frontier:
+                for other in self.links[frontier.pop()]:
+                    if other not in component:
+                        component.add(other)
+                        frontier.append(other)
+            remaining -= component
+            self._new_cluster(component)
+
+    # Every record about the same property as key (key included), oldest notice
+    # first and undated ones last; [] if key is not indexed
+    def history(self, key: str) -> List[str]:
+        cluster_id = self.cluster_of.get(key)
+        if cluster_id is None:
+            return []
+        return sorted(self.clusters[cluster_id], key=lambda member: (not self.dates[member], self.dates[member], member))
+
+    # Indexed records matching a record that is not (necessarily) in the index, best first
+    def matches(self, record: Mapping[str, Any], top_n: int = 10) -> List[Tuple[str, float]]:
+        features = record_features(record)
+        scored = [(other, match_score(features, self.features[other])) for other in self._candidates(features)]
+        ranked = sorted((item for item in scored if item[1] >= MATCH_THRESHOLD), key=lambda item: (-item[1], item[0]))
+        return [(other, round(score, 4)) for other, score in ranked[:top_n]]
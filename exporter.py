@@ -0,0 +1,142 @@
+import argparse
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+
+from store import DEFAULT_DB_PATH, PropertyStore, json_default
+
+# Export formats. "json" is the {key: record} document the app has always saved;
+# the NDJSON formats hold one {"key": ..., "record": ...} entry per line, and a
+# {"key": ..., "deleted": true} tombstone for records deleted in a delta export.
+EXPORT_FORMATS = {
+    "json": {"extension": ".json", "mime": "application/json"},
+    "ndjson": {"extension": ".ndjson", "mime": "application/x-ndjson"},
+    "ndjson.gz": {"extension": ".ndjson.gz", "mime": "application/gzip"},
+}
+
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+
+DEFAULT_EXPORT_DIR = DEFAULT_DB_PATH.parent / "exports"
+
+# Store meta entry holding the version (store timestamp) of the last delta export
+LAST_EXPORT_META = "last_export_version"
+
+# Versions are the store's updated_at timestamps, stamped before a writer commits,
+# so a slower writer (worker, ingest run) can commit an older timestamp after a newer
+# one was exported. Delta exports also include the changes this many seconds before
+# `since`; records exported twice are simply imported again.
+EXPORT_OVERLAP = 60.0
+
+# Bytes handed to the output at a time
+WRITE_BUFFER_SIZE = 1 << 16
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=json_default, ensure_ascii=False)
+
+# True for file names of the NDJSON formats, gzip-compressed or not
+def is_ndjson(file_name: str) -> bool:
+    name = file_name.lower()
+    if name.endswith(".gz"):
+        name = name[:-len(".gz")]
+    return name.endswith(NDJSON_EXTENSIONS)
+
+# The {key: record} document, one record at a time
+def iter_json(records: Iterable[Tuple[str, Any]]) -> Iterator[str]:
+    yield "{"
+    separator = "\n"
+    for key, record in records:
+        yield f"{separator}{_dumps(key)}: {_dumps(record)}"
+        separator = ",\n"
+    yield "\n}\n"
+
+def iter_ndjson(records: Iterable[Tuple[str, Any]], deleted: Iterable[str] = ()) -> Iterator[str]:
+    for key, record in records:
+        yield _dumps({"key": key, "record": record}) + "\n"
+    for key in deleted:
+        yield _dumps({"key": key, "deleted": True}) + "\n"
+
+# Stream records into a binary file object in the given format, never holding more
+# than WRITE_BUFFER_SIZE bytes of output. Returns the number of bytes written before
+# compression.
+def write_export(out: BinaryIO, records: Iterable[Tuple[str, Any]], export_format: str = "ndjson",
+                 deleted: Iterable[str] = ()) -> int:
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if export_format == "json":
+        deleted = list(deleted)
+        if deleted:
+            raise ValueError("The json format cannot hold deletions; use ndjson for delta exports")
+        chunks = iter_json(records)
+    else:
+        chunks = iter_ndjson(records, deleted)
+
+    target = gzip.GzipFile(fileobj=out, mode="wb") if export_format.endswith(".gz") else out
+    written, buffer = 0, []
+    buffered = 0
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= WRITE_BUFFER_SIZE:
+            target.write(b"".join(buffer))
+            written += buffered
+            buffer, buffered = [], 0
+    target.write(b"".join(buffer))
+    written += buffered
+    if target is not out:
+        target.close()
+    return written
+
+# Export the store, or only what changed after the `since` version (less
+# EXPORT_OVERLAP), to a file. Returns the store version the export is complete up
+# to; pass it back as `since` to get the next delta.
+def export_store(store: PropertyStore, path: Union[str, Path], export_format: str = "ndjson",
+                 since: Optional[float] = None) -> float:
+    version = store.last_updated()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    after = since - EXPORT_OVERLAP if since is not None else None
+    deleted = store.deleted_since(after) if after is not None else []
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write_export(f, store.items(updated_after=after), export_format, deleted)
+    tmp_path.replace(path)
+    return max(version, since or 0)
+
+def export_file_name(export_format: str, since: Optional[float] = None, prefix: str = "property_database") -> str:
+    suffix = f"_since_{since:.6f}" if since is not None else ""
+    return f"{prefix}{suffix}{EXPORT_FORMATS[export_format]['extension']}"
+
+# Command line entry point for scheduled syncs: export everything, or everything
+# changed since the last delta export
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export the property store as JSON or NDJSON.")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite property store to export")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson.gz")
+    parser.add_argument("--since", help="Only export changes after this version, or 'last' for the previous delta export")
+    parser.add_argument("--out", help="File to write (default: data/exports/<generated name>)")
+    args = parser.parse_args(argv)
+
+    store = PropertyStore(args.db)
+    since = None
+    if args.since == "last":
+        last = store.get_meta(LAST_EXPORT_META)
+        since = float(last) if last is not None else None
+    elif args.since:
+        since = float(args.since)
+
+    started = time.perf_counter()
+    out = Path(args.out) if args.out else DEFAULT_EXPORT_DIR / export_file_name(args.format, since)
+    version = export_store(store, out, args.format, since)
+    if since is not None or args.since == "last":
+        store.set_meta(LAST_EXPORT_META, repr(version))
+    store.close()
+
+    print(f"Wrote {out} (version {version!r}) in {time.perf_counter() - started:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import bisect
+import difflib
+import re
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from search_index import field_text, get_address
+
+# The Advanced Search criteria and how much a match on each one counts.
+# Land identifiers and PIN codes pin down a property far better than a street name.
+CRITERIA_WEIGHTS = {
+    "survey_or_cs_or_cts_number": 3.0,
+    "pin_code": 2.5,
+    "flat_or_apartment_numbers": 2.0,
+    "office_or_shop_numbers": 2.0,
+    "building_name": 2.0,
+    "society_or_complex_name": 2.0,
+    "street_or_road_or_marg": 1.5,
+    "locality_or_area_or_neighbourhood": 1.5,
+    "city": 1.0,
+    "type_of_property": 0.5,
+}
+
+# Criteria stored on PropertyDetails rather than on its Address
+PROPERTY_FIELDS = {"type_of_property"}
+
+MATCH_MODES = ["exact", "prefix", "fuzzy"]
+
+# Credit given to a query token matched by prefix or fuzzily instead of exactly
+PREFIX_CREDIT = 0.8
+FUZZY_CREDIT = 0.6
+FUZZY_CUTOFF = 0.75
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+# Lowercase and collapse punctuation so "C.S. No. 459/89B" and "cs no 459 89b" compare equal
+def normalize_value(field: str, value: str) -> str:
+    value = _NON_ALNUM_RE.sub(" ", value.lower()).strip()
+    if field == "pin_code":
+        value = value.replace(" ", "")
+    return value
+
+# Return the raw value of a criterion field for a record in either database shape
+def record_field(record: Mapping[str, Any], field: str) -> str:
+    if field in PROPERTY_FIELDS:
+        details = record.get("property_details", record) if isinstance(record, Mapping) else {}
+        return field_text((details or {}).get(field))
+    address = get_address(record) or {}
+    return field_text(address.get(field))
+
+# Per-field exact / token / prefix indexes over the Advanced Search criteria.
+# Scoring is local and deterministic: ties are broken by key.
+class FieldedQueryEngine:
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = weights or CRITERIA_WEIGHTS
+        self.value_index: Dict[str, Dict[str, Set[str]]] = {field: {} for field in self.weights}
+        self.token_index: Dict[str, Dict[str, Set[str]]] = {field: {} for field in self.weights}
+        self.doc_fields: Dict[str, Dict[str, Tuple[str, Tuple[str, ...]]]] = {}
+        self._vocab: Dict[str, List[str]] = {}
+
+    @classmethod
+    def build(cls, data: Mapping[str, Any]) -> "FieldedQueryEngine":
+        engine = cls()
+        for key, record in data.items():
+            engine.add(key, record)
+        return engine
+
+    def __len__(self) -> int:
+        return len(self.doc_fields)
+
+    def add(self, key: str, record: Mapping[str, Any]):
+        if key in self.doc_fields:
+            self.remove(key)
+        fields = {}
+        for field in self.weights:
+            value = normalize_value(field, record_field(record, field))
+            if not value:
+                continue
+            tokens = tuple(dict.fromkeys(value.split()))
+            fields[field] = (value, tokens)
+            self.value_index[field].setdefault(value, set()).add(key)
+            for token in tokens:
+                postings = self.token_index[field].setdefault(token, set())
+                if not postings:
+                    self._vocab.pop(field, None)
+                postings.add(key)
+        self.doc_fields[key] = fields
+
+    def remove(self, key: str):
+        fields = self.doc_fields.pop(key, None)
+        if not fields:
+            return
+        for field, (value, tokens) in fields.items():
+            self._discard(self.value_index[field], value, key)
+            for token in tokens:
+                if self._discard(self.token_index[field], token, key):
+                    self._vocab.pop(field, None)
+
+    # Remove key from a posting set; returns True when the posting became empty
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], term: str, key: str) -> bool:
+        postings = index.get(term)
+        if postings is None:
+            return False
+        postings.discard(key)
+        if not postings:
+            del index[term]
+            return True
+        return False
+
+    # Sorted distinct tokens of a field, rebuilt lazily after the vocabulary changes
+    def vocabulary(self, field: str) -> List[str]:
+        if field not in self._vocab:
+            self._vocab[field] = sorted(self.token_index[field])
+        return self._vocab[field]
+
+    def _prefix_tokens(self, field: str, prefix: str) -> List[str]:
+        vocab = self.vocabulary(field)
+        start = bisect.bisect_left(vocab, prefix)
+        end = bisect.bisect_left(vocab, prefix + "\uffff")
+        return vocab[start:end]
+
+    # Best credit (0-1) each matching record gets for one query token
+    def _token_matches(self, field: str, token: str, mode: str) -> Dict[str, float]:
+        credits: Dict[str, float] = {key: 1.0 for key in self.token_index[field].get(token, ())}
+        if mode in ("prefix", "fuzzy"):
+            for candidate in self._prefix_tokens(field, token):
+                for key in self.token_index[field][candidate]:
+                    credits.setdefault(key, PREFIX_CREDIT)
+        if mode == "fuzzy":
+            for candidate in difflib.get_close_matches(token, self.vocabulary(field), n=10, cutoff=FUZZY_CUTOFF):
+                similarity = difflib.SequenceMatcher(None, token, candidate).ratio()
+                for key in self.token_index[field][candidate]:
+                    credits[key] = max(credits.get(key, 0.0), FUZZY_CREDIT * similarity)
+        return credits
+
+    # Score one criterion: a full-value exact match earns the whole weight, otherwise
+    # the weight is shared out across the query tokens that match
+    def _score_field(self, field: str, query_value: str, mode: str) -> Dict[str, float]:
+        weight = self.weights[field]
+        scores: Dict[str, float] = {}
+        tokens = list(dict.fromkeys(query_value.split()))
+        if mode != "exact" or len(tokens) > 1:
+            for token in tokens:
+                for key, credit in self._token_matches(field, token, mode).items():
+                    scores[key] = scores.get(key, 0.0) + weight * credit / len(tokens)
+        for key in self.value_index[field].get(query_value, ()):
+            scores[key] = weight
+        if mode == "exact":
+            # Exact mode still accepts records where every query token is present
+            scores = {key: score for key, score in scores.items() if score >= weight - 1e-9}
+        return scores
+
+    # Return up to top_n (key, score) pairs for the given criteria, best first
+    def search(self, criteria: Mapping[str, str], mode: str = "prefix", top_n: int = 3) -> List[Tuple[str, float]]:
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode}")
+
+        totals: Dict[str, float] = {}
+        for field, raw_value in criteria.items():
+            if field not in self.weights or not raw_value or raw_value == "n/a":
+                continue
+            query_value = normalize_value(field, raw_value)
+            if not query_value:
+                continue
+            for key, score in self._score_field(field, query_value, mode).items():
+                totals[key] = totals.get(key, 0.0) + score
+
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [(key, round(score, 4)) for key, score in ranked[:top_n]]
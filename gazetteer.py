@@ -0,0 +1,280 @@
+import argparse
+import csv
+import json
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+from search_index import field_text
+from trigram_index import normalize_name
+
+DEFAULT_GAZETTEER_PATH = Path(__file__).parent / "data" / "gazetteer.json"
+
+DISTRICT_FIELD = "district_and_or_sub_district"
+
+# Words naming the kind of administrative unit rather than the unit itself,
+# e.g. "Dist-Latur", "Tal. Vasai", "Registration Sub-District Andheri"
+ADMIN_WORDS = {
+    "district", "dist", "distt", "dt", "taluka", "taluk", "tal", "tq", "tehsil", "tahsil",
+    "sub", "registration", "registrar", "division", "municipal", "corporation", "council",
+    "state", "maharashtra", "india",
+}
+
+# Village suffixes telling apart the larger and smaller halves of a village
+# ("Bhuigaon Budruk" / "Bhuigaon Khurd"); both halves are in the same taluka
+VILLAGE_SUFFIXES = {"budruk", "bk", "bu", "khurd", "kh"}
+
+# Directions a locality is split by ("Andheri (East)"), ignored when looking one up as a village
+DIRECTION_WORDS = {"east", "west", "north", "south"}
+
+_WORD_RE = re.compile(r"[^0-9a-z]+")
+_PIN_RE = re.compile(r"\b\d{6}\b")
+
+# A taluka, as (taluka, district)
+Taluka = Tuple[str, str]
+
+# Lookup key of a place name: lower-cased, without administrative words or
+# "Mouje" / "Village", and with romanisation variants folded as in fuzzy search
+def place_key(value: str) -> str:
+    words = [word for word in _WORD_RE.split(value.lower()) if word and word not in ADMIN_WORDS]
+    return normalize_name(" ".join(words))
+
+# Word trie over place keys, for finding a known name inside a longer value such
+# as "Mumbai City & Mumbai Suburban" or "Andheri, Mumbai Suburban District"
+class AliasTrie:
+    def __init__(self):
+        self.root: Dict[str, Any] = {}
+
+    def add(self, key: str, value: Any):
+        node = self.root
+        for word in key.split():
+            node = node.setdefault(word, {})
+        node.setdefault("", set()).add(value)
+
+    # Values of the longest names found anywhere in key (several if names of that length tie)
+    def search(self, key: str) -> Set[Any]:
+        words = key.split()
+        best_length, found = 0, set()
+        for start in range(len(words)):
+            node = self.root
+            for end in range(start, len(words)):
+                node = node.get(words[end])
+                if node is None:
+                    break
+                if "" in node:
+                    length = end - start + 1
+                    if length > best_length:
+                        best_length, found = length, set(node[""])
+                    elif length == best_length:
+                        found |= node[""]
+        return found
+
+# Hash lookup of exact keys, falling back to the longest names in the trie
+class AliasIndex:
+    def __init__(self):
+        self.exact: Dict[str, Set[Any]] = {}
+        self.trie = AliasTrie()
+
+    def add(self, name: str, value: Any):
+        key = place_key(name)
+        if key:
+            self.exact.setdefault(key, set()).add(value)
+            self.trie.add(key, value)
+
+    def lookup(self, value: str, partial: bool = True) -> Set[Any]:
+        key = place_key(value)
+        if not key:
+            return set()
+        found = self.exact.get(key)
+        if found is not None:
+            return set(found)
+        return self.trie.search(key) if partial else set()
+
+# Offline Maharashtra gazetteer: districts, their talukas and villages, cities and
+# PIN code ranges, with the aliases and older names each is known by. Resolves the
+# names OCR and extraction produce to the canonical District / City values, and
+# infers a notice's missing taluka and district from the places it does name.
+class Gazetteer:
+    def __init__(self, data: Mapping[str, Any]):
+        self.data = data
+        self.districts = AliasIndex()
+        self.cities = AliasIndex()
+        self.city_districts: Dict[str, Optional[str]] = {}
+        self.talukas = AliasIndex()
+        self.villages = AliasIndex()
+        # PIN ranges by their first three digits, as (low, high, district)
+        self.pin_ranges: Dict[str, List[Tuple[int, int, str]]] = {}
+
+        for district, entry in data.get("districts", {}).items():
+            for name in [district, *entry.get("aliases", [])]:
+                self.districts.add(name, district)
+            for low, high in entry.get("pin_ranges", []):
+                for prefix in range(low // 1000, high // 1000 + 1):
+                    self.pin_ranges.setdefault(str(prefix), []).append((low, high, district))
+            for taluka, taluka_entry in entry.get("talukas", {}).items():
+                for name in [taluka, *taluka_entry.get("aliases", [])]:
+                    self.talukas.add(name, (taluka, district))
+                for village in taluka_entry.get("villages", []):
+                    self.add_village(village, taluka, district)
+        for city, entry in data.get("cities", {}).items():
+            self.city_districts[city] = entry.get("district")
+            for name in [city, *entry.get("aliases", [])]:
+                self.cities.add(name, city)
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = DEFAULT_GAZETTEER_PATH) -> "Gazetteer":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def add_village(self, village: str, taluka: str, district: str):
+        self.villages.add(village, (taluka, district))
+        words = place_key(village).split()
+        if len(words) > 1 and words[-1] in VILLAGE_SUFFIXES:
+            self.villages.add(" ".join(words[:-1]), (taluka, district))
+
+    # Canonical district named by value (a District enum value), or None. A district
+    # found inside a longer value is not taken when the whole value is a city outside
+    # it: "Navi Mumbai" names a city in Thane / Raigad, not Mumbai.
+    def district(self, value: str) -> Optional[str]:
+        found = self.districts.lookup(value, partial=False) or self.districts.lookup(value)
+        if len(found) != 1:
+            return None
+        district = next(iter(found))
+        for city in self.cities.lookup(value, partial=False):
+            if self.city_districts.get(city) != district:
+                return None
+        return district
+
+    # Canonical city named by value (a City enum value), or None
+    def city(self, value: str) -> Optional[str]:
+        found = self.cities.lookup(value)
+        return next(iter(found)) if len(found) == 1 else None
+
+    # Talukas value may name. Taluka names are reused across districts (Khed,
+    # Karjat, Malegaon), so all of them are returned.
+    def find_talukas(self, value: str) -> Set[Taluka]:
+        return self.talukas.lookup(value)
+
+    # Talukas holding a village of that name. Only whole names are matched: short
+    # village names turn up inside too many other words.
+    def find_villages(self, value: str) -> Set[Taluka]:
+        found = self.villages.lookup(value, partial=False)
+        if not found:
+            words = place_key(value).split()
+            if len(words) > 1 and words[-1] in DIRECTION_WORDS:
+                found = self.villages.lookup(" ".join(words[:-1]), partial=False)
+        return found
+
+    # District of a PIN code, or None if the PIN is unknown or its range is shared by districts
+    def pin_district(self, value: str) -> Optional[str]:
+        match = _PIN_RE.search(value.replace(" ", ""))
+        if not match:
+            return None
+        pin = int(match.group(0))
+        found = {district for low, high, district in self.pin_ranges.get(match.group(0)[:3], []) if low <= pin <= high}
+        return next(iter(found)) if len(found) == 1 else None
+
+    # Taluka and district values to fill into an address that lacks them, inferred
+    # from its taluka, village, city, locality and PIN code. Fields the address
+    # already has are never changed, and nothing is filled when the names are
+    # ambiguous (a village name found in several talukas, a PIN shared by districts).
+    def infer(self, address: Mapping[str, Any]) -> Dict[str, str]:
+        taluka_text = _known(address.get("taluka"))
+        district = self.district(_known(address.get(DISTRICT_FIELD)))
+
+        talukas = self.find_talukas(taluka_text) if taluka_text else set()
+        villages = self.find_villages(_known(address.get("village")))
+        if talukas and villages:
+            talukas = {place for place in villages if place in talukas} or talukas
+        elif villages and not taluka_text:
+            talukas = villages
+        if district:
+            talukas = {place for place in talukas if place[1] == district}
+
+        filled = {}
+        if not taluka_text and len(talukas) == 1:
+            filled["taluka"] = next(iter(talukas))[0]
+        if not district:
+            for districts in self._district_sources(address, talukas):
+                if len(districts) == 1:
+                    filled[DISTRICT_FIELD] = next(iter(districts))
+                    break
+        return filled
+
+    # Candidate districts from each source, most specific first
+    def _district_sources(self, address: Mapping[str, Any], talukas: Set[Taluka]) -> Iterable[FrozenSet[str]]:
+        yield frozenset(place[1] for place in talukas)
+        city = self.city(_known(address.get("city")))
+        yield frozenset([self.city_districts[city]] if city and self.city_districts.get(city) else [])
+        for field in ["locality_or_area_or_neighbourhood", "sub_locality_or_city_divsion"]:
+            yield frozenset(place[1] for place in self.find_villages(_known(address.get(field))))
+        district = self.pin_district(_known(address.get("pin_code")))
+        yield frozenset([district] if district else [])
+
+    # The address with its district / city spelled as canonical names and its
+    # missing taluka / district inferred; other fields are returned unchanged
+    def normalize_address(self, address: Mapping[str, Any]) -> Dict[str, Any]:
+        normalized = dict(address)
+        normalized.update(self.infer(address))
+        district = self.district(_known(normalized.get(DISTRICT_FIELD)))
+        if district:
+            normalized[DISTRICT_FIELD] = district
+        city = self.city(_known(normalized.get("city")))
+        if city:
+            normalized["city"] = city
+        return normalized
+
+# Text of an address value, "" for placeholders such as "n/a"
+def _known(value: Any) -> str:
+    text = field_text(value)
+    return "" if text.lower() in ("n/a", "na", "none", "null", "-") else text
+
+# The bundled gazetteer, loaded once per process
+@lru_cache(maxsize=1)
+def get_gazetteer() -> Gazetteer:
+    return Gazetteer.load(DEFAULT_GAZETTEER_PATH)
+
+# Add villages from a CSV file with district, taluka and village columns (such as an
+# export of the Local Government Directory's village list) to gazetteer data.
+# Returns the numbers of villages added and of rows skipped for naming no known
+# district, taluka or village.
+def merge_villages(data: Dict[str, Any], rows: Iterable[Mapping[str, str]]) -> Tuple[int, int]:
+    gazetteer = Gazetteer(data)
+    added = skipped = 0
+    for row in rows:
+        district = gazetteer.district(row.get("district") or "")
+        village = (row.get("village") or "").strip()
+        taluka_name = (row.get("taluka") or "").strip()
+        if not district or not village or not taluka_name:
+            skipped += 1
+            continue
+        known = {place[0] for place in gazetteer.find_talukas(taluka_name) if place[1] == district}
+        taluka = next(iter(known)) if len(known) == 1 else taluka_name.title()
+        entry = data["districts"][district]["talukas"].setdefault(taluka, {"aliases": [], "villages": []})
+        if (taluka, district) in gazetteer.find_villages(village):
+            continue
+        entry["villages"].append(village)
+        gazetteer.add_village(village, taluka, district)
+        added += 1
+    return added, skipped
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Add villages from a CSV file (district, taluka, village columns) to the gazetteer")
+    parser.add_argument("csv", help="CSV file of villages")
+    parser.add_argument("--gazetteer", default=str(DEFAULT_GAZETTEER_PATH), help="Gazetteer JSON file to update")
+    args = parser.parse_args(argv)
+
+    with open(args.gazetteer, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    with open(args.csv, "r", encoding="utf-8-sig", newline="") as f:
+        rows = [{(name or "").strip().lower(): value for name, value in row.items()} for row in csv.DictReader(f)]
+    added, skipped = merge_villages(data, rows)
+    with open(args.gazetteer, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+    print(f"Added {added} villages to {args.gazetteer}" + (f", skipped {skipped} rows without a known district, taluka and village" if skipped else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
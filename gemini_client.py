@@ -0,0 +1,214 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Default quota for one API key. The free tier of gemini-2.0-flash allows 15
+# requests and 1M tokens per minute; override for paid keys with the environment.
+DEFAULT_REQUESTS_PER_MINUTE = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", 15))
+DEFAULT_TOKENS_PER_MINUTE = int(os.environ.get("GEMINI_TOKENS_PER_MINUTE", 1_000_000))
+
+# Retries for one call, and the backoff before each: a random delay up to
+# BASE_DELAY * 2^attempt seconds, capped at MAX_DELAY ("full jitter")
+DEFAULT_MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+# Calls allowed in flight at once. The limit halves on every 429 and grows by
+# about one per limit's worth of successful calls (AIMD).
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+
+# HTTP status codes worth retrying: rate limited, and transient server errors
+THROTTLED_STATUS = 429
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Rough token cost of request parts before the response reports actual usage
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+
+# HTTP status of an API error, if it has one. Works with google.genai errors
+# (.code) as well as any exception carrying .status_code or .code.
+def error_status(error: Exception) -> Optional[int]:
+    for attribute in ("code", "status_code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+def is_retryable(error: Exception) -> bool:
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+# Server-requested delay from a Retry-After header, if the error carries one
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(contents: Iterable[Any]) -> int:
+    tokens = 0
+    for part in contents:
+        if isinstance(part, str):
+            tokens += len(part) // CHARS_PER_TOKEN + 1
+        else:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+# Token bucket refilled continuously at rate_per_minute, holding at most one
+# minute's worth. acquire() blocks until enough is available.
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.available = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Take amount from the bucket, waiting if needed. Returns the time spent waiting.
+    def acquire(self, amount: float = 1.0) -> float:
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return waited
+                delay = (amount - self.available) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+    # Settle an estimate against the actual cost once it is known (may go negative)
+    def adjust(self, amount: float):
+        with self.lock:
+            self.available = min(self.capacity, self.available - amount)
+
+# Additive-increase / multiplicative-decrease limit on calls in flight
+class AdaptiveConcurrency:
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, maximum: int = MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+# Drop-in wrapper around a genai.Client: client.models.generate_content goes
+# through the request and token limiters, the adaptive concurrency limit, and
+# retries with backoff on 429s and transient server errors. Other attributes
+# are passed through to the wrapped client.
+class RateLimitedClient:
+    def __init__(self, client: Any,
+                 requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 initial_concurrency: int = INITIAL_CONCURRENCY,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 rng: Optional[random.Random] = None):
+        self.client = client
+        self.requests = TokenBucket(requests_per_minute, clock, sleep)
+        self.tokens = TokenBucket(tokens_per_minute, clock, sleep)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.models = _RateLimitedModels(self)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0,
+                         "throttled": 0, "server_errors": 0, "wait_seconds": 0.0}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        delay = self.rng.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+        return max(delay, retry_after(error) or 0.0)
+
+    def call(self, function: Callable[..., Any], contents: Iterable[Any], *args, **kwargs) -> Any:
+        contents = list(contents)
+        estimate = estimate_tokens(contents)
+        self._count("calls")
+        attempt = 0
+        while True:
+            waited = self.requests.acquire()
+            waited += self.tokens.acquire(estimate)
+            if waited:
+                self._count("wait_seconds", waited)
+
+            self.concurrency.acquire()
+            try:
+                response = function(*args, contents=contents, **kwargs)
+            except Exception as e:
+                throttled = error_status(e) == THROTTLED_STATUS
+                self.concurrency.release(throttled=throttled)
+                if throttled:
+                    self._count("throttled")
+                elif is_retryable(e):
+                    self._count("server_errors")
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+                self._count("retries")
+                self.sleep(self.backoff_delay(attempt, e))
+                attempt += 1
+                continue
+
+            self.concurrency.release()
+            self._count("succeeded")
+            usage = getattr(response, "usage_metadata", None)
+            total = getattr(usage, "total_token_count", None)
+            if isinstance(total, int):
+                self.tokens.adjust(total - estimate)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["concurrency_limit"] = round(self.concurrency.limit, 2)
+        stats["in_flight"] = self.concurrency.in_flight
+        return stats
+
+class _RateLimitedModels:
+    def __init__(self, owner: RateLimitedClient):
+        self.owner = owner
+
+    def generate_content(self, *, model: str, contents: Iterable[Any], **kwargs) -> Any:
+        return self.owner.call(self.owner.client.models.generate_content, contents, model=model, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.owner.client.models, name)
@@ -0,0 +1,210 @@
+import codecs
+import gzip
+import io
+import json
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from exporter import is_ndjson
+from models import COPIES_FIELD, SOURCE_TEXT_FIELD, NoticeCopy, PropertyDetails, PublicNotice, SourceText
+from normalize import normalize_record
+from store import BATCH_SIZE
+
+# Bytes read from the uploaded file at a time
+CHUNK_SIZE = 1 << 20
+
+# Per-record errors kept for display; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+_WHITESPACE = " \t\r\n"
+
+# Characters that can continue a JSON number ("12" may be the start of "12.5e3")
+_NUMBER_CHARS = "0123456789+-.eE"
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+class DatabaseImportError(Exception):
+    pass
+
+# Summary of an import: records written, records rejected and the first few errors
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.deleted = 0
+        self.rejected = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.bytes_read = 0
+
+    def add_error(self, key: str, message: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((key, message))
+
+# Incrementally parse a top-level JSON object {key: record, ...}, yielding one
+# (key, record) pair at a time. Only the record being parsed and the unread part
+# of the current chunk are held in memory.
+class JsonObjectReader:
+    def __init__(self, stream: BinaryIO, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    # Next non-whitespace character, reading more input as needed ("" at end of input)
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise DatabaseImportError(f"Expected '{char}' but found {found!r} after {self.bytes_read} bytes")
+        self.pos += 1
+
+    # Decode one JSON value. A value is only accepted once something other than the
+    # rest of a number follows it, so a value cut off at a chunk boundary is never
+    # mistaken for a complete one.
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                complete = end < len(self.buffer) and not (
+                    isinstance(value, (int, float)) and self.buffer[end] in _NUMBER_CHARS)
+                if complete or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise DatabaseImportError(f"Invalid JSON: {e.msg} after {self.bytes_read} bytes") from e
+            self._fill()
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise DatabaseImportError("Database keys must be strings")
+            self._expect(":")
+            yield key, self._value()
+            separator = self._peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise DatabaseImportError(f"Expected ',' or '}}' but found {separator!r} after {self.bytes_read} bytes")
+
+# (key, record) entries of an NDJSON export, one line at a time. Tombstone lines
+# from delta exports are yielded with record None; malformed lines are yielded with
+# the error in place of the record.
+def iter_ndjson_entries(stream: BinaryIO) -> Iterator[Tuple[str, Any]]:
+    lines = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    try:
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                key = entry["key"]
+                if not isinstance(key, str):
+                    raise ValueError("key must be a string")
+                yield key, None if entry.get("deleted") else entry["record"]
+            except (ValueError, KeyError, TypeError) as e:
+                yield f"line {line_number}", DatabaseImportError(f"Invalid entry: {e}")
+    finally:
+        # Leave the caller's stream open
+        lines.detach()
+
+# Transparently decompress gzip input
+def open_import_stream(stream: BinaryIO) -> BinaryIO:
+    magic = stream.read(2)
+    stream.seek(0)
+    return gzip.GzipFile(fileobj=stream, mode="rb") if magic == _GZIP_MAGIC else stream
+
+# Validate a record against the notice models. Accepts the full PublicNotice shape
+# and the legacy flat PropertyDetails shape ({"address": ...}) used by
+# sample_database.json, and returns it in the same shape with values normalised.
+# The source_text audit section is kept if present.
+def validate_record(record: Any) -> Dict[str, Any]:
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+    model = PublicNotice if "property_details" in record else PropertyDetails
+    validated = model.model_validate(record).model_dump(mode="json")
+    if record.get(SOURCE_TEXT_FIELD) is not None:
+        validated[SOURCE_TEXT_FIELD] = SourceText.model_validate(record[SOURCE_TEXT_FIELD]).model_dump(mode="json")
+    if record.get(COPIES_FIELD):
+        validated[COPIES_FIELD] = [NoticeCopy.model_validate(copy).model_dump(mode="json") for copy in record[COPIES_FIELD]]
+    return validated
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors())
+    return str(error)
+
+# Stream a database file (a JSON document, or an NDJSON export, either optionally
+# gzip-compressed) into write_batch, BATCH_SIZE validated and normalised records at a time.
+# Tombstones from delta exports are passed to delete_keys. Invalid records are
+# skipped and reported; progress(report) is called after every batch. Raises
+# DatabaseImportError if a JSON document is not a JSON object.
+def import_database(stream: BinaryIO, write_batch: Callable[[List[Tuple[str, Dict[str, Any]]]], None],
+                    batch_size: int = BATCH_SIZE, validate: bool = True,
+                    progress: Optional[Callable[[ImportReport], None]] = None,
+                    file_name: str = "", delete_keys: Optional[Callable[[List[str]], None]] = None) -> ImportReport:
+    report = ImportReport()
+    raw_stream = stream
+    stream = open_import_stream(stream)
+    entries = iter_ndjson_entries(stream) if is_ndjson(file_name) else JsonObjectReader(stream)
+    batch: List[Tuple[str, Dict[str, Any]]] = []
+    deletions: List[str] = []
+
+    def flush():
+        if deletions and delete_keys is not None:
+            delete_keys(list(deletions))
+            report.deleted += len(deletions)
+        write_batch(list(batch))
+        report.imported += len(batch)
+        report.bytes_read = raw_stream.tell()
+        batch.clear()
+        deletions.clear()
+        if progress is not None:
+            progress(report)
+
+    for key, record in entries:
+        if isinstance(record, DatabaseImportError):
+            report.add_error(key, str(record))
+            continue
+        if record is None:
+            deletions.append(key)
+            continue
+        try:
+            batch.append((key, normalize_record(validate_record(record) if validate else record)))
+        except (ValidationError, ValueError, TypeError, AttributeError) as e:
+            report.add_error(key, _error_message(e))
+        if len(batch) + len(deletions) >= batch_size:
+            flush()
+    flush()
+    return report
@@ -0,0 +1,285 @@
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from dedup import DEFAULT_DEDUP_PATH, DuplicateIndex, is_duplicate, keep_copies, link_duplicate
+from normalize import normalize_record
+from pipeline import DEFAULT_MAX_WORKERS, DEFAULT_MODEL_ID, DEFAULT_PIPELINE_MODE, MAX_WORKERS_LIMIT, PIPELINE_MODES, process_batch
+from preprocess import ImagePreprocessor
+from result_cache import ResultCache
+from segmentation import split_upload
+from store import DEFAULT_DB_PATH, PropertyStore
+from watchlist import DEFAULT_WATCHLIST_PATH, Watchlist
+
+DEFAULT_CHECKPOINT_PATH = DEFAULT_DB_PATH.with_name("ingest_checkpoints.sqlite3")
+
+# File types picked up when walking a directory, the same ones the Upload tab accepts
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# Source files handed to the pipeline at a time, per worker. Only this many files
+# are held in memory, whatever the size of the run.
+FILES_PER_WORKER = 4
+
+# Checkpoint states of a source file
+DONE = "done"
+FAILED = "failed"
+
+# Per-file progress of ingest runs. A file is identified by its resolved path and
+# its size and modification time, so a file replaced in place is processed again.
+class IngestCheckpoints:
+    def __init__(self, path: Union[str, Path] = DEFAULT_CHECKPOINT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                source TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                status TEXT NOT NULL,
+                notices INTEGER NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def fingerprint(path: Path) -> str:
+        stat = path.stat()
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    # Checkpoint state of the file, or None if it was never processed or has changed since
+    def status(self, path: Path) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT fingerprint, status FROM checkpoints WHERE source = ?",
+                                     (str(path.resolve()),)).fetchone()
+        if row is None or row[0] != self.fingerprint(path):
+            return None
+        return row[1]
+
+    # A file that can no longer be read is recorded with an empty fingerprint, so it
+    # counts as changed (and is tried again) once it is back
+    def mark(self, path: Path, status: str, notices: int = 0, error: Optional[str] = None):
+        try:
+            fingerprint = self.fingerprint(path)
+        except OSError:
+            fingerprint = ""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (source, fingerprint, status, notices, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path.resolve()), fingerprint, status, notices, error, time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# Summary of an ingest run
+class IngestReport:
+    def __init__(self):
+        self.files = 0
+        self.skipped = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.notices = 0
+        self.duplicates = 0
+        self.alerts = 0
+        self.errors: List[Tuple[str, str]] = []
+
+# (image file, database key) pairs for the given paths. Directories are walked
+# recursively and their images keyed by their path from the directory's parent,
+# e.g. "2024-05-12/page1.jpg", so daily folders with the same file names don't
+# overwrite each other. A .txt file is a manifest listing one image path per line
+# (relative to the manifest, blank lines and # comments ignored), keyed by the path
+# as listed. Single files are keyed by file name, as in the Upload tab.
+def find_sources(paths: Iterable[Union[str, Path]]) -> List[Tuple[Path, str]]:
+    sources: Dict[str, Path] = {}
+    for path in map(Path, paths):
+        if path.is_dir():
+            root = path.resolve().parent
+            for image in sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS):
+                sources.setdefault(image.resolve().relative_to(root).as_posix(), image)
+        elif path.suffix.lower() == ".txt":
+            for line in path.read_text(encoding="utf-8").splitlines():
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    key = Path(line).name if Path(line).is_absolute() else Path(line).as_posix()
+                    sources.setdefault(key, path.parent / line)
+        else:
+            sources.setdefault(path.name, path)
+    return [(source, key) for key, source in sources.items()]
+
+def _chunks(items: List[Tuple[Path, str]], size: int) -> Iterator[List[Tuple[Path, str]]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# Run every source file through the pipeline and write the notices to the store.
+# Files checkpointed as done (and unchanged) are skipped, as are failed ones unless
+# retry_failed. A file is checkpointed only after all of its notices are written,
+# so an interrupted run redoes at most the files that were in flight.
+# split (e.g. segmentation.split_upload over a list of files) turns each file into
+# (notice key, image) pairs; by default each file is one notice.
+# With a dedup index, notices copying a record already in the store are linked to it
+# instead of being extracted and written again. Written notices are matched against
+# the watchlist, if given.
+def ingest(sources: List[Tuple[Path, str]], store: PropertyStore, checkpoints: IngestCheckpoints, client, model_id: str,
+           max_workers: int = DEFAULT_MAX_WORKERS, cache: Optional[ResultCache] = None,
+           preprocess: Optional[Callable[[bytes], bytes]] = None, mode: str = DEFAULT_PIPELINE_MODE,
+           split: Optional[Callable[[List[Tuple[str, bytes]]], List[List[Tuple[str, bytes]]]]] = None,
+           retry_failed: bool = True, log: Callable[[str], None] = print,
+           dedup: Optional[DuplicateIndex] = None, watchlist: Optional[Watchlist] = None) -> IngestReport:
+    report = IngestReport()
+    report.files = len(sources)
+    pending = []
+    for source, key in sources:
+        try:
+            status = checkpoints.status(source)
+        except OSError as e:
+            report.failed += 1
+            report.errors.append((str(source), str(e)))
+            log(f"FAILED {source}: {e}")
+            continue
+        if status == DONE or (status == FAILED and not retry_failed):
+            report.skipped += 1
+        else:
+            pending.append((source, key))
+    if report.skipped:
+        log(f"Skipping {report.skipped} files already processed")
+
+    for chunk in _chunks(pending, max(1, max_workers) * FILES_PER_WORKER):
+        # A file that can't be read (permissions, deleted since it was listed) fails on
+        # its own; the rest of the chunk carries on
+        files, readable = [], []
+        for source, key in chunk:
+            try:
+                files.append((key, source.read_bytes()))
+            except OSError as e:
+                checkpoints.mark(source, FAILED, 0, str(e))
+                report.failed += 1
+                report.errors.append((str(source), str(e)))
+                log(f"FAILED {source}: {e}")
+                continue
+            readable.append((source, key))
+        chunk = readable
+        notices = split(files) if split else [[file] for file in files]
+
+        # Which source each notice came from, and how many of its notices are outstanding
+        owner: Dict[str, Path] = {}
+        outstanding: Dict[Path, int] = {}
+        results: Dict[Path, List[Tuple[str, Dict]]] = {source: [] for source, _ in chunk}
+        duplicates: Dict[Path, List[Tuple[str, Dict]]] = {source: [] for source, _ in chunk}
+        errors: Dict[Path, List[str]] = {source: [] for source, _ in chunk}
+        for (source, _), source_notices in zip(chunk, notices):
+            outstanding[source] = len(source_notices)
+            for key, _ in source_notices:
+                owner[key] = source
+
+        batch = [notice for source_notices in notices for notice in source_notices]
+        del files, notices
+        for key, result, error in process_batch(client, model_id, batch, max_workers, cache, preprocess, mode, dedup):
+            source = owner[key]
+            if result and is_duplicate(result):
+                duplicates[source].append((key, result))
+            elif result:
+                results[source].append((key, keep_copies(store, key, normalize_record(result))))
+            else:
+                errors[source].append(f"{key}: {error}")
+            outstanding[source] -= 1
+            if outstanding[source]:
+                continue
+
+            # All notices of the file are finished: write them, then checkpoint the file
+            if results[source]:
+                store.update_many(results[source])
+                report.notices += len(results[source])
+                if watchlist is not None:
+                    report.alerts += watchlist.check_many(results[source])
+            for key, result in duplicates[source]:
+                link_duplicate(store, key, result)
+            report.duplicates += len(duplicates[source])
+            if errors[source]:
+                message = "; ".join(errors[source])
+                checkpoints.mark(source, FAILED, len(results[source]), message)
+                report.failed += 1
+                report.errors.append((str(source), message))
+                log(f"FAILED {source}: {message}")
+            else:
+                checkpoints.mark(source, DONE, len(results[source]))
+                report.succeeded += 1
+                log(f"ok     {source} ({len(results[source])} notices"
+                    + (f", {len(duplicates[source])} duplicates)" if duplicates[source] else ")"))
+    return report
+
+# Command line entry point for scheduled runs, e.g. from cron:
+#   python ingest.py /srv/epaper/2024-05-12 --segment
+# Rerunning the same command resumes an interrupted run.
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Process notice images into the property store without the UI.")
+    parser.add_argument("paths", nargs="+", help="Image files, directories (walked recursively) or .txt manifests")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite property store to write to")
+    parser.add_argument("--checkpoints", default=str(DEFAULT_CHECKPOINT_PATH), help="SQLite file recording per-file progress")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY"),
+                        help="Gemini API key (default: $GEMINI_API_KEY or $GOOGLE_API_KEY)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_ID)
+    parser.add_argument("--mode", choices=PIPELINE_MODES, default=DEFAULT_PIPELINE_MODE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help=f"Files processed in parallel (max {MAX_WORKERS_LIMIT})")
+    parser.add_argument("--segment", action="store_true", help="Split full newspaper pages into one notice per box")
+    parser.add_argument("--no-preprocess", action="store_true", help="Send images to Gemini without preprocessing")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse or store cached pipeline results")
+    parser.add_argument("--dedup", default=str(DEFAULT_DEDUP_PATH), help="SQLite fingerprints of notices already processed")
+    parser.add_argument("--no-dedup", action="store_true", help="Extract every notice, even copies of ones already in the database")
+    parser.add_argument("--watchlist", default=str(DEFAULT_WATCHLIST_PATH), help="SQLite watchlist to raise alerts in")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry files that failed in a previous run")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("a Gemini API key is required (--api-key or $GEMINI_API_KEY)")
+    sources = find_sources(args.paths)
+    if not sources:
+        parser.error("no images found")
+
+    from google import genai
+    from gemini_client import RateLimitedClient
+
+    client = RateLimitedClient(genai.Client(api_key=args.api_key))
+    pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    preprocessor = None if args.no_preprocess else ImagePreprocessor(executor=pool)
+    split = (lambda files: list(pool.map(split_upload, *zip(*files)))) if args.segment else None
+    cache = None if args.no_cache else ResultCache()
+    store = PropertyStore(args.db)
+    checkpoints = IngestCheckpoints(args.checkpoints)
+    dedup = None if args.no_dedup else DuplicateIndex(args.dedup, exists=store.__contains__)
+    watchlist = Watchlist(args.watchlist)
+
+    started = time.perf_counter()
+    try:
+        report = ingest(sources, store, checkpoints, client, args.model, args.workers, cache, preprocessor,
+                        args.mode, split, retry_failed=not args.skip_failed,
+                        log=lambda line: print(line, flush=True), dedup=dedup, watchlist=watchlist)
+    finally:
+        checkpoints.close()
+        watchlist.close()
+        if dedup is not None:
+            dedup.close()
+        store.close()
+        if cache is not None:
+            cache.close()
+        pool.shutdown()
+
+    print(f"{report.succeeded} files processed, {report.failed} failed, {report.skipped} skipped; "
+          f"{report.notices} notices written, {report.duplicates} duplicates linked, {report.alerts} watchlist alerts "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 1 if report.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from store import DEFAULT_DB_PATH
+
+DEFAULT_JOBS_PATH = DEFAULT_DB_PATH.with_name("jobs.sqlite3")
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+JOB_STATES = [QUEUED, RUNNING, DONE, FAILED]
+
+# Attempts per job before it is left failed, and the delay before retry n (seconds)
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = 30.0
+
+# A running job whose worker has not finished it within this many seconds is
+# assumed lost (the worker crashed or was killed) and handed to another worker
+LEASE_SECONDS = 15 * 60
+
+# A worker that has not checked in for this long is no longer counted as live
+WORKER_TIMEOUT = 60.0
+
+# Job ids looked up per query, well within SQLite's bound-parameter limit
+RESULTS_PER_QUERY = 500
+
+# Identity of a Gemini API key stored with the jobs queued under it, so each job
+# is processed by a worker using the key (and quota) of the session that queued
+# it. A digest, never the key itself.
+def api_key_id(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+# One notice to process, as handed to a worker
+class Job(NamedTuple):
+    id: int
+    batch: str
+    name: str
+    image: bytes
+    options: Dict[str, Any]
+    attempts: int
+
+# Persistent queue of notice processing jobs in SQLite. Any number of worker
+# processes can claim jobs from the same file; a claim is a single write
+# transaction, so each job goes to exactly one worker at a time.
+class JobQueue:
+    def __init__(self, path: Union[str, Path] = DEFAULT_JOBS_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode, so claims can open their own BEGIN IMMEDIATE transaction
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                options TEXT NOT NULL,
+                image BLOB,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                key_id TEXT,
+                created_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                lease_expires REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                id TEXT PRIMARY KEY,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL,
+                jobs_done INTEGER NOT NULL DEFAULT 0,
+                key_id TEXT
+            )
+        """)
+        self._add_key_columns()
+
+    # Queues created before jobs were tied to an API key get the key_id columns;
+    # their jobs and workers have none, and jobs without one go to any worker
+    def _add_key_columns(self):
+        for table in ("jobs", "workers"):
+            columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+            if "key_id" not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN key_id TEXT")
+
+    @staticmethod
+    def new_batch_id() -> str:
+        return uuid.uuid4().hex
+
+    # Queue one job per (name, image) pair under a batch id. options are passed to
+    # the worker as they are (model, pipeline mode, preprocessing settings, ...).
+    # With a key_id (api_key_id), only workers using that API key claim the jobs.
+    def enqueue(self, batch: str, files: Iterable[Tuple[str, bytes]], options: Optional[Dict[str, Any]] = None,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS, key_id: Optional[str] = None) -> List[int]:
+        now = time.time()
+        options_json = json.dumps(options or {})
+        ids = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for name, image in files:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (batch, name, status, max_attempts, options, image, key_id, created_at, available_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (batch, name, QUEUED, max_attempts, options_json, image, key_id, now, now)
+                )
+                ids.append(cursor.lastrowid)
+            self._conn.execute("COMMIT")
+        return ids
+
+    # Take the oldest job that is ready to run, or None. Jobs whose lease expired are
+    # requeued first, or failed if they are out of attempts. A worker only takes jobs
+    # queued under its own key_id, or under none.
+    def claim(self, worker: str, lease_seconds: float = LEASE_SECONDS, key_id: Optional[str] = None) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = 'Worker stopped before finishing the job', finished_at = ? "
+                    "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                    (FAILED, now, RUNNING, now)
+                )
+                self._conn.execute("UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND lease_expires < ?",
+                                   (QUEUED, RUNNING, now))
+                row = self._conn.execute(
+                    "SELECT id, batch, name, image, options, attempts FROM jobs "
+                    "WHERE status = ? AND available_at <= ? AND (key_id IS NULL OR key_id = ?) ORDER BY available_at, id LIMIT 1",
+                    (QUEUED, now, key_id)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, started_at = ?, lease_expires = ? WHERE id = ?",
+                        (RUNNING, worker, now, now + lease_seconds, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return Job(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5] + 1)
+
+    # Store the result of a job. The image is dropped, as it is no longer needed.
+    def complete(self, job_id: int, result: Any):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, image = NULL, finished_at = ?, lease_expires = NULL WHERE id = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+
+    # Record a failed attempt: the job is queued again after a delay, or left
+    # failed once it is out of attempts (or if retry is False)
+    def fail(self, job_id: int, error: str, retry: bool = True) -> str:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return FAILED
+            attempts, max_attempts = row
+            status = QUEUED if retry and attempts < max_attempts else FAILED
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, available_at = ?, finished_at = ?, lease_expires = NULL WHERE id = ?",
+                (status, error, now + RETRY_DELAY * attempts, now if status == FAILED else None, job_id)
+            )
+        return status
+
+    # Queue a batch's failed jobs again with a fresh set of attempts
+    def retry_failed(self, batch: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, finished_at = NULL WHERE batch = ? AND status = ? AND image IS NOT NULL",
+                (QUEUED, time.time(), batch, FAILED)
+            )
+            return cursor.rowcount
+
+    # Number of jobs in each state, for a batch or the whole queue
+    def counts(self, batch: Optional[str] = None) -> Dict[str, int]:
+        query = "SELECT status, COUNT(*) FROM jobs" + (" WHERE batch = ?" if batch else "") + " GROUP BY status"
+        with self._lock:
+            rows = self._conn.execute(query, (batch,) if batch else ()).fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(dict(rows))
+        return counts
+
+    # Jobs of a batch without their images: id, name, status, attempts, error and,
+    # with results=True, the parsed result of finished jobs
+    def jobs(self, batch: str, status: Optional[str] = None, results: bool = False,
+             after_id: int = 0) -> List[Dict[str, Any]]:
+        query = ("SELECT id, name, status, attempts, error, " + ("result" if results else "NULL") +
+                 " FROM jobs WHERE batch = ? AND id > ?" + (" AND status = ?" if status else "") + " ORDER BY id")
+        params = (batch, after_id, status) if status else (batch, after_id)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{"id": row[0], "name": row[1], "status": row[2], "attempts": row[3], "error": row[4],
+                 "result": json.loads(row[5]) if row[5] else None} for row in rows]
+
+    # Parsed results of the given finished jobs, by job id
+    def results(self, job_ids: Iterable[int]) -> Dict[int, Any]:
+        results = {}
+        job_ids = list(job_ids)
+        with self._lock:
+            for start in range(0, len(job_ids), RESULTS_PER_QUERY):
+                chunk = job_ids[start:start + RESULTS_PER_QUERY]
+                rows = self._conn.execute(
+                    f"SELECT id, result FROM jobs WHERE id IN ({', '.join('?' * len(chunk))}) AND result IS NOT NULL", chunk
+                ).fetchall()
+                results.update((row[0], json.loads(row[1])) for row in rows)
+        return results
+
+    # Record that a worker is alive, and the API key it processes jobs with
+    def heartbeat(self, worker: str, jobs_done: int = 0, key_id: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (id, started_at, heartbeat_at, jobs_done, key_id) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at, jobs_done = excluded.jobs_done",
+                (worker, now, now, jobs_done, key_id)
+            )
+
+    def remove_worker(self, worker: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE id = ?", (worker,))
+
+    # Workers that checked in recently; with a key_id, only those using that API key
+    def live_workers(self, timeout: float = WORKER_TIMEOUT, key_id: Optional[str] = None) -> List[str]:
+        query = "SELECT id FROM workers WHERE heartbeat_at >= ?" + (" AND key_id = ?" if key_id else "")
+        params = (time.time() - timeout, key_id) if key_id else (time.time() - timeout,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [row[0] for row in rows]
+
+    # Delete finished batches older than max_age seconds
+    def purge(self, max_age: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                                        (DONE, FAILED, time.time() - max_age))
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
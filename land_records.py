@@ -0,0 +1,237 @@
+import re
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from search_index import field_text, get_address
+from trigram_index import normalize_name
+
+# Canonical identifier of a land parcel, e.g. "S. No. 112, H. No. 1,2" ->
+# LandParcel("survey", "112", "", ("1", "2"))
+class LandParcel(NamedTuple):
+    scheme: str
+    number: str
+    subdivision: str = ""
+    hissa: Tuple[str, ...] = ()
+
+    def label(self) -> str:
+        text = f"{SCHEME_LABELS[self.scheme]} {self.number}"
+        if self.subdivision:
+            text += f"/{self.subdivision}"
+        if self.hissa:
+            text += f", Hissa {','.join(self.hissa)}"
+        return text
+
+SCHEME_LABELS = {
+    "survey": "Survey No.",
+    "city_survey": "City Survey No.",
+    "cadastral": "Cadastral Survey No.",
+    "gat": "Gat No.",
+    "final_plot": "Final Plot No.",
+    "plot": "Plot No.",
+}
+
+# Schemes that are used interchangeably in notices, so a lookup on one also checks the other
+EQUIVALENT_SCHEMES = {
+    "city_survey": ("city_survey", "cadastral"),
+    "cadastral": ("cadastral", "city_survey"),
+}
+
+# Scheme assumed for a bare number in each land identifier field
+FIELD_SCHEMES = {
+    "survey_or_cs_or_cts_number": "survey",
+    "gut_or_gat_number": "gat",
+    "plot_number": "plot",
+}
+
+# Ranges such as "533/107 to 484" are expanded up to this many sub-divisions
+MAX_RANGE = 1000
+
+_NO = r"\s*(?:no|nos|number|numbers)?\s*[.:]?"
+_MARKERS = [
+    ("final_plot", r"\b(?:final\s+plot|f\s*\.?\s*p\s*\.)" + _NO),
+    ("plot", r"\b(?:sub\s+)?plot(?:\s+bearing\s+(?:s\s*\.?\s*no|survey\s+no)\s*\.?)?" + _NO),
+    ("city_survey", r"\b(?:c\s*\.?\s*t\s*\.?\s*s\b\s*\.?|chain\s+and\s+triangulation\s+survey|city\s+survey|c\s*\.?\s*survey\b\s*\.?|c\s*\.?\s*s\b\s*\.?)" + _NO),
+    ("cadastral", r"\bcadastral\s+survey" + _NO),
+    ("hissa", r"\b(?:hissa|h\s*\.)\s*(?:no|nos|number)s?\s*\.?"),
+    ("survey", r"\b(?:(?:old|new|laughton)\s+)?(?:survey|svy\s*\.?)" + _NO + r"(?:\s*&\s*sub-division)?"
+               r"|\bs\s*\.?\s*(?:no|nos|number)s?\s*\.?"),
+    ("gat", r"\b(?:gat|gut)" + _NO),
+    # Flat / shop / room numbers and the like: not land identifiers, but they end the
+    # previous identifier's numbers ("S.No. 12, Flat 5")
+    ("unit", r"\b(?:flat|unit|shop|office|room|apartment|apt|house|bungalow|gala)" + _NO),
+]
+_MARKER_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in _MARKERS), re.IGNORECASE)
+_NUMBER_RE = re.compile(
+    r"(?<![A-Za-z0-9])([A-Za-z]?\d+[A-Za-z]{0,2}(?:[/-][0-9A-Za-z]+)*|[A-Za-z](?:/[0-9A-Za-z]+)+)(?:\s*to\s*(\d+))?(?![A-Za-z0-9])",
+    re.IGNORECASE
+)
+
+def _canonical(part: str) -> str:
+    part = part.upper()
+    stripped = part.lstrip("0")
+    return stripped if stripped and stripped[0].isdigit() else part
+
+# Split "459/89B" into ("459", "89B")
+def _split_number(value: str) -> Tuple[str, str]:
+    head, _, tail = value.partition("/")
+    return _canonical(head), "/".join(_canonical(part) for part in tail.split("/")) if tail else ""
+
+# Numbers in a segment of text, with "521/1 to 8" expanded to 521/1 ... 521/8
+def _segment_numbers(segment: str) -> List[str]:
+    numbers = []
+    for match in _NUMBER_RE.finditer(segment):
+        value, range_end = match.group(1), match.group(2)
+        numbers.append(value)
+        if not range_end:
+            continue
+        head, _, last = value.rpartition("/")
+        if not last.isdigit():
+            continue
+        start, end = int(last), int(range_end)
+        if start < end <= start + MAX_RANGE:
+            prefix = f"{head}/" if head else ""
+            numbers.extend(f"{prefix}{n}" for n in range(start + 1, end + 1))
+    return numbers
+
+# True if text names a land identifier scheme ("S. No.", "CTS", "Gat", ...)
+def _has_land_marker(text: str) -> bool:
+    return any(marker.lastgroup != "unit" for marker in _MARKER_RE.finditer(text))
+
+# Parse free-text land identifiers into canonical LandParcel tuples. Numbers before
+# the first marker are taken to be in default_scheme only when the text has no land
+# marker at all (a bare "112" in the survey number field).
+def parse_land_identifiers(text: str, default_scheme: str = "survey") -> List[LandParcel]:
+    text = field_text(text)
+    if not text:
+        return []
+
+    parcels: List[LandParcel] = []
+    markers = list(_MARKER_RE.finditer(text))
+    segments = []
+    if not _has_land_marker(text):
+        segments.append((default_scheme, text[:markers[0].start()] if markers else text))
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        segments.append((marker.lastgroup, text[marker.end():end]))
+
+    for scheme, segment in segments:
+        numbers = _segment_numbers(segment)
+        if not numbers or scheme == "unit":
+            continue
+        if scheme == "hissa":
+            # Hissa numbers belong to the preceding survey number
+            hissa = tuple(_canonical(number) for number in numbers)
+            if parcels:
+                last = parcels[-1]
+                parcels[-1] = last._replace(hissa=last.hissa + hissa)
+            continue
+        for number in numbers:
+            base, subdivision = _split_number(number)
+            parcels.append(LandParcel(scheme, base, subdivision))
+    return list(dict.fromkeys(parcels))
+
+# All parcels mentioned in a record's land identifier fields
+def record_parcels(record: Mapping[str, Any]) -> List[LandParcel]:
+    address = get_address(record) or {}
+    parcels = []
+    for field, scheme in FIELD_SCHEMES.items():
+        parcels.extend(parse_land_identifiers(field_text(address.get(field)), scheme))
+    return list(dict.fromkeys(parcels))
+
+# Normalised place names a record can be looked up under: village, taluka, district and city,
+# both as a whole and word by word ("Mumbai City / Suburban" is also found as "mumbai")
+def record_places(record: Mapping[str, Any]) -> Set[str]:
+    address = get_address(record) or {}
+    places = set()
+    for field in ("village", "taluka", "district_and_or_sub_district", "city"):
+        name = normalize_name(field_text(address.get(field)))
+        if name:
+            places.add(name)
+            places.update(name.split())
+    return places
+
+ParcelKey = Tuple[str, str, str]
+
+# Hash index from (place, scheme, number) to record keys. Every parcel is also
+# indexed under the place "" so it can be found when no place is given.
+class ParcelIndex:
+    def __init__(self):
+        self.index: Dict[ParcelKey, Set[str]] = {}
+        self.doc_parcels: Dict[str, List[LandParcel]] = {}
+        self.doc_keys: Dict[str, List[ParcelKey]] = {}
+
+    @classmethod
+    def build(cls, data: Mapping[str, Any]) -> "ParcelIndex":
+        index = cls()
+        for key, record in data.items():
+            index.add(key, record)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_parcels)
+
+    def add(self, key: str, record: Mapping[str, Any]):
+        if key in self.doc_parcels:
+            self.remove(key)
+        parcels = record_parcels(record)
+        places = record_places(record) | {""}
+        keys = list({(place, parcel.scheme, parcel.number) for parcel in parcels for place in places})
+        for parcel_key in keys:
+            self.index.setdefault(parcel_key, set()).add(key)
+        self.doc_parcels[key] = parcels
+        self.doc_keys[key] = keys
+
+    def remove(self, key: str):
+        self.doc_parcels.pop(key, None)
+        for parcel_key in self.doc_keys.pop(key, []):
+            postings = self.index.get(parcel_key)
+            if postings is None:
+                continue
+            postings.discard(key)
+            if not postings:
+                del self.index[parcel_key]
+
+    # Records holding the parcel, optionally restricted to a place. A sub-division or
+    # hissa on the query must also be present on the record's parcel.
+    def lookup(self, parcel: LandParcel, place: Optional[str] = None) -> List[str]:
+        place = normalize_name(place) if place else ""
+        keys: Set[str] = set()
+        for scheme in EQUIVALENT_SCHEMES.get(parcel.scheme, (parcel.scheme,)):
+            keys.update(self.index.get((place, scheme, parcel.number), ()))
+        return sorted(key for key in keys if any(self._covers(candidate, parcel)
+                                                 for candidate in self.doc_parcels.get(key, [])))
+
+    @staticmethod
+    def _covers(candidate: LandParcel, query: LandParcel) -> bool:
+        if candidate.number != query.number:
+            return False
+        if query.subdivision and candidate.subdivision != query.subdivision:
+            return False
+        return set(query.hissa) <= set(candidate.hissa)
+
+    # Look up a free-text query such as "CTS 459/89B Pune". Words that are not part of
+    # the identifier are treated as place names; returns [] if the query names no parcel.
+    def search(self, query: str) -> List[str]:
+        if not _has_land_marker(query):
+            return []
+        parcels = parse_land_identifiers(query)
+        if not parcels:
+            return []
+
+        remainder = _NUMBER_RE.sub(" ", _MARKER_RE.sub(" ", query))
+        places = [word for word in normalize_name(remainder).split() if len(word) > 1] or [""]
+        matches: Dict[str, None] = {}
+        for parcel in parcels:
+            for place in places:
+                for key in self.lookup(parcel, place):
+                    matches[key] = None
+        return list(matches)
+
+    # Records already in the index that share a parcel and place with the given record
+    def matching_records(self, record: Mapping[str, Any]) -> List[str]:
+        places = record_places(record) or {""}
+        matches: Dict[str, None] = {}
+        for parcel in record_parcels(record):
+            for place in places:
+                for key in self.lookup(parcel, place):
+                    matches[key] = None
+        return list(matches)
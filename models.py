@@ -0,0 +1,215 @@
+import enum
+from typing import List
+from pydantic import BaseModel, field_validator, model_validator
+
+from gazetteer import get_gazetteer
+
+# Define enums for data validation
+class usage_type(enum.Enum):
+    RESIDENTIAL = "Residential"
+    COMMERCIAL = "Commercial"
+    INDUSTRIAL = "Industrial"
+    AGRICULTURAL = "Agricultural"
+    OTHER = "Other"
+
+class District(enum.Enum):
+    AKOLA = "Akola"
+    AMRAVATI = "Amravati"
+    BULDHANA = "Buldhana"
+    YAVATMAL = "Yavatmal"
+    WASHIM = "Washim"
+    AURANGABAD = "Aurangabad"
+    BEED = "Beed"
+    JALNA = "Jalna"
+    OSMANABAD = "Osmanabad"
+    NANDED = "Nanded"
+    LATUR = "Latur"
+    PARBHANI = "Parbhani"
+    HINGOLI = "Hingoli"
+    BOMBAY = "Mumbai City / Suburban"
+    BOMBAY_SUBURBAN = "Mumbai City / Suburban"
+    MUMBAI_CITY = "Mumbai City / Suburban"
+    MUMBAI_SUBURBAN = "Mumbai City / Suburban"
+    THANE = "Thane"
+    PALGHAR = "Palghar"
+    RAIGAD = "Raigad"
+    RATNAGIRI = "Ratnagiri"
+    SINDHUDURG = "Sindhudurg"
+    BHANDARA = "Bhandara"
+    CHANDRAPUR = "Chandrapur"
+    GADCHIROLI = "Gadchiroli"
+    GONDIA = "Gondia"
+    NAGPUR = "Nagpur"
+    WARDHA = "Wardha"
+    AHMEDNAGAR = "Ahmednagar"
+    DHULE = "Dhule"
+    JALGAON = "Jalgaon"
+    NANDURBAR = "Nandurbar"
+    NASHIK = "Nashik"
+    SANGLI = "Sangli"
+    SATARA = "Satara"
+    SOLAPUR = "Solapur"
+    KOLHAPUR = "Kolhapur"
+    PUNE = "Pune"
+    NA = "n/a"
+
+class City(enum.Enum):
+    MUMBAI = "Mumbai"
+    PUNE = "Pune"
+    NAGPUR = "Nagpur"
+    THANE = "Thane"
+    PIMPRI_CHINCHWAD = "Pimpri-Chinchwad"
+    NASHIK = "Nashik"
+    KALYAN_DOMBIVLI = "Kalyan-Dombivli"
+    VASAI_VIRAR = "Vasai-Virar"
+    AURANGABAD = "Aurangabad"
+    NAVI_MUMBAI = "Navi Mumbai"
+    SOLAPUR = "Solapur"
+    MIRA_BHAYANDAR = "Mira-Bhayandar"
+    JALGAON = "Jalgaon"
+    DHULE = "Dhule"
+    AMRAVATI = "Amravati"
+    NANDED_WAGHALA = "Nanded-Waghala"
+    KOLHAPUR = "Kolhapur"
+    ULHASNAGAR = "Ulhasnagar"
+    SANGLI = "Sangli"
+    MALEGAON = "Malegaon"
+    AKOLA = "Akola"
+    LATUR = "Latur"
+    BHIWANDI_NIZAMPUR = "Bhiwandi-Nizampur"
+    AHMEDNAGAR = "Ahmednagar"
+    CHANDRAPUR = "Chandrapur"
+    PARBHANI = "Parbhani"
+    ICHALKARANJI = "Ichalkaranji"
+    JALNA = "Jalna"
+    AMBARNATH = "Ambernath"
+    BHUSAWAL = "Bhusawal"
+    PANVEL = "Panvel"
+    BADLAPUR = "Badlapur"
+    BOISAR = "Boisar"
+    GONDIA = "Gondia"
+    SATARA = "Satara"
+    BARSHI = "Barshi"
+    YAVATMAL = "Yavatmal"
+    ACHALPUR = "Achalpur"
+    OSMANABAD = "Osmanabad"
+    NANDURBAR = "Nandurbar"
+    WARDHA = "Wardha"
+    UDGIR = "Udgir"
+    HINGANGHAT = "Hinganghat"
+    NA = "n/a"
+
+# Define Pydantic models for data validation and structure
+class Address(BaseModel):
+    flat_or_apartment_numbers: str
+    office_or_shop_numbers: str
+    floor_numbers: str
+    building_wing_or_tower_or_number: str
+    building_number_on_street: str
+    plot_number: str
+    bungalow_or_house_number: str
+    gut_or_gat_number: str
+    survey_or_cs_or_cts_number: str
+    building_name: str
+    society_or_complex_name: str
+    street_or_road_or_marg: str
+    sub_locality_or_city_divsion: str
+    locality_or_area_or_neighbourhood: str
+    village: str
+    taluka: str
+    district_and_or_sub_district: District
+    city: City
+    state: str
+    pin_code: str
+
+    # Fills in a missing taluka / district from the village, taluka, city or PIN code
+    @model_validator(mode="before")
+    @classmethod
+    def infer_admin_fields(cls, data):
+        if isinstance(data, dict):
+            data = dict(data, **get_gazetteer().infer(data))
+        return data
+
+    # Assigns n/a if value does not name 1/36 districts, by any of its aliases
+    # ("Dist-Latur", "Mumbai Suburban", "Chhatrapati Sambhajinagar")
+    @field_validator("district_and_or_sub_district", mode="before")
+    def validate_district(cls, value):
+        if isinstance(value, District):
+            return value
+        district = get_gazetteer().district(str(value or ""))
+        return District(district) if district else District.NA
+
+    # Assigns n/a if value does not name 1/43 cities, by any of its aliases
+    # ("Pimpri Chinchwad", "Bombay")
+    @field_validator("city", mode="before")
+    def validate_city(cls, value):
+        if isinstance(value, City):
+            return value
+        city = get_gazetteer().city(str(value or ""))
+        return City(city) if city else City.NA
+
+class PropertyDetails(BaseModel):
+    address: Address
+    property_usage_type: usage_type
+    type_of_property: str
+    area: str
+
+class GeneralNoticeInfo(BaseModel):
+    date_of_notice_in_DDMMYY_format: str
+    num_days_to_respond: int
+    ai_generated_50_word_summary: str
+
+class SellerDetails(BaseModel):
+    person_name: str
+    person_address: str
+    company_name: str
+    company_address: str
+
+class AdvocateDetails(BaseModel):
+    advocate_name: str
+    firm_name: str
+    advocate_or_firm_phone_number: str
+    advocate_or_firm_email: str
+    advocate_or_firm_address: str
+
+class PublicNotice(BaseModel):
+    property_details: PropertyDetails
+    general_notice_info: GeneralNoticeInfo
+    seller_details: SellerDetails
+    advocate_details: AdvocateDetails
+
+# Record section holding the OCR and English text a notice was extracted from,
+# kept with the record for audit
+SOURCE_TEXT_FIELD = "source_text"
+
+class SourceText(BaseModel):
+    ocr_text: str
+    english_text: str
+
+# Record section listing the other uploads found to be copies of the notice
+COPIES_FIELD = "copies"
+
+class NoticeCopy(BaseModel):
+    key: str
+    # "image" or "text"
+    match: str
+    similarity: float
+
+# Response schema for the fused pipeline mode: the transcription and translation
+# come first so the model reads the notice before filling in the other sections
+class FusedNotice(BaseModel):
+    ocr_text: str
+    english_text: str
+    property_details: PropertyDetails
+    general_notice_info: GeneralNoticeInfo
+    seller_details: SellerDetails
+    advocate_details: AdvocateDetails
+
+# Response schema for translating the Devanagari passages of a mixed-script notice,
+# one translation per passage in order
+class Translations(BaseModel):
+    translations: List[str]
+
+# Response schema for reranking search candidates with Gemini
+class SearchMatches(BaseModel):
+    matching_keys: List[str]
@@ -0,0 +1,116 @@
+import enum
+from datetime import date, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from gazetteer import get_gazetteer
+from search_index import (
+    DERIVED_FIELD, DERIVED_VERSION, address_tokens, build_compact_address, field_text, get_address, get_derived
+)
+from store import parse_notice_date
+
+# Sentinel the extraction prompt uses for missing values
+NA = "n/a"
+
+# Address parts in the order they are shown as "Complete Address", with the label
+# format used for each
+DISPLAY_ADDRESS_PARTS: List[Tuple[str, str]] = [
+    ("flat_or_apartment_numbers", "{}"),
+    ("office_or_shop_numbers", "{}"),
+    ("floor_numbers", "{} Floor"),
+    ("building_wing_or_tower_or_number", "Wing/Tower {}"),
+    ("building_name", "{}"),
+    ("society_or_complex_name", "{}"),
+    ("street_or_road_or_marg", "{}"),
+    ("building_number_on_street", "Building No. {}"),
+    ("locality_or_area_or_neighbourhood", "{}"),
+    ("sub_locality_or_city_divsion", "{}"),
+    ("village", "Village: {}"),
+    ("taluka", "Taluka: {}"),
+    ("district_and_or_sub_district", "District: {}"),
+    ("city", "{}"),
+    ("state", "{}"),
+    ("pin_code", "{}"),
+]
+
+# Resolve enum dicts to their value and fold missing-value spellings ("N/A", "NA",
+# "", None) to the "n/a" sentinel, recursively through the record's sections
+def clean_value(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        if "value" in value and set(value) <= {"name", "value"}:
+            return clean_value(value["value"])
+        return {key: clean_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [clean_value(item) for item in value]
+    if value is None:
+        return NA
+    if isinstance(value, str):
+        return field_text(value) or NA
+    if isinstance(value, enum.Enum):
+        return clean_value(value.value)
+    return value
+
+def display_address(record: Mapping[str, Any]) -> str:
+    address = get_address(record) or {}
+    parts = []
+    for field, label in DISPLAY_ADDRESS_PARTS:
+        text = field_text(address.get(field))
+        if text:
+            parts.append(label.format(text))
+    return ", ".join(parts)
+
+def _notice_info(record: Mapping[str, Any]) -> Mapping[str, Any]:
+    info = record.get("general_notice_info") if isinstance(record, Mapping) else None
+    return info if isinstance(info, Mapping) else {}
+
+def _details(record: Mapping[str, Any]) -> Mapping[str, Any]:
+    details = record.get("property_details", record) if isinstance(record, Mapping) else None
+    return details if isinstance(details, Mapping) else {}
+
+# Last day to respond: the notice date plus num_days_to_respond
+def response_deadline(notice_date: Optional[str], days: Any) -> Optional[str]:
+    if not notice_date:
+        return None
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        return None
+    if days <= 0:
+        return None
+    return (date.fromisoformat(notice_date) + timedelta(days=days)).isoformat()
+
+# Fields computed once when a record enters the database, so renderers and
+# indexes read them instead of re-deriving them on every rerun
+def compute_derived(record: Mapping[str, Any]) -> Dict[str, Any]:
+    address = get_address(record) or {}
+    notice_info = _notice_info(record)
+    notice_date = parse_notice_date(notice_info.get("date_of_notice_in_DDMMYY_format"))
+    return {
+        "version": DERIVED_VERSION,
+        "display_address": display_address(record),
+        "compact_address": build_compact_address(record),
+        "address_tokens": address_tokens(record),
+        "district": field_text(address.get("district_and_or_sub_district")),
+        "city": field_text(address.get("city")),
+        "usage_type": field_text(_details(record).get("property_usage_type")),
+        "notice_date": notice_date,
+        "response_deadline": response_deadline(notice_date, notice_info.get("num_days_to_respond")),
+    }
+
+# Normalise a record on its way into the database: resolve enums, fix "n/a"
+# sentinels, spell the district / city as the gazetteer's canonical names and fill
+# in a missing taluka / district, then attach the derived section. Accepts dicts
+# and Pydantic models.
+def normalize_record(record: Any) -> Dict[str, Any]:
+    if hasattr(record, "model_dump"):
+        record = record.model_dump(mode="json")
+    record = {key: clean_value(value) for key, value in record.items() if key != DERIVED_FIELD}
+    details = record.get("property_details", record)
+    if isinstance(details, dict) and isinstance(details.get("address"), dict):
+        details["address"] = get_gazetteer().normalize_address(details["address"])
+    record[DERIVED_FIELD] = compute_derived(record)
+    return record
+
+# The derived section of any record, computing it for records stored before
+# normalisation (or by an older version) without modifying them
+def derived_fields(record: Mapping[str, Any]) -> Mapping[str, Any]:
+    return get_derived(record) or compute_derived(record)
@@ -0,0 +1,259 @@
+import threading
+import time
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from entity_resolution import PropertyClusters
+from fielded_search import FieldedQueryEngine
+from land_records import ParcelIndex
+from search_index import AddressIndex
+from snapshot import load_store_indexes, save_store_snapshot
+from store import PropertyStore, filter_summaries, summary_values
+from trigram_index import TrigramIndex
+
+# Search indexes kept over the database, by name
+SEARCH_INDEX_TYPES = {
+    "search_index": AddressIndex,
+    "field_index": FieldedQueryEngine,
+    "name_index": TrigramIndex,
+    "parcel_index": ParcelIndex,
+    "property_clusters": PropertyClusters,
+}
+
+# A session's view of the shared database. Reads fall through to the shared,
+# read-only base; the session's own additions and deletions are kept in a small
+# copy-on-write overlay until they are committed or discarded.
+class OverlayDatabase(MutableMapping):
+    def __init__(self, base: Mapping[str, Any]):
+        self.base = base
+        self.additions: Dict[str, Any] = {}
+        self.deletions: Set[str] = set()
+        # Set when the session replaced its whole view (clear / reset / load)
+        self.hide_base = False
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.additions:
+            return self.additions[key]
+        if self.hide_base or key in self.deletions:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self.additions[key] = value
+        self.deletions.discard(key)
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self.additions.pop(key, None)
+        if not self.hide_base and key in self.base:
+            self.deletions.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self.additions:
+            return True
+        return not self.hide_base and key not in self.deletions and key in self.base
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.hide_base:
+            for key in self.base:
+                if key not in self.deletions:
+                    yield key
+        for key in self.additions:
+            if self.hide_base or key not in self.base:
+                yield key
+
+    def __len__(self) -> int:
+        if self.hide_base:
+            return len(self.additions)
+        hidden = sum(1 for key in self.deletions if key in self.base)
+        new = sum(1 for key in self.additions if key not in self.base)
+        return len(self.base) - hidden + new
+
+    # Stream (key, record) pairs without copying the base
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        if not self.hide_base:
+            for key, record in self.base.items():
+                if key in self.deletions:
+                    continue
+                yield key, self.additions.get(key, record)
+        for key, record in self.additions.items():
+            if self.hide_base or key not in self.base:
+                yield key, record
+
+    def values(self) -> Iterator[Any]:
+        return (record for key, record in self.items())
+
+    # True if a base record is not visible as-is in this view
+    def is_hidden(self, key: str) -> bool:
+        return self.hide_base or key in self.deletions or key in self.additions
+
+    def hidden_count(self) -> int:
+        return len(self.deletions) + len(self.additions)
+
+    @property
+    def is_modified(self) -> bool:
+        return self.hide_base or bool(self.additions) or bool(self.deletions)
+
+    # Replace the whole view (e.g. clear or load a database) without touching the base
+    def replace_view(self, data: Mapping[str, Any]):
+        self.additions = dict(data.items())
+        self.deletions = set()
+        self.hide_base = True
+
+    # Drop key from the overlay so the base value shows through again
+    def forget(self, key: str):
+        self.additions.pop(key, None)
+        self.deletions.discard(key)
+
+    # One page of record summaries for listings, as PropertyStore.summaries. Filtering
+    # and paging run in SQL on the base; only a replaced view is summarised in memory.
+    def summaries(self, limit: int, offset: int = 0, sort_by: str = "added", descending: bool = False,
+                  text: str = "", **filters: str) -> Tuple[List[Dict[str, Any]], int]:
+        if not self.hide_base and not self.additions and hasattr(self.base, "summaries"):
+            return self.base.summaries(limit, offset, sort_by, descending, text, exclude=self.deletions, **filters)
+        rows = [{"key": key, **summary_values(record)} for key, record in self.items()]
+        rows = filter_summaries(rows, sort_by, descending, text, **filters)
+        return rows[offset:offset + limit], len(rows)
+
+    # Discard every overlay change
+    def revert(self):
+        self.additions = {}
+        self.deletions = set()
+        self.hide_base = False
+
+# Wraps a shared base index and a session-local index over the overlay's additions
+# so search sees the merged view. Results for hidden base records are dropped, and
+# result limits passed as top_n / top_k keywords are widened on the base index to
+# make up for them. Indexes whose scores are relative to their own corpus
+# (RELATIVE_SCORES) have each side's scores divided by its best before merging.
+class OverlayIndex:
+    LIMIT_ARGS = ("top_n", "top_k")
+
+    def __init__(self, base: Any, local: Any, view: OverlayDatabase, lock: threading.RLock):
+        self.base = base
+        self.local = local
+        self.view = view
+        self.lock = lock
+
+    def __getattr__(self, method: str) -> Callable:
+        if not callable(getattr(self.base, method, None)):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self._merged(method, args, kwargs)
+
+    @staticmethod
+    def _key(result: Any) -> str:
+        return result[0] if isinstance(result, tuple) else result
+
+    # (key, ..., score) results with their scores divided by the best one
+    @staticmethod
+    def _normalized(results: list) -> list:
+        if not results or not isinstance(results[0], tuple):
+            return results
+        best = max(result[-1] for result in results) or 1.0
+        return [(*result[:-1], result[-1] / best) for result in results]
+
+    def _merged(self, method: str, args: Tuple, kwargs: Dict[str, Any]) -> list:
+        results = []
+        if not self.view.hide_base:
+            base_kwargs = dict(kwargs)
+            for name in self.LIMIT_ARGS:
+                if name in base_kwargs:
+                    base_kwargs[name] += self.view.hidden_count()
+            with self.lock:
+                base_results = getattr(self.base, method)(*args, **base_kwargs)
+            results = [result for result in base_results if not self.view.is_hidden(self._key(result))]
+        local_results = getattr(self.local, method)(*args, **kwargs)
+        if getattr(self.base, "RELATIVE_SCORES", False):
+            results, local_results = self._normalized(results), self._normalized(local_results)
+        results += local_results
+
+        if results and isinstance(results[0], tuple):
+            results.sort(key=lambda result: (-result[-1], result[0]))
+        limit = next((kwargs[name] for name in self.LIMIT_ARGS if name in kwargs), None)
+        return results[:limit] if limit is not None else results
+
+# Writes by other processes up to this many seconds before the last refresh are
+# looked at again, in case their transaction committed after it
+REFRESH_OVERLAP = 5.0
+
+# The process-wide base: the persistent store plus search indexes built over it
+# once, or loaded warm from a snapshot. Sessions only read it; changes arrive
+# through upsert / delete / commit, which hold the lock so concurrent searches
+# never see a half-updated index. Writes made to the store by other processes
+# (background workers, ingest runs) are picked up by refresh().
+class SharedDatabase:
+    def __init__(self, store: PropertyStore, index_types: Mapping[str, Any] = SEARCH_INDEX_TYPES,
+                 snapshot_path: Optional[Path] = None):
+        self.store = store
+        self.index_types = dict(index_types)
+        self.snapshot_path = snapshot_path
+        self.lock = threading.RLock()
+        self.synced_at = time.time()
+        if snapshot_path is not None:
+            self.indexes = load_store_indexes(store, self.index_types, snapshot_path)
+        else:
+            self.indexes = {name: index_type.build(store) for name, index_type in self.index_types.items()}
+
+    def upsert(self, key: str, record: Any):
+        with self.lock:
+            self.store[key] = record
+            for index in self.indexes.values():
+                index.add(key, record)
+
+    # Upsert many records in one store transaction
+    def upsert_many(self, records: Iterable[Tuple[str, Any]]):
+        records = list(records)
+        with self.lock:
+            self.store.update_many(records)
+            for index in self.indexes.values():
+                for key, record in records:
+                    index.add(key, record)
+
+    def delete(self, key: str):
+        with self.lock:
+            if key in self.store:
+                del self.store[key]
+            for index in self.indexes.values():
+                index.remove(key)
+
+    def delete_many(self, keys: Iterable[str]):
+        keys = list(keys)
+        with self.lock:
+            self.store.delete_many(keys)
+            for index in self.indexes.values():
+                for key in keys:
+                    index.remove(key)
+
+    # Bring the indexes up to date with records other processes wrote to or deleted
+    # from the store since the last refresh. Returns the number of keys updated.
+    def refresh(self) -> int:
+        with self.lock:
+            since = self.synced_at - REFRESH_OVERLAP
+            self.synced_at = time.time()
+            changed = self.store.changed_since(since)
+            deleted = self.store.deleted_since(since)
+            for index in self.indexes.values():
+                for key in deleted:
+                    index.remove(key)
+                for key, record in changed:
+                    index.add(key, record)
+        return len(changed) + len(deleted)
+
+    # Write a session's overlay into the base and clear it
+    def commit(self, view: OverlayDatabase):
+        with self.lock:
+            if view.hide_base:
+                self.store.replace_all(view.additions)
+                self.indexes = {name: index_type.build(self.store) for name, index_type in self.index_types.items()}
+                if self.snapshot_path is not None:
+                    save_store_snapshot(self.store, self.indexes, self.snapshot_path)
+            else:
+                self.delete_many(view.deletions)
+                self.upsert_many(view.additions.items())
+        view.revert()
+
+    # Build empty session-local indexes, or indexes over the given records
+    def local_indexes(self, data: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+        return {name: index_type.build(data or {}) for name, index_type in self.index_types.items()}
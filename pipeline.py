@@ -0,0 +1,404 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+from google.genai import types
+
+from models import SOURCE_TEXT_FIELD, FusedNotice, PublicNotice, SearchMatches, Translations
+from result_cache import ResultCache, content_hash
+from script_detect import DEVANAGARI, script_segments
+from dedup import DuplicateIndex, duplicate_result, image_hash, text_signature
+
+DEFAULT_MODEL_ID = "gemini-2.0-flash"
+
+# Bump whenever OCR_PROMPT, the translation prompt or the extraction prompt
+# changes so cached results from the old prompts are not reused
+PROMPT_VERSION = "2"
+
+# Pipeline modes: three Gemini calls per notice (OCR, translation, extraction), or
+# one multimodal call that reads, translates and extracts the notice at once
+THREE_STAGE = "three-stage"
+FUSED = "fused"
+PIPELINE_MODES = [THREE_STAGE, FUSED]
+DEFAULT_PIPELINE_MODE = THREE_STAGE
+
+# Number of notices kept in flight at once by process_batch
+DEFAULT_MAX_WORKERS = 4
+MAX_WORKERS_LIMIT = 16
+
+# Number of locally retrieved candidates sent to Gemini for reranking
+DEFAULT_RERANK_CANDIDATES = 20
+
+OCR_PROMPT = """
+        Perform OCR to extract all text from this scanned Public Notice in a Maharashtra Newspaper.
+        Remove unnecessary whitespace before and after the text, and return the text.
+        """
+
+# Raised when a stage of the pipeline fails for a notice
+class PipelineError(Exception):
+    def __init__(self, stage: str, cause: Exception):
+        super().__init__(f"{stage} failed: {cause}")
+        self.stage = stage
+        self.cause = cause
+
+def build_translation_prompt(text: str) -> str:
+    return f"""
+                  I have performed OCR to extract all text from a scanned Public Notice in a
+                  Maharashtra Newspaper, it is attached below. It is in Hindi or Marathi , and
+                  may use Legalese. Translate it to english maintaining 100% of the meaning.
+                  Do not editorialize. Translate exactly as written and return the text.
+
+                  Rules:
+                  1. "गृहनिर्माण संस्था मर्यादित लिमिटेडच्या" translates to "Housing Society Limited".
+
+                  {text}
+            """
+
+# Rules and field descriptions for extraction, shared by the three-stage and fused prompts
+EXTRACTION_GUIDE = """
+    B. RULES:
+
+    1. Since public notices may contain multiple addresses, here are rules about how to store each address:
+        (1-a) Main property address i.e. where the title investigation is occuring will be mentioned - to be stored in "property_details.address" as an Address object.
+              If any address components are not clearly and explicitly mentioned, leave it as "n/a" instead of using components of other addresses.
+        (1-b) The seller's (person) address if they live elsewhere may be mentioned - to be stored in "seller_details.person_address" as a single string.
+        (1-c) The seller's (company) registered office address may be mentioned - to be stored in "seller_details.company_address" as a single string.
+        (1-d) The advocate (person or law firm) address will be mentioned - to be stored in "advocate_details.advocate_or_firm_address" as a single string.
+        (1-e) Any other address is not to be stored or extracted.
+        (1-f) Be extremely careful not to confuse any of the addresses you see in the text.
+    2. If a Public Notice includes multiple units (flats, shops, offices, etc.), capture data for all units without fail.
+       Some fields in the JSON response apply to each unit individually, while others are common. Carefully analyze the notice to assign values correctly.
+       For example, if flats #101 and #201 are listed, "property_details.address.flat_or_apartment_numbers" should be "Flat No. 101, Flat No. 201". If both are in the same building
+       "Pitale Prasad," "property_details.address.building_name" should be "Pitale Prasad". Ensure accurate field assignment based on shared or unit-specific details.
+    3. The following are examples of local governance bodies, and therefore should be excluded from your parsing - Pune Municipal Corporation, BMC, Gram Panchayats, Nagar Parishad,
+       Nagar Palika, Municipality, Zilla Parishad etc.
+    4. If pin code IS NOT explicitly mentioned for the Main property i.e. in "property_details.address", but IS mentioned for others (advocate / seller address), do not confuse,
+       leave "property_details.address.pin_code" as "n/a".
+    5. If you see a pattern like "Plot bearing S. No. 240, H. No. 3,4,5,6,7,8" follow these 2 rules:
+        (5-a) The "H. No." refers to Hissa number not House number, and should be placed in "property_details.survey_or_cs_or_cts_number" and not in "property_details.address.bungalow_or_house_number".
+        (5-b) The "Plot bearing S. No. 240" refers to a plot number and should be placed in "property_details.address.plot_number".
+
+
+    C. DESCRIPTIONS OF ADDRESS CLASS PROPERTIES:
+
+    flat_or_apartment_numbers: Identifier(s) of an individual unit within a residential building or area. Can contain multiple values if there are multiple units.
+                               (Examples: "Flat No. 202", "2", "Apt. 2a", "3A", "61 A", "C-602", "Flat No. 2 and Flat No. 3", "Flt. 5", "Flat #1, Apt#2")
+    office_or_shop_numbers: Identifier(s) of an individual unit within a commercial building or area. Can contain multiple values if there are multiple units.
+                            (Examples: "Shop No. 5", "Shop No. 1, 2, 3 & 4; Office No. 102", "Tenement No. 398/49", "Office #101", "Office 12")
+    floor_numbers: Identifier(s) of the floor number where the unit(s) are located within a building. Can contain multiple values if there are multiple units.
+                            (Examples: "5th floor", "First floor","Ground flr", "Ground", "floor 3")
+    building_wing_or_tower_or_number: Identifier of a single building amongst many within a society or building complex. Can contain multiple values if there are multiple units.
+                            (Examples: "Tower D", "B-3", "A", "C wing", "2", "Bldg. 5")
+    building_number_on_street: Identitifer of a building on a specific street. Can contain multiple values if there are multiple units.
+                               (Examples: ["57" from "57, Linking Road"], ["46" from "46, Embassy Apt, LG Marg"], ["9" from "9 Cannaught Rd"], ["FJ-11" from "Building No. FJ-11"])
+    plot_number: Identitifer of a residential or industrial plot of land or factory or shed. Can contain multiple values if needed.
+                 (Examples: "Final Plot No. 123-B1", "Final Plot Nos. 10", "Plot 5-C", "Plot No:40", "Plot bearing S. No. 185B", "Plot bearing S. No. 120")
+    bungalow_or_house_number: Identitifer of a bungalow or house. Do not confuse this with survey numbers. Can contain multiple values if needed.
+                 (Examples: "Bungalow 12", "House 819", "House No.331-334-335")
+    gut_or_gat_number: It is a unique land identification number assigned by the state's revenue department, usually for rural parcels of land.
+                       (Examples: "Gat No. 100", "Gut No. 339")
+    survey_or_cs_or_cts_number: It is an umbrella term for a variety of official identifiers of a parcel of land.
+                                (Examples: "Survey Number 60/AA", "Old Survey Number 5/121", "New Survey Number 12", "S. No 1A/294", "Svy. No 250 (part)", "C.S. No. 46/1",
+                                            "Survey No. 112, Hissa No. 3", "S. No. 112, H. No. 1,2,3,5,8", "Survey No. 121 (Hissa No. 5)", "City Survey No. 1176 (part)",
+                                            "Cadastral Survey No. 3", "Chain and Triangulation Survey No. 1A", "C. Survey. No. 2016/57")
+    building_name: Name of a residential / commerical / industrial building. Can contain multiple values if needed.
+                  (Examples: "Jeevan Niwas", "Prasad", "Lodha Supremus", "Sangita", "Nul Naka Ghar", "Sun-n-Sea", "Vivarea", "Gokul")
+    society_or_complex_name:  Name of a residential / commerical / industrial society or complex containing multiple buildings, plots, wings, houses, or offices.
+                              (Examples: "Ganjawala CHS Ltd.", "Rajdoot Co-op. Hsng. Soc", "Peninsula Corporate Park", "Sindh Co-operative Housing Society", "Kanjirapole CHS",
+                                         "Tarapur M.I.D.C", "Pravin Rita CHSL")
+    street_or_road_or_marg: Name or Identifier of a thoroughfare such as a street, road, lane, marg of the property.
+                            (Examples: "Laxmibai Jagmohandas Marg", "J.P. Road", "Hughes Rd.", "5th Street", "BMC Street No. 23-23B", "17th Road", "Venus Lane", "Chimbai Ln")
+    sub_locality_or_city_divsion: Name of Sub-locality, sub-area, or neighbourhood, or divisions within city limits. Be sure not to confuse this with "locality_or_area_or_neighbourhood".
+                                  (Examples: "Versova", "Kala Ghoda", "Pali Hill", "Phase 2", "Bhuleshwar Division", "Malabar Hill Div.")
+    locality_or_area_or_neighbourhood: Name of Locality, area, or neighbourhood. Be sure not to confuse this with village name.
+                                       (Examples: "Andheri (West)", "Goregaon W", "Shivajinagar", "Worli", "Aundh")
+    village: Official name of the village in which the property is located. Must be explicitly mentioned, else leave it as "n/a".
+             (Examples: "Village - Chatgaon", "Ranga Reddy Guda Village", "Vil-Somatane", "Vlg Ashti")
+    taluka: Official name of the taluka in which the property is located. Must be explicitly mentioned, else leave it as "n/a".
+            (Examples: "Taluka - Maval", "Andheri Taluka", "Tal-Akot", "Tlk Chikli")
+    district_and_or_sub_district: Official name of the district and/ or sub-district in which the property is located. Must be explicitly mentioned, else leave it as "n/a".
+                              (Examples: "District - Amravati", "Pune District", "Dist-Latur", "Registration District and Sub-district Mumbai City & Mumbai Suburban", "Sindhudurg Dist.")
+    city: Official name of the city in which the property is located.
+          (Examples: "Mumbai", "Pune", "Nagpur", "Nashik", "Aurangabad")
+    state: Official name of the state in which the property is located.
+           (Examples: "MH", "Maharashtra", "M.H", "Telangana", "Bihar", "GJ", "MP")
+    pin_code: 6-digit number representing postal code. Edge case: If 2-digit number found, append "4000" to it (edge case example, if "16" found, pin code is "400016").
+              (Example: "400030", "411 007", "16", "400 001")
+
+"""
+
+def build_passage_translation_prompt(passages: List[str]) -> str:
+    numbered = "\n\n".join(f"[{i}]\n{passage}" for i, passage in enumerate(passages, 1))
+    return f"""
+                  I have performed OCR to extract all text from a scanned Public Notice in a
+                  Maharashtra Newspaper. Its Hindi or Marathi passages are attached below, numbered
+                  [1] to [{len(passages)}], and may use Legalese. Translate each passage to english
+                  maintaining 100% of the meaning. Do not editorialize. Translate exactly as written,
+                  keep any English words, names and numbers as they are, and return one translation
+                  per passage in the same order.
+
+                  Rules:
+                  1. "गृहनिर्माण संस्था मर्यादित लिमिटेडच्या" translates to "Housing Society Limited".
+
+                  {numbered}
+            """
+
+def build_extraction_prompt(text: str) -> str:
+    return f"""
+    A. GOAL:
+
+    I have used OCR to extract text from a Public Notice in a Maharashtra Newspaper, it is in the section "FINAL_EXTRACTED_TEXT" below.
+    Acting as an experienced regional real estate lawyer, I need you to extract and parse structured data from the text.
+    Note, you must strictly adhere to the specified JSON response schema.
+{EXTRACTION_GUIDE}    D. FINAL_EXTRACTED_TEXT:
+
+    {text}
+    """
+
+FUSED_PROMPT = f"""
+    A. GOAL:
+
+    The attached image is a scanned Public Notice in a Maharashtra Newspaper. It may be in English, Hindi or Marathi, and may use Legalese.
+    1. Perform OCR to extract all text from the notice. Remove unnecessary whitespace before and after the text, and store it in "ocr_text".
+    2. If the text is in Hindi or Marathi, translate it to english maintaining 100% of the meaning. Do not editorialize. Translate exactly as written
+       and store it in "english_text"; "गृहनिर्माण संस्था मर्यादित लिमिटेडच्या" translates to "Housing Society Limited". If the text is already in English, store it unchanged.
+    3. Acting as an experienced regional real estate lawyer, extract and parse structured data from the English text into the remaining fields.
+    Note, you must strictly adhere to the specified JSON response schema.
+{EXTRACTION_GUIDE}"""
+
+def _image_part(image_data: bytes) -> types.Part:
+    image = Image.open(BytesIO(image_data))
+    return types.Part.from_bytes(data=image_data, mime_type=Image.MIME.get(image.format, "image/jpeg"))
+
+# OCR a notice image using Gemini. The encoded bytes are sent as they are; passing
+# a PIL image would have the SDK re-encode it, undoing any preprocessing.
+def run_ocr(client, model_id: str, image_data: bytes) -> str:
+    response = client.models.generate_content(
+        model=model_id,
+        contents=[_image_part(image_data), OCR_PROMPT]
+    )
+    return response.text
+
+# Translate the text to English if it is not already in English. The script of
+# each line is detected locally: English notices make no call, fully Devanagari
+# notices are translated whole, and mixed notices only send their Devanagari
+# passages and splice the translations back between the English lines (falling
+# back to translating the whole text if the passages don't come back one for one).
+def translate_if_needed(client, model_id: str, text: str) -> str:
+    segments = script_segments(text)
+    passages = [segment.text for segment in segments if segment.script == DEVANAGARI]
+    if not passages:
+        return text
+
+    if len(passages) < len(segments):
+        response = client.models.generate_content(
+            model=model_id,
+            contents=[build_passage_translation_prompt(passages)],
+            config={'response_mime_type': 'application/json',
+                    'response_schema': Translations.model_json_schema()}
+        )
+        parsed = response.parsed
+        if isinstance(parsed, Translations):
+            parsed = parsed.model_dump()
+        translations = Translations.model_validate(parsed or {"translations": []}).translations
+        if len(translations) == len(passages):
+            translated = iter(translations)
+            return "\n".join(next(translated).strip() if segment.script == DEVANAGARI else segment.text
+                             for segment in segments)
+
+    trans_response = client.models.generate_content(
+        model=model_id,
+        contents=[build_translation_prompt(text)]
+    )
+    return trans_response.text
+
+# Extract a PublicNotice dict from English notice text
+def extract_notice(client, model_id: str, text: str) -> Dict:
+    response = client.models.generate_content(
+        model=model_id,
+        contents=[build_extraction_prompt(text)],
+        config={'response_mime_type': 'application/json',
+                'response_schema': PublicNotice.model_json_schema()}
+    )
+    return response.parsed
+
+# Read, translate and extract a notice image in one call. The OCR and English
+# text are moved into the record's source_text section.
+def extract_notice_fused(client, model_id: str, image_data: bytes) -> Dict:
+    response = client.models.generate_content(
+        model=model_id,
+        contents=[_image_part(image_data), FUSED_PROMPT],
+        config={'response_mime_type': 'application/json',
+                'response_schema': FusedNotice.model_json_schema()}
+    )
+    parsed = response.parsed
+    if isinstance(parsed, FusedNotice):
+        parsed = parsed.model_dump(mode="json")
+    if not parsed:
+        return parsed
+    result = dict(parsed)
+    result[SOURCE_TEXT_FIELD] = {"ocr_text": result.pop("ocr_text", ""), "english_text": result.pop("english_text", "")}
+    return result
+
+# Ask Gemini to rerank a small set of candidate addresses against a search query.
+# candidates maps database keys to compact one-line addresses; only keys from
+# candidates are returned, best match first.
+def rerank_candidates(client, model_id: str, query: str, candidates: Dict[str, str], top_n: int = 3) -> List[str]:
+    if not candidates:
+        return []
+
+    addresses = "\n".join(f"{key}: {address}" for key, address in candidates.items())
+    prompt = f"""
+    Below is a list of property addresses, one per line as "key: address", and a search query.
+    Return the keys of the top {top_n} addresses that match the query, best match first.
+    Only return keys from the list, and return an empty list if nothing matches.
+
+    Addresses:
+    {addresses}
+
+    query: "{query}"
+    """
+
+    response = client.models.generate_content(
+        model=model_id,
+        contents=[prompt],
+        config={'response_mime_type': 'application/json',
+                'response_schema': SearchMatches.model_json_schema()}
+    )
+    parsed = response.parsed
+    if isinstance(parsed, SearchMatches):
+        parsed = parsed.model_dump()
+    keys = SearchMatches.model_validate(parsed or {"matching_keys": []}).matching_keys
+    return [key for key in dict.fromkeys(keys) if key in candidates][:top_n]
+
+# Look up a stage result in the cache, computing and storing it on a miss
+def _cached(cache: Optional[ResultCache], stage: str, model_id: str, digest: str, compute):
+    if cache is None:
+        return compute()
+    key = ResultCache.make_key(stage, model_id, PROMPT_VERSION, digest)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        if value:
+            cache.put(key, stage, value)
+    return value
+
+# Extract structured data from English text, reusing a cached extraction of identical text
+def extract_notice_cached(client, model_id: str, text: str, cache: Optional[ResultCache] = None) -> Dict:
+    return _cached(cache, "extraction", model_id, content_hash(text),
+                   lambda: extract_notice(client, model_id, text))
+
+# Image hash of a notice for duplicate detection, or None if it can't be decoded
+def _image_hash(image_data: bytes) -> Optional[int]:
+    try:
+        return image_hash(image_data)
+    except (OSError, ValueError):
+        return None
+
+# Run OCR -> translation -> extraction for one notice image. Mirrors the
+# sequential process_file in app.py: a failed translation falls back to the
+# OCR text, while OCR and extraction failures fail the notice.
+# With a cache, a repeated image returns its final result directly, and a
+# notice whose OCR / translated text was seen before reuses the later stages.
+# preprocess (e.g. a preprocess.ImagePreprocessor) shrinks the image before OCR;
+# it only runs on a cache miss, and its cache_key is part of the image's cache key.
+# In FUSED mode the whole notice is extracted by extract_notice_fused in one call.
+# Either way the OCR and English text are kept in the result's source_text section.
+# With a dedup index, a copy of a notice already in the database (stored under
+# another key) returns a dedup.duplicate_result instead: a near-identical scan is
+# caught before OCR, and the same text in another layout before translation.
+def process_notice(client, model_id: str, image_data: bytes, cache: Optional[ResultCache] = None,
+                   preprocess: Optional[Callable[[bytes], bytes]] = None, mode: str = DEFAULT_PIPELINE_MODE,
+                   dedup: Optional[DuplicateIndex] = None, key: Optional[str] = None) -> Dict:
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {mode}")
+    image_digest = content_hash(image_data)
+    if preprocess is not None:
+        image_digest = content_hash(f"{image_digest}|{getattr(preprocess, 'cache_key', '')}")
+
+    hash_value = None
+    if dedup is not None:
+        hash_value = _image_hash(image_data)
+        match = dedup.find_image(hash_value, exclude=key) if hash_value is not None else None
+        if match:
+            return duplicate_result(match)
+
+    if mode == FUSED:
+        try:
+            result = _cached(cache, "fused", model_id, image_digest,
+                             lambda: extract_notice_fused(client, model_id, preprocess(image_data) if preprocess else image_data))
+        except Exception as e:
+            raise PipelineError("Fused extraction", e) from e
+        if not result:
+            raise PipelineError("Fused extraction", ValueError("empty response"))
+        if dedup is not None and key is not None:
+            dedup.add(key, hash_value, text_signature(result.get(SOURCE_TEXT_FIELD, {}).get("ocr_text", "")))
+        return result
+
+    if cache is not None:
+        result = cache.get(ResultCache.make_key("result", model_id, PROMPT_VERSION, image_digest))
+        if result:
+            if dedup is not None and key is not None:
+                dedup.add(key, hash_value, text_signature(result.get(SOURCE_TEXT_FIELD, {}).get("ocr_text", "")))
+            return result
+
+    try:
+        ocr_text = _cached(cache, "ocr", model_id, image_digest,
+                           lambda: run_ocr(client, model_id, preprocess(image_data) if preprocess else image_data))
+    except Exception as e:
+        raise PipelineError("OCR", e) from e
+
+    signature = None
+    if dedup is not None:
+        signature = text_signature(ocr_text)
+        match = dedup.find_text(signature, exclude=key)
+        if match:
+            # Later scans of this copy are then caught by their image hash
+            dedup.add(match.key, hash_value)
+            return duplicate_result(match)
+
+    try:
+        executable_text = _cached(cache, "translation", model_id, content_hash(ocr_text),
+                                  lambda: translate_if_needed(client, model_id, ocr_text))
+    except Exception:
+        executable_text = ocr_text
+
+    try:
+        result = extract_notice_cached(client, model_id, executable_text, cache)
+    except Exception as e:
+        raise PipelineError("Extraction", e) from e
+
+    if not result:
+        raise PipelineError("Extraction", ValueError("empty response"))
+
+    result = dict(result)
+    result[SOURCE_TEXT_FIELD] = {"ocr_text": ocr_text, "english_text": executable_text}
+    if cache is not None:
+        cache.put(ResultCache.make_key("result", model_id, PROMPT_VERSION, image_digest), "result", result)
+    if dedup is not None and key is not None:
+        dedup.add(key, hash_value, signature)
+    return result
+
+# Process many notices concurrently on a bounded thread pool. Yields
+# (file_name, result, error) as each file finishes, in completion order;
+# exactly one of result / error is set.
+def process_batch(client, model_id: str, files: Iterable[Tuple[str, bytes]],
+                  max_workers: int = DEFAULT_MAX_WORKERS,
+                  cache: Optional[ResultCache] = None,
+                  preprocess: Optional[Callable[[bytes], bytes]] = None,
+                  mode: str = DEFAULT_PIPELINE_MODE,
+                  dedup: Optional[DuplicateIndex] = None) -> Iterator[Tuple[str, Optional[Dict], Optional[Exception]]]:
+    max_workers = max(1, min(int(max_workers), MAX_WORKERS_LIMIT))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="como-pipeline") as executor:
+        futures = {
+            executor.submit(process_notice, client, model_id, file_data, cache, preprocess, mode, dedup, file_name): file_name
+            for file_name, file_data in files
+        }
+        for future in as_completed(futures):
+            file_name = futures[future]
+            try:
+                yield file_name, future.result(), None
+            except Exception as e:
+                yield file_name, None, e
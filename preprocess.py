@@ -0,0 +1,198 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Steps applied to a notice image before OCR. Each step can be turned off.
+class PreprocessOptions(NamedTuple):
+    exif_transpose: bool = True
+    grayscale: bool = True
+    deskew: bool = True
+    crop_borders: bool = True
+    # Longest side after downscaling, in pixels (0 to keep the size)
+    max_long_edge: int = 2400
+    # Scans above this resolution are downscaled to it (0 to ignore DPI)
+    target_dpi: int = 300
+    output_format: str = "JPEG"
+    quality: int = 80
+
+    # Identifies the options in cache keys, so OCR of a differently preprocessed image is not reused
+    def cache_key(self) -> str:
+        return ",".join(f"{name}={value}" for name, value in self._asdict().items())
+
+OUTPUT_FORMATS = ["JPEG", "WEBP"]
+
+# Skew angles tried when deskewing, in degrees: a coarse pass over the whole
+# range, then a fine pass around the best coarse angle
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_COARSE_STEP = 1.0
+DESKEW_STEP = 0.2
+# Skew is only corrected if the best angle improves the profile score by this fraction
+MIN_SKEW_GAIN = 0.05
+# Deskew is skipped on images with less or more ink than this (blank or solid)
+MIN_INK_FRACTION = 0.001
+MAX_INK_FRACTION = 0.5
+# Deskew and border detection run on a copy scaled to this width
+ANALYSIS_WIDTH = 800
+
+# Pixels darker than this count as ink when finding borders and skew
+INK_THRESHOLD = 128
+# Rows / columns with less than this fraction of ink count as empty border
+BORDER_INK_FRACTION = 0.002
+BORDER_MARGIN = 16
+
+EXIF_ORIENTATION = 0x0112
+
+class PreprocessResult(NamedTuple):
+    data: bytes
+    original_bytes: int
+    output_bytes: int
+    size: Tuple[int, int]
+    steps: List[str]
+
+def _ink_mask(image: Image.Image) -> Tuple[np.ndarray, float]:
+    scale = min(1.0, ANALYSIS_WIDTH / image.width)
+    small = image.convert("L")
+    if scale < 1.0:
+        small = small.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    return np.asarray(small) < INK_THRESHOLD, scale
+
+# Skew angle that makes the text lines horizontal: the rotation maximising the
+# variance of the row ink profile (projection profile method)
+def estimate_skew(image: Image.Image) -> float:
+    mask, _ = _ink_mask(image)
+    # Blank pages and solid images have no text lines to align
+    if not MIN_INK_FRACTION < mask.mean() < MAX_INK_FRACTION:
+        return 0.0
+    ink = Image.fromarray((mask * 255).astype(np.uint8))
+
+    def score(angle: float) -> float:
+        rotated = np.asarray(ink.rotate(angle, resample=Image.NEAREST, fillcolor=0))
+        return float(np.var(rotated.sum(axis=1, dtype=np.int64)))
+
+    def best(angles: np.ndarray) -> Tuple[float, float]:
+        angles = np.clip(angles, -DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE)
+        scores = [score(float(angle)) for angle in angles]
+        i = int(np.argmax(scores))
+        return float(angles[i]), scores[i]
+
+    coarse, _ = best(np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_COARSE_STEP / 2, DESKEW_COARSE_STEP))
+    angle, best_score = best(np.arange(coarse - DESKEW_COARSE_STEP, coarse + DESKEW_COARSE_STEP + DESKEW_STEP / 2, DESKEW_STEP))
+    # Only rotate when it clearly lines the text up better than leaving the image as is
+    if best_score <= score(0.0) * (1 + MIN_SKEW_GAIN):
+        return 0.0
+    return round(angle, 2)
+
+def deskew(image: Image.Image) -> Tuple[Image.Image, float]:
+    angle = estimate_skew(image)
+    if abs(angle) < DESKEW_STEP / 2:
+        return image, 0.0
+    fill = 255 if image.mode == "L" else (255,) * len(image.getbands())
+    return image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill), angle
+
+# Bounding box of the ink, ignoring empty margins and thin scanner edges
+def content_bbox(image: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+    mask, scale = _ink_mask(image)
+    rows = np.flatnonzero(mask.mean(axis=1) > BORDER_INK_FRACTION)
+    columns = np.flatnonzero(mask.mean(axis=0) > BORDER_INK_FRACTION)
+    if rows.size == 0 or columns.size == 0:
+        return None
+    left = max(0, int(columns[0] / scale) - BORDER_MARGIN)
+    top = max(0, int(rows[0] / scale) - BORDER_MARGIN)
+    right = min(image.width, int((columns[-1] + 1) / scale) + BORDER_MARGIN)
+    bottom = min(image.height, int((rows[-1] + 1) / scale) + BORDER_MARGIN)
+    return left, top, right, bottom
+
+def _target_scale(image: Image.Image, options: PreprocessOptions) -> float:
+    scale = 1.0
+    dpi = image.info.get("dpi")
+    if options.target_dpi and dpi and dpi[0] and dpi[0] > options.target_dpi:
+        scale = options.target_dpi / float(dpi[0])
+    if options.max_long_edge:
+        scale = min(scale, options.max_long_edge / max(image.size))
+    return scale
+
+# Preprocess one encoded image. Runs in worker processes, so it takes and returns
+# plain bytes. The original is kept if re-encoding would not make it smaller and
+# its orientation did not need fixing.
+def preprocess_image(image_data: bytes, options: PreprocessOptions = PreprocessOptions()) -> PreprocessResult:
+    image = Image.open(BytesIO(image_data))
+    image.load()
+    info = dict(image.info)
+    steps = []
+
+    if options.exif_transpose and image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+        steps.append("exif_transpose")
+    if options.grayscale and image.mode != "L":
+        image = image.convert("L")
+        steps.append("grayscale")
+    elif image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+
+    # Downscale first so the remaining steps work on fewer pixels
+    image.info["dpi"] = info.get("dpi")
+    scale = _target_scale(image, options)
+    if scale < 1.0:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+        steps.append(f"downscale({scale:.2f})")
+    if options.deskew:
+        image, angle = deskew(image)
+        if angle:
+            steps.append(f"deskew({angle:+.2f})")
+    if options.crop_borders:
+        bbox = content_bbox(image)
+        if bbox and bbox != (0, 0, image.width, image.height):
+            image = image.crop(bbox)
+            steps.append("crop_borders")
+
+    out = BytesIO()
+    if options.output_format == "WEBP":
+        image.save(out, "WEBP", quality=options.quality, method=6)
+    else:
+        image.save(out, "JPEG", quality=options.quality, optimize=True, progressive=True)
+    data = out.getvalue()
+    # A re-encode that grew the file is only worth sending if it fixed the orientation
+    reoriented = any(step.startswith(("exif_transpose", "deskew")) for step in steps)
+    if len(data) >= len(image_data) and not reoriented:
+        original_size = Image.open(BytesIO(image_data)).size
+        return PreprocessResult(image_data, len(image_data), len(image_data), original_size, [])
+    return PreprocessResult(data, len(image_data), len(data), image.size, steps)
+
+# Runs preprocess_image on a process pool so the CPU-bound PIL / NumPy work runs
+# outside the pipeline's threads, and totals the bytes saved. Calling it blocks
+# the calling thread only.
+class ImagePreprocessor:
+    def __init__(self, options: PreprocessOptions = PreprocessOptions(), max_workers: Optional[int] = None,
+                 executor: Optional[ProcessPoolExecutor] = None):
+        self.options = options
+        self.executor = executor or ProcessPoolExecutor(max_workers=max_workers,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+        self._lock = threading.Lock()
+        self.images = 0
+        self.original_bytes = 0
+        self.output_bytes = 0
+
+    @property
+    def cache_key(self) -> str:
+        return self.options.cache_key()
+
+    def __call__(self, image_data: bytes) -> bytes:
+        result = self.executor.submit(preprocess_image, image_data, self.options).result()
+        with self._lock:
+            self.images += 1
+            self.original_bytes += result.original_bytes
+            self.output_bytes += result.output_bytes
+        return result.data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"images": self.images, "original_bytes": self.original_bytes, "output_bytes": self.output_bytes,
+                    "bytes_saved": self.original_bytes - self.output_bytes}
+
+    def shutdown(self):
+        self.executor.shutdown()
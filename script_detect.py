@@ -0,0 +1,83 @@
+from typing import List, NamedTuple
+
+import numpy as np
+
+# Script of a line of notice text: Devanagari (Hindi / Marathi, needs translating),
+# Latin (English) or neutral (no letters: numbers, dates, punctuation)
+DEVANAGARI = "devanagari"
+LATIN = "latin"
+NEUTRAL = "neutral"
+
+# Devanagari and Devanagari Extended code point ranges
+DEVANAGARI_RANGES = [(0x0900, 0x097F), (0xA8E0, 0xA8FF)]
+
+# A line is Devanagari if at least this share of its letters are Devanagari. Marathi
+# legal text often carries English words, survey numbers and names in Latin script.
+DEVANAGARI_LINE_SHARE = 0.3
+
+class Segment(NamedTuple):
+    text: str
+    script: str
+
+def _code_points(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+def _is_devanagari(points: np.ndarray) -> np.ndarray:
+    devanagari = np.zeros(points.shape, dtype=bool)
+    for low, high in DEVANAGARI_RANGES:
+        devanagari |= (points >= low) & (points <= high)
+    return devanagari
+
+# True if the text contains any Devanagari. Pure-English notices stop here.
+def has_devanagari(text: str) -> bool:
+    return not text.isascii() and bool(_is_devanagari(_code_points(text)).any())
+
+# Devanagari and Latin letter counts for every line of the text, computed for the
+# whole text at once: each code point gets its line number from a running count
+# of newlines, and the counts are summed per line with bincount.
+def line_script_counts(text: str) -> np.ndarray:
+    points = _code_points(text)
+    line_ids = np.cumsum(points == ord("\n")) if points.size else points
+    lines = text.count("\n") + 1
+    devanagari = _is_devanagari(points)
+    # Latin letters are ASCII letters plus the accented Latin-1 / Latin Extended letters
+    folded = points | 0x20
+    latin = ((folded >= ord("a")) & (folded <= ord("z"))) | ((points >= 0x00C0) & (points <= 0x024F) & (points != 0x00D7) & (points != 0x00F7))
+    return np.stack([np.bincount(line_ids, weights=devanagari, minlength=lines),
+                     np.bincount(line_ids, weights=latin, minlength=lines)], axis=1)
+
+# Script of each line of the text
+def classify_lines(text: str) -> List[str]:
+    if not has_devanagari(text):
+        return [LATIN if any(c.isalpha() for c in line) else NEUTRAL for line in text.split("\n")]
+    counts = line_script_counts(text)
+    letters = counts.sum(axis=1)
+    share = np.divide(counts[:, 0], letters, out=np.zeros(len(counts)), where=letters > 0)
+    scripts = np.where(letters == 0, NEUTRAL, np.where(share >= DEVANAGARI_LINE_SHARE, DEVANAGARI, LATIN))
+    return scripts.tolist()
+
+# Language of the text as a whole, for callers that only need one decision:
+# Devanagari if any line is
+def text_script(text: str) -> str:
+    scripts = set(classify_lines(text))
+    if DEVANAGARI in scripts:
+        return DEVANAGARI
+    return LATIN if LATIN in scripts else NEUTRAL
+
+# Split the text into runs of consecutive Devanagari and Latin lines. Neutral
+# lines join the run they are in, so "\n".join of the segments is the text.
+def script_segments(text: str) -> List[Segment]:
+    lines = text.split("\n")
+    scripts = classify_lines(text)
+    segments: List[Segment] = []
+    current: List[str] = []
+    current_script = None
+    for line, script in zip(lines, scripts):
+        if script != NEUTRAL and current_script not in (None, script):
+            segments.append(Segment("\n".join(current), current_script))
+            current = []
+        if script != NEUTRAL:
+            current_script = script
+        current.append(line)
+    segments.append(Segment("\n".join(current), current_script or NEUTRAL))
+    return segments
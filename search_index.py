@@ -0,0 +1,250 @@
+import difflib
+import heapq
+import math
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Relative importance of each Address field when ranking matches.
+# Administrative / locality names identify a property far better than the state.
+FIELD_WEIGHTS = {
+    "village": 3.0,
+    "taluka": 3.0,
+    "locality_or_area_or_neighbourhood": 3.0,
+    "sub_locality_or_city_divsion": 2.5,
+    "building_name": 2.5,
+    "society_or_complex_name": 2.5,
+    "district_and_or_sub_district": 2.0,
+    "street_or_road_or_marg": 2.0,
+    "pin_code": 2.0,
+    "survey_or_cs_or_cts_number": 1.5,
+    "gut_or_gat_number": 1.5,
+    "plot_number": 1.5,
+    "city": 1.5,
+    "flat_or_apartment_numbers": 1.0,
+    "office_or_shop_numbers": 1.0,
+    "floor_numbers": 1.0,
+    "building_wing_or_tower_or_number": 1.0,
+    "building_number_on_street": 1.0,
+    "bungalow_or_house_number": 1.0,
+    "state": 0.3,
+}
+
+# Order of Address fields when writing an address on one line
+ADDRESS_FIELD_ORDER = [
+    "flat_or_apartment_numbers",
+    "office_or_shop_numbers",
+    "floor_numbers",
+    "building_wing_or_tower_or_number",
+    "building_name",
+    "society_or_complex_name",
+    "building_number_on_street",
+    "street_or_road_or_marg",
+    "bungalow_or_house_number",
+    "plot_number",
+    "gut_or_gat_number",
+    "survey_or_cs_or_cts_number",
+    "sub_locality_or_city_divsion",
+    "locality_or_area_or_neighbourhood",
+    "village",
+    "taluka",
+    "district_and_or_sub_district",
+    "city",
+    "state",
+    "pin_code",
+]
+
+# Record section holding fields precomputed at ingest by normalize.py. Bump the
+# version when the tokenizer or address format changes so stale sections are ignored.
+DERIVED_FIELD = "derived"
+DERIVED_VERSION = 1
+
+# Tokens too common in addresses to help ranking
+STOPWORDS = {"no", "nos", "the", "of", "and", "at", "in", "near", "opp", "na"}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Once candidates are found from rarer terms, terms matching more than this many
+# records only re-score existing candidates instead of adding new ones
+COMMON_TERM_DF = 1000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Split text into lowercase alphanumeric tokens
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+# Return the Address dict of a record in either the legacy flat or the full PublicNotice shape
+def get_address(record: Mapping[str, Any]) -> Optional[Mapping[str, Any]]:
+    if not isinstance(record, Mapping):
+        return None
+    if "property_details" in record and "address" in (record["property_details"] or {}):
+        return record["property_details"]["address"]
+    if "address" in record:
+        return record["address"]
+    return None
+
+# Tokens of each non-empty address field
+def address_tokens(record: Mapping[str, Any]) -> Dict[str, List[str]]:
+    address = get_address(record) or {}
+    field_tokens = {}
+    for field in FIELD_WEIGHTS:
+        tokens = tokenize(field_text(address.get(field)))
+        if tokens:
+            field_tokens[field] = tokens
+    return field_tokens
+
+# Return the string value of an address field, unwrapping enum dicts and dropping "n/a"
+def field_text(value: Any) -> str:
+    if isinstance(value, Mapping):
+        value = value.get("value", "")
+    if value is None:
+        return ""
+    value = str(value).strip()
+    if value.lower() in ("n/a", "na", "none"):
+        return ""
+    return value
+
+# The precomputed derived section of a record, if it is current
+def get_derived(record: Mapping[str, Any]) -> Optional[Mapping[str, Any]]:
+    derived = record.get(DERIVED_FIELD) if isinstance(record, Mapping) else None
+    if isinstance(derived, Mapping) and derived.get("version") == DERIVED_VERSION:
+        return derived
+    return None
+
+# One-line address of a record with the "n/a" fields dropped, used to keep prompts small
+def compact_address(record: Mapping[str, Any]) -> str:
+    derived = get_derived(record)
+    if derived is not None:
+        return derived["compact_address"]
+    return build_compact_address(record)
+
+def build_compact_address(record: Mapping[str, Any]) -> str:
+    address = get_address(record) or {}
+    parts = [field_text(address.get(field)) for field in ADDRESS_FIELD_ORDER]
+    details = record.get("property_details", record) if isinstance(record, Mapping) else {}
+    property_type = field_text((details or {}).get("type_of_property"))
+    if property_type:
+        parts.append(f"({property_type})")
+    return ", ".join(part for part in parts if part)
+
+# Inverted index over Address fields with BM25 ranking and per-field weights.
+# Records can be added and removed incrementally as the database changes.
+class AddressIndex:
+    # BM25 scores depend on the statistics of the corpus searched, so scores from
+    # two indexes can't be compared as they are
+    RELATIVE_SCORES = True
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None):
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.total_length = 0.0
+
+    @classmethod
+    def build(cls, data: Mapping[str, Any]) -> "AddressIndex":
+        index = cls()
+        for key, record in data.items():
+            index.add(key, record)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.doc_terms
+
+    # Weighted term frequencies of a record's address
+    def _weighted_terms(self, record: Mapping[str, Any]) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        derived = get_derived(record)
+        if derived is not None:
+            field_tokens = derived["address_tokens"]
+        else:
+            field_tokens = address_tokens(record)
+        for field, weight in self.field_weights.items():
+            for token in field_tokens.get(field, ()):
+                terms[token] = terms.get(token, 0.0) + weight
+        return terms
+
+    def add(self, key: str, record: Mapping[str, Any]):
+        if key in self.doc_terms:
+            self.remove(key)
+        terms = self._weighted_terms(record)
+        length = sum(terms.values())
+        self.doc_terms[key] = terms
+        self.doc_lengths[key] = length
+        self.total_length += length
+        for token, tf in terms.items():
+            self.postings.setdefault(token, {})[key] = tf
+
+    def remove(self, key: str):
+        terms = self.doc_terms.pop(key, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(key, 0.0)
+        for token in terms:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[token]
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.doc_lengths.clear()
+        self.total_length = 0.0
+
+    def _idf(self, df: int) -> float:
+        n = len(self.doc_terms)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    # Return up to top_n (key, score) pairs, best first
+    def search(self, query: str, top_n: int = 3) -> List[Tuple[str, float]]:
+        if not self.doc_terms:
+            return []
+
+        query_terms = [token for token in dict.fromkeys(tokenize(query)) if token in self.postings]
+        if not query_terms:
+            return []
+
+        # Rarest terms first so common terms rarely have to walk their full postings
+        query_terms.sort(key=lambda token: len(self.postings[token]))
+        avg_length = self.total_length / len(self.doc_terms) or 1.0
+        scores: Dict[str, float] = {}
+
+        for token in query_terms:
+            posting = self.postings[token]
+            idf = self._idf(len(posting))
+            if scores and len(posting) > COMMON_TERM_DF:
+                keys: Iterable[str] = [key for key in scores if key in posting]
+            else:
+                keys = posting.keys()
+            for key in keys:
+                tf = posting[key]
+                norm = K1 * (1 - B + B * self.doc_lengths[key] / avg_length)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        return heapq.nsmallest(top_n, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    # Map query tokens that aren't indexed onto indexed tokens with a close spelling
+    def expand_query(self, query: str, max_expansions: int = 3) -> str:
+        vocabulary = None
+        tokens = []
+        for token in dict.fromkeys(tokenize(query)):
+            if token in self.postings:
+                tokens.append(token)
+                continue
+            if vocabulary is None:
+                vocabulary = list(self.postings)
+            tokens.extend(difflib.get_close_matches(token, vocabulary, n=max_expansions, cutoff=0.7))
+        return " ".join(tokens)
+
+    # Loose candidate retrieval for reranking: BM25 over the query with misspelt
+    # tokens expanded to their closest indexed spellings
+    def retrieve(self, query: str, top_k: int) -> List[str]:
+        return [key for key, score in self.search(self.expand_query(query), top_k)]
@@ -0,0 +1,192 @@
+from io import BytesIO
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Pages are analysed on a copy scaled to this width; crops are cut from the original
+ANALYSIS_WIDTH = 1200
+
+# Pixels darker than this count as ink
+INK_THRESHOLD = 140
+
+# Ink runs at least this fraction of the page width (height) long are ruling lines
+MIN_LINE_FRACTION = 0.04
+
+# Ruling lines are thickened by this many analysis pixels to close small gaps in box borders
+LINE_DILATION = 2
+
+# A box must cover at least this fraction of the page, and its interior must fill
+# this much of its bounding rectangle (notice boxes are rectangles)
+MIN_BOX_AREA_FRACTION = 0.002
+MIN_BOX_FILL = 0.85
+
+# Boxes with less ink than this inside are empty frames, not notices
+MIN_BOX_INK = 0.002
+
+# Padding around each crop, in original pixels, so the border is kept
+CROP_MARGIN = 16
+
+# Crop boxes are written into notice IDs in units of 1/10000 of the page size,
+# so the same page always yields the same IDs whatever its resolution
+ID_SCALE = 10000
+
+Box = Tuple[int, int, int, int]
+
+class NoticeCrop(NamedTuple):
+    notice_id: str
+    box: Box
+    data: bytes
+
+def _long_runs(mask: np.ndarray, min_length: int) -> np.ndarray:
+    # Mask of the True runs along each row that are at least min_length long
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    long = (ends - starts) >= min_length
+    lines = np.zeros(mask.shape, dtype=np.int32)
+    # Mark run starts +1 and ends -1, then a cumulative sum fills each run
+    np.add.at(lines, (rows[long], starts[long]), 1)
+    ends_long = ends[long]
+    inside = ends_long < mask.shape[1]
+    np.add.at(lines, (rows[long][inside], ends_long[inside]), -1)
+    return np.cumsum(lines, axis=1) > 0
+
+def _dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    result = mask.copy()
+    for shift in range(1, radius + 1):
+        result[shift:, :] |= mask[:-shift, :]
+        result[:-shift, :] |= mask[shift:, :]
+        result[:, shift:] |= mask[:, :-shift]
+        result[:, :-shift] |= mask[:, shift:]
+    return result
+
+# Horizontal and vertical ruling lines of a binarised page
+def ruling_lines(ink: np.ndarray) -> np.ndarray:
+    height, width = ink.shape
+    horizontal = _long_runs(ink, max(10, int(width * MIN_LINE_FRACTION)))
+    vertical = _long_runs(ink.T, max(10, int(height * MIN_LINE_FRACTION))).T
+    return _dilate(horizontal | vertical, LINE_DILATION)
+
+# Connected components (4-connected) of a mask, labelled run by run: runs in
+# each row are unioned with the overlapping runs of the row above. Returns each
+# component's bounding box, pixel count and whether it touches the image edge.
+def connected_components(mask: np.ndarray) -> List[Dict[str, int]]:
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    _, run_ends = np.nonzero(edges == -1)
+
+    parent = list(range(len(run_rows)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    row_bounds = np.searchsorted(run_rows, np.arange(height + 1))
+    for row in range(1, height):
+        above = range(row_bounds[row - 1], row_bounds[row])
+        current = range(row_bounds[row], row_bounds[row + 1])
+        i, j = above.start, current.start
+        while i < above.stop and j < current.stop:
+            if run_starts[i] < run_ends[j] and run_starts[j] < run_ends[i]:
+                a, b = find(i), find(j)
+                if a != b:
+                    parent[b] = a
+            if run_ends[i] < run_ends[j]:
+                i += 1
+            else:
+                j += 1
+
+    components: Dict[int, Dict[str, int]] = {}
+    for run in range(len(run_rows)):
+        root = find(run)
+        row, start, end = int(run_rows[run]), int(run_starts[run]), int(run_ends[run])
+        component = components.get(root)
+        if component is None:
+            components[root] = {"x0": start, "y0": row, "x1": end, "y1": row + 1, "area": end - start}
+        else:
+            component["x0"] = min(component["x0"], start)
+            component["x1"] = max(component["x1"], end)
+            component["y1"] = row + 1
+            component["area"] += end - start
+    for component in components.values():
+        component["touches_edge"] = int(component["x0"] == 0 or component["y0"] == 0
+                                        or component["x1"] == width or component["y1"] == height)
+    return list(components.values())
+
+def _contains(outer: Box, inner: Box) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3] and outer != inner
+
+# Bounding boxes of the bordered notice boxes on a page, in reading order (column by
+# column, top to bottom), in the coordinates of the given image
+def find_notice_boxes(image: Image.Image) -> List[Box]:
+    gray = ImageOps.exif_transpose(image).convert("L")
+    scale = min(1.0, ANALYSIS_WIDTH / gray.width)
+    if scale < 1.0:
+        gray = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))))
+    ink = np.asarray(gray) < INK_THRESHOLD
+    height, width = ink.shape
+
+    # Box interiors are the regions enclosed by ruling lines
+    boxes = []
+    for component in connected_components(~ruling_lines(ink)):
+        if component["touches_edge"]:
+            continue
+        box = (component["x0"], component["y0"], component["x1"], component["y1"])
+        box_area = (box[2] - box[0]) * (box[3] - box[1])
+        if box_area < MIN_BOX_AREA_FRACTION * width * height or component["area"] < MIN_BOX_FILL * box_area:
+            continue
+        if ink[box[1]:box[3], box[0]:box[2]].mean() < MIN_BOX_INK:
+            continue
+        boxes.append(box)
+
+    # A frame inside a notice (a logo or a table) belongs to that notice
+    boxes = [box for box in boxes if not any(_contains(other, box) for other in boxes)]
+
+    column_width = max(1, width // 20)
+    boxes.sort(key=lambda box: (box[0] // column_width, box[1], box[0]))
+    return [tuple(int(round(value / scale)) for value in box) for box in boxes]
+
+def notice_id(page_name: str, box: Box, page_size: Tuple[int, int]) -> str:
+    width, height = page_size
+    x0, y0, x1, y1 = box
+    coordinates = [x0 * ID_SCALE // width, y0 * ID_SCALE // height, x1 * ID_SCALE // width, y1 * ID_SCALE // height]
+    return f"{page_name}#" + "-".join(f"{value:04d}" for value in coordinates)
+
+# Split a newspaper page into one crop per bordered notice. Returns [] if the
+# image has fewer than min_boxes boxes, i.e. it is already a single notice.
+def segment_page(page_name: str, image_data: bytes, min_boxes: int = 2) -> List[NoticeCrop]:
+    image = ImageOps.exif_transpose(Image.open(BytesIO(image_data)))
+    boxes = find_notice_boxes(image)
+    if len(boxes) < min_boxes:
+        return []
+
+    crops = []
+    for box in boxes:
+        padded = (max(0, box[0] - CROP_MARGIN), max(0, box[1] - CROP_MARGIN),
+                  min(image.width, box[2] + CROP_MARGIN), min(image.height, box[3] + CROP_MARGIN))
+        out = BytesIO()
+        crop = image.crop(padded)
+        if crop.mode not in ("L", "RGB"):
+            crop = crop.convert("RGB")
+        crop.save(out, "PNG")
+        crops.append(NoticeCrop(notice_id(page_name, box, image.size), padded, out.getvalue()))
+    return crops
+
+# (name, image bytes) pairs for an uploaded file: one per notice on a newspaper
+# page, or the file itself if no notice boxes are found. Runs in worker processes.
+def split_upload(file_name: str, image_data: bytes) -> List[Tuple[str, bytes]]:
+    try:
+        crops = segment_page(file_name, image_data)
+    except (OSError, ValueError):
+        crops = []
+    if not crops:
+        return [(file_name, image_data)]
+    return [(crop.notice_id, crop.data) for crop in crops]
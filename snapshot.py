@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from store import DEFAULT_DB_PATH, PropertyStore
+
+# Snapshot layout:
+#   MAGIC | uint32 format version | uint32 header length | header JSON | sections...
+# The header lists each section's offset (from the end of the header), length and
+# BLAKE2b checksum. Sections are the keys of the records indexed (to find the ones
+# deleted since) and each index, pickled whole. Records themselves are read from
+# the store.
+MAGIC = b"COMOSNAP"
+FORMAT_VERSION = 2
+
+# Bump when the structure of any search index class changes, so old pickles are rebuilt
+INDEX_VERSION = 1
+
+DEFAULT_SNAPSHOT_PATH = DEFAULT_DB_PATH.with_suffix(".snapshot")
+
+# A stale snapshot is rewritten once catching it up means re-indexing this many records
+REFRESH_THRESHOLD = 500
+
+_PREAMBLE = struct.Struct("<8sII")
+
+class SnapshotError(Exception):
+    pass
+
+def _checksum(data: Union[bytes, memoryview]) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Write a snapshot of the prebuilt indexes over the records with the given keys.
+# The file is written next to the target and renamed into place, so readers never
+# see a half-written snapshot.
+def write_snapshot(path: Union[str, Path], keys: Iterable[str],
+                   indexes: Mapping[str, Any], source: Optional[Dict[str, Any]] = None):
+    path = Path(path)
+    sections: Dict[str, bytes] = {"keys": json.dumps(list(keys)).encode("utf-8")}
+    for name, index in indexes.items():
+        sections[f"index/{name}"] = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+
+    layout, offset = {}, 0
+    for name, data in sections.items():
+        layout[name] = {"offset": offset, "length": len(data), "checksum": _checksum(data)}
+        offset += len(data)
+    header = {
+        "format_version": FORMAT_VERSION,
+        "index_version": INDEX_VERSION,
+        "index_types": {name: f"{type(index).__module__}.{type(index).__name__}" for name, index in indexes.items()},
+        "created_at": time.time(),
+        "source": source or {},
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for data in sections.values():
+            f.write(data)
+    os.replace(tmp_path, path)
+
+# An opened, memory-mapped snapshot. Raises SnapshotError if the file is not a
+# snapshot of the current format or a section fails its checksum.
+class Snapshot:
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self._file.close()
+            raise SnapshotError(f"Empty snapshot file: {self.path}") from e
+
+        try:
+            if len(self._mmap) < _PREAMBLE.size:
+                raise SnapshotError("Truncated snapshot header")
+            magic, version, header_length = _PREAMBLE.unpack_from(self._mmap, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot format (version {version})")
+            self._data_start = _PREAMBLE.size + header_length
+            self.header = json.loads(self._mmap[_PREAMBLE.size:self._data_start])
+            if self.header.get("index_version") != INDEX_VERSION:
+                raise SnapshotError("Snapshot indexes were built by an older version")
+        except (SnapshotError, ValueError, struct.error) as e:
+            self.close()
+            raise e if isinstance(e, SnapshotError) else SnapshotError(f"Corrupt snapshot header: {e}")
+        self._verified = set()
+
+    @property
+    def source(self) -> Dict[str, Any]:
+        return self.header.get("source", {})
+
+    def _entry(self, name: str) -> Dict[str, Any]:
+        entry = self.header["sections"].get(name)
+        if entry is None:
+            raise SnapshotError(f"Missing snapshot section: {name}")
+        if name not in self._verified:
+            start = self._data_start + entry["offset"]
+            data = self._mmap[start:start + entry["length"]]
+            if len(data) != entry["length"] or _checksum(data) != entry["checksum"]:
+                raise SnapshotError(f"Checksum mismatch in snapshot section: {name}")
+            self._verified.add(name)
+        return entry
+
+    # Whole section contents, checksum-verified on first access
+    def section(self, name: str) -> bytes:
+        entry = self._entry(name)
+        start = self._data_start + entry["offset"]
+        return self._mmap[start:start + entry["length"]]
+
+    # Keys of the records the indexes were built over
+    def keys(self) -> List[str]:
+        return json.loads(self.section("keys"))
+
+    def index_names(self) -> Iterable[str]:
+        return [name[len("index/"):] for name in self.header["sections"] if name.startswith("index/")]
+
+    def load_index(self, name: str) -> Any:
+        return pickle.loads(self.section(f"index/{name}"))
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _store_source(store: PropertyStore) -> Dict[str, Any]:
+    return {"db_path": str(store.path), "fingerprint": store.fingerprint(), "last_updated": store.last_updated()}
+
+def build_indexes(data: Mapping[str, Any], index_types: Mapping[str, Any]) -> Dict[str, Any]:
+    return {name: index_type.build(data) for name, index_type in index_types.items()}
+
+# Write a fresh snapshot of the store and the given indexes
+def save_store_snapshot(store: PropertyStore, indexes: Mapping[str, Any],
+                        path: Union[str, Path] = DEFAULT_SNAPSHOT_PATH):
+    write_snapshot(path, store, indexes, _store_source(store))
+
+# Load warm indexes for the store from its snapshot. A snapshot that is merely behind
+# the store is caught up by re-indexing only the records changed since it was written;
+# a missing, corrupt or incompatible snapshot falls back to a full rebuild, after which
+# a new snapshot is written for the next process.
+def load_store_indexes(store: PropertyStore, index_types: Mapping[str, Any],
+                       path: Union[str, Path] = DEFAULT_SNAPSHOT_PATH) -> Dict[str, Any]:
+    path = Path(path)
+    try:
+        with Snapshot(path) as snapshot:
+            expected = {name: f"{index_type.__module__}.{index_type.__name__}" for name, index_type in index_types.items()}
+            if snapshot.header.get("index_types") != expected:
+                raise SnapshotError("Snapshot holds a different set of indexes")
+            indexes = {name: snapshot.load_index(name) for name in index_types}
+            source = snapshot.source
+            snapshot_keys = set(snapshot.keys())
+    except (OSError, SnapshotError, pickle.UnpicklingError, ValueError, KeyError, AttributeError):
+        indexes = build_indexes(store, index_types)
+        save_store_snapshot(store, indexes, path)
+        return indexes
+
+    if source.get("fingerprint") != store.fingerprint():
+        deleted = snapshot_keys - set(store)
+        changed = store.changed_since(source.get("last_updated", 0))
+        for index in indexes.values():
+            for key in deleted:
+                index.remove(key)
+            for key, record in changed:
+                index.add(key, record)
+        if len(deleted) + len(changed) > REFRESH_THRESHOLD:
+            save_store_snapshot(store, indexes, path)
+    return indexes
+
+# Command line entry point: regenerate the snapshot for a store
+def main(argv: Optional[list] = None) -> int:
+    from overlay import SEARCH_INDEX_TYPES
+
+    parser = argparse.ArgumentParser(description="Build a precompiled database snapshot with warm search indexes.")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite property store to snapshot")
+    parser.add_argument("--out", help="Snapshot file to write (default: next to the store)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    store = PropertyStore(args.db)
+    out = Path(args.out or Path(args.db).with_suffix(".snapshot"))
+    indexes = build_indexes(store, SEARCH_INDEX_TYPES)
+    save_store_snapshot(store, indexes, out)
+    count = len(store)
+    store.close()
+
+    print(f"Wrote {out} with {count} records in {time.perf_counter() - started:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
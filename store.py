@@ -0,0 +1,363 @@
+import enum
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from search_index import compact_address, field_text, get_address
+
+DEFAULT_DB_PATH = Path(os.environ.get("COMO_DB_PATH", Path(__file__).parent / "data" / "como.sqlite3"))
+
+# Rows fetched per query when streaming the whole store
+BATCH_SIZE = 500
+
+# Formats seen for GeneralNoticeInfo.date_of_notice_in_DDMMYY_format
+NOTICE_DATE_FORMATS = ["%d%m%y", "%d/%m/%y", "%d-%m-%y", "%d.%m.%y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d%m%Y"]
+
+# Columns extracted from each notice so the store can filter without decoding payloads
+INDEXED_COLUMNS = ["district", "city", "pin_code", "usage_type", "notice_date"]
+
+# One-line summary columns listed in the Database tab, precomputed when a record is written
+SUMMARY_COLUMNS = ["address", "district", "city", "usage_type", "notice_date"]
+
+# Sort orders offered for summaries; "added" is insertion order
+SUMMARY_SORTS = {
+    "added": "rowid",
+    "key": "key",
+    "address": "address",
+    "district": "district",
+    "notice_date": "notice_date",
+    "usage_type": "usage_type",
+}
+
+_STORED_COLUMNS = INDEXED_COLUMNS + ["address"]
+
+# Parse a DDMMYY style notice date into an ISO date string
+def parse_notice_date(value: Any) -> Optional[str]:
+    text = field_text(value)
+    if not text:
+        return None
+    text = text.replace(" ", "")
+    for date_format in NOTICE_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+# JSON encoder fallback for enums and Pydantic models inside records
+def json_default(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "dict"):
+        return value.dict()
+    return str(value)
+
+# Values of the indexed columns for a record in either database shape
+def indexed_values(record: Mapping[str, Any]) -> Dict[str, Optional[str]]:
+    address = get_address(record) or {}
+    details = record.get("property_details", record) if isinstance(record, Mapping) else {}
+    notice_info = record.get("general_notice_info", {}) if isinstance(record, Mapping) else {}
+    return {
+        "district": field_text(address.get("district_and_or_sub_district")) or None,
+        "city": field_text(address.get("city")) or None,
+        "pin_code": field_text(address.get("pin_code")).replace(" ", "") or None,
+        "usage_type": field_text((details or {}).get("property_usage_type")) or None,
+        "notice_date": parse_notice_date((notice_info or {}).get("date_of_notice_in_DDMMYY_format")),
+    }
+
+# One-line summary of a record for listings
+def summary_values(record: Mapping[str, Any]) -> Dict[str, Optional[str]]:
+    values = indexed_values(record)
+    values["address"] = compact_address(record) if isinstance(record, Mapping) else ""
+    return {column: values[column] for column in SUMMARY_COLUMNS}
+
+# Filter and sort summaries in memory the same way PropertyStore.summaries does in SQL
+def filter_summaries(summaries: List[Dict[str, Any]], sort_by: str = "added", descending: bool = False,
+                     text: str = "", **filters: str) -> List[Dict[str, Any]]:
+    text = text.lower()
+    rows = [
+        row for row in summaries
+        if all(not value or row.get(column) == value for column, value in filters.items())
+        and (not text or text in row["key"].lower() or text in (row["address"] or "").lower())
+    ]
+    if sort_by != "added":
+        # Missing values sort last in either direction, as in SQL with "IS NULL" first
+        present = [row for row in rows if row.get(sort_by)]
+        missing = [row for row in rows if not row.get(sort_by)]
+        if descending:
+            # Ties keep newest first, matching "rowid DESC"
+            present.reverse()
+            missing.reverse()
+        present.sort(key=lambda row: row[sort_by], reverse=descending)
+        rows = present + missing
+    elif descending:
+        rows.reverse()
+    return rows
+
+# Embedded SQLite store with one row per notice. Behaves like the processed_data
+# dict (keys are file names, values are notice dicts) but reads and writes
+# single rows, so the archive never has to be loaded into memory at once.
+class PropertyStore(MutableMapping):
+    def __init__(self, path: Union[str, Path] = DEFAULT_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS notices (
+                key TEXT PRIMARY KEY,
+                address TEXT,
+                district TEXT,
+                city TEXT,
+                pin_code TEXT,
+                usage_type TEXT,
+                notice_date TEXT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        for column in INDEXED_COLUMNS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS notices_{column} ON notices ({column})")
+        # Change queries (delta exports, index refreshes) look up recent writes
+        self._conn.execute("CREATE INDEX IF NOT EXISTS notices_updated_at ON notices (updated_at)")
+        self._add_summary_column()
+        # Tombstones for deleted keys, so delta exports can ship deletions
+        self._conn.execute("CREATE TABLE IF NOT EXISTS deleted_notices (key TEXT PRIMARY KEY, deleted_at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        # Keys a summaries() call leaves out, filled per call: a session can hide more
+        # keys than SQLite allows query parameters
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS excluded_keys (key TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    # Stores created before summaries were kept get the address column, filled in batches
+    def _add_summary_column(self):
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(notices)")]
+        if "address" in columns:
+            return
+        self._conn.execute("ALTER TABLE notices ADD COLUMN address TEXT")
+        last_rowid = 0
+        while True:
+            rows = self._conn.execute(
+                "SELECT rowid, payload FROM notices WHERE rowid > ? ORDER BY rowid LIMIT ?", (last_rowid, BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany(
+                "UPDATE notices SET address = ? WHERE rowid = ?",
+                [(summary_values(json.loads(payload))["address"], rowid) for rowid, payload in rows]
+            )
+            last_rowid = rows[-1][0]
+
+    def _row_values(self, key: str, record: Mapping[str, Any], now: float) -> Tuple:
+        values = indexed_values(record)
+        values["address"] = compact_address(record)
+        payload = json.dumps(record, default=json_default)
+        return (key, *[values[column] for column in _STORED_COLUMNS], payload, now, now)
+
+    _UPSERT = f"""
+        INSERT INTO notices (key, {", ".join(_STORED_COLUMNS)}, payload, created_at, updated_at)
+        VALUES (?, {", ".join("?" for _ in _STORED_COLUMNS)}, ?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET
+            {", ".join(f"{column} = excluded.{column}" for column in _STORED_COLUMNS)},
+            payload = excluded.payload,
+            updated_at = excluded.updated_at
+    """
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM notices WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    # Single-row upsert
+    def __setitem__(self, key: str, record: Mapping[str, Any]):
+        with self._lock:
+            self._conn.execute(self._UPSERT, self._row_values(key, record, time.time()))
+            self._conn.commit()
+
+    _TOMBSTONE = "INSERT OR REPLACE INTO deleted_notices (key, deleted_at) SELECT key, ? FROM notices"
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            self._conn.execute(self._TOMBSTONE + " WHERE key = ?", (time.time(), key))
+            cursor = self._conn.execute("DELETE FROM notices WHERE key = ?", (key,))
+            self._conn.commit()
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM notices WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notices").fetchone()[0]
+
+    # Keys in insertion order
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM notices ORDER BY rowid")]
+        return iter(keys)
+
+    # Stream (key, record) pairs in insertion order, BATCH_SIZE rows per query,
+    # optionally only those added or updated after a given time
+    def items(self, updated_after: Optional[float] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, key, payload FROM notices WHERE rowid > ? AND updated_at > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, updated_after or 0, BATCH_SIZE)
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, key, payload in rows:
+                yield key, json.loads(payload)
+            last_rowid = rows[-1][0]
+
+    def values(self) -> Iterator[Dict[str, Any]]:
+        return (record for key, record in self.items())
+
+    # Upsert many records in one transaction
+    def update_many(self, records: Union[Mapping[str, Any], List[Tuple[str, Any]]]):
+        pairs = records.items() if isinstance(records, Mapping) else records
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(self._UPSERT, [self._row_values(key, record, now) for key, record in pairs])
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(self._TOMBSTONE, (time.time(),))
+            self._conn.execute("DELETE FROM notices")
+            self._conn.commit()
+
+    # Replace every record with the given data in one transaction
+    def replace_all(self, data: Mapping[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(self._TOMBSTONE, (now,))
+            self._conn.execute("DELETE FROM notices")
+            self._conn.executemany(self._UPSERT, [self._row_values(key, record, now) for key, record in data.items()])
+            self._conn.commit()
+
+    @staticmethod
+    def _where(filters: Mapping[str, str], date_from: Optional[str] = None, date_to: Optional[str] = None,
+               text: str = "", exclude: bool = False) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in filters.items():
+            if column not in INDEXED_COLUMNS:
+                raise ValueError(f"Unknown column: {column}")
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if date_from:
+            clauses.append("notice_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("notice_date <= ?")
+            params.append(date_to)
+        if text:
+            clauses.append("(instr(lower(key), ?) > 0 OR instr(lower(address), ?) > 0)")
+            params.extend([text.lower(), text.lower()])
+        if exclude:
+            clauses.append("key NOT IN (SELECT key FROM temp.excluded_keys)")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    # Keys of records matching the indexed column filters, newest notices first
+    def query(self, limit: Optional[int] = None, offset: int = 0,
+              date_from: Optional[str] = None, date_to: Optional[str] = None, **filters: str) -> List[str]:
+        where, params = self._where(filters, date_from, date_to)
+        sql = "SELECT key FROM notices" + where
+        sql += " ORDER BY notice_date IS NULL, notice_date DESC, rowid"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+    # One page of record summaries, filtered and sorted in SQL without decoding payloads.
+    # Returns the rows and the total number of matching records.
+    def summaries(self, limit: int, offset: int = 0, sort_by: str = "added", descending: bool = False,
+                  text: str = "", exclude: Iterable[str] = (), **filters: str) -> Tuple[List[Dict[str, Any]], int]:
+        if sort_by not in SUMMARY_SORTS:
+            raise ValueError(f"Unknown sort: {sort_by}")
+        exclude = list(exclude)
+        where, params = self._where(filters, text=text, exclude=bool(exclude))
+        order = SUMMARY_SORTS[sort_by]
+        direction = "DESC" if descending else "ASC"
+        nulls = f"{order} IS NULL OR {order} = '', " if sort_by != "added" else ""
+        sql = (f"SELECT key, {', '.join(SUMMARY_COLUMNS)} FROM notices{where} "
+               f"ORDER BY {nulls}{order} {direction}, rowid {direction} LIMIT ? OFFSET ?")
+        with self._lock:
+            if exclude:
+                self._conn.executemany("INSERT OR IGNORE INTO temp.excluded_keys VALUES (?)", [(key,) for key in exclude])
+                self._conn.commit()
+            try:
+                total = self._conn.execute(f"SELECT COUNT(*) FROM notices{where}", params).fetchone()[0]
+                rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+            finally:
+                if exclude:
+                    self._conn.execute("DELETE FROM temp.excluded_keys")
+                    self._conn.commit()
+        return [dict(zip(["key"] + SUMMARY_COLUMNS, row)) for row in rows], total
+
+    # Delete many records in one transaction
+    def delete_many(self, keys: Iterable[str]):
+        keys = list(keys)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(self._TOMBSTONE + " WHERE key = ?", [(now, key) for key in keys])
+            self._conn.executemany("DELETE FROM notices WHERE key = ?", [(key,) for key in keys])
+            self._conn.commit()
+
+    # Changes whenever a record is added, updated or deleted
+    def fingerprint(self) -> str:
+        with self._lock:
+            count, updated, max_rowid = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(updated_at), 0), COALESCE(MAX(rowid), 0) FROM notices"
+            ).fetchone()
+        return f"{count}:{updated!r}:{max_rowid}"
+
+    def last_updated(self) -> float:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(updated_at), 0) FROM notices").fetchone()[0]
+
+    # Records added or updated after the given time
+    def changed_since(self, timestamp: float) -> List[Tuple[str, Dict[str, Any]]]:
+        return list(self.items(updated_after=timestamp))
+
+    # Keys deleted after the given time that have not been added back since
+    def deleted_since(self, timestamp: float) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM deleted_notices WHERE deleted_at > ? AND key NOT IN (SELECT key FROM notices) "
+                "ORDER BY deleted_at", (timestamp,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,24 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# The application modules live at the top level of the repository
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# A few records of the bundled sample database, as stored by the app
+@pytest.fixture(scope="session")
+def sample_records():
+    from normalize import normalize_record
+    with open(ROOT / "data" / "sample_database.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {key: normalize_record(record) for key, record in list(data.items())[:5]}
+
+@pytest.fixture
+def store(tmp_path):
+    from store import PropertyStore
+    store = PropertyStore(tmp_path / "como.sqlite3")
+    yield store
+    store.close()
@@ -0,0 +1,83 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from dedup import (DuplicateIndex, DuplicateMatch, duplicate_result, image_hash, is_duplicate, link_duplicate,
+                   text_signature)
+from models import COPIES_FIELD
+
+NOTICE_TEXT = (
+    "Public notice. Notice is hereby given that my clients intend to purchase the flat bearing "
+    "No. 12 on the third floor of Kashi Building, Andheri (East), Mumbai 400069, from Shri Ramesh "
+    "Patil. Any person having any claim by way of sale, mortgage, lease, lien or inheritance should "
+    "make the same known in writing with documents within fourteen days of this notice."
+)
+
+# A scanned-page-like image: random blocks, seeded so the same seed gives the same
+# page. noise adds scanner noise and a brightness shift, as a second scan would.
+def page_image(seed: int, size=(600, 800), quality: int = 90, noise: float = 0.0) -> bytes:
+    blocks = np.random.RandomState(seed).randint(0, 256, size=(16, 12), dtype=np.uint8)
+    pixels = np.asarray(Image.fromarray(blocks).resize(size, Image.NEAREST), dtype=np.float64)
+    if noise:
+        pixels = pixels * 0.9 + 20 + np.random.RandomState(seed + 1000).normal(0, noise, pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+@pytest.fixture
+def index(tmp_path):
+    index = DuplicateIndex(tmp_path / "dedup.sqlite3")
+    yield index
+    index.close()
+
+def test_same_image_is_an_exact_duplicate(index):
+    index.add("1.jpg", image_hash(page_image(1)))
+    match = index.find_image(image_hash(page_image(1)))
+    assert (match.key, match.match, match.similarity) == ("1.jpg", "image", 1.0)
+
+def test_rescanned_image_is_a_near_duplicate(index):
+    index.add("1.jpg", image_hash(page_image(1)))
+    index.add("2.jpg", image_hash(page_image(2)))
+    match = index.find_image(image_hash(page_image(1, size=(450, 600), quality=40, noise=40.0)))
+    assert match is not None and match.key == "1.jpg"
+    assert index.find_image(image_hash(page_image(3))) is None
+
+def test_reworded_text_is_a_near_duplicate(index):
+    index.add("1.jpg", signature=text_signature(NOTICE_TEXT))
+    index.add("2.jpg", signature=text_signature("Notice of loss of share certificate issued by Rajdoot CHS to Smt. Meena Shah."))
+    retyped = NOTICE_TEXT.replace("fourteen", "14").replace("Shri", "Mr.").upper()
+    match = index.find_text(text_signature(retyped))
+    assert match is not None and match.key == "1.jpg" and match.similarity >= 0.8
+    assert index.find_text(text_signature("Tender notice for road works in Ward K/East.")) is None
+
+def test_excluded_and_deleted_records_do_not_match(tmp_path):
+    existing = {"2.jpg"}
+    index = DuplicateIndex(tmp_path / "dedup.sqlite3", exists=existing.__contains__)
+    for key in ("1.jpg", "2.jpg"):
+        index.add(key, image_hash(page_image(1)), text_signature(NOTICE_TEXT))
+    assert index.find_image(image_hash(page_image(1))).key == "2.jpg"
+    assert index.find_image(image_hash(page_image(1)), exclude="2.jpg") is None
+    assert index.find_text(text_signature(NOTICE_TEXT), exclude="2.jpg") is None
+    index.close()
+
+def test_fingerprints_are_shared_between_processes(tmp_path):
+    writer = DuplicateIndex(tmp_path / "dedup.sqlite3")
+    reader = DuplicateIndex(tmp_path / "dedup.sqlite3")
+    assert reader.find_image(image_hash(page_image(1))) is None
+    writer.add("1.jpg", image_hash(page_image(1)))
+    assert reader.find_image(image_hash(page_image(1))).key == "1.jpg"
+    writer.close()
+    reader.close()
+
+def test_duplicate_is_linked_to_the_original():
+    store = {"1.jpg": {"address": {}}}
+    result = duplicate_result(DuplicateMatch("1.jpg", "image", 0.98437))
+    assert is_duplicate(result) and not is_duplicate({"address": {}})
+    record = link_duplicate(store, "copy.jpg", result)
+    assert record[COPIES_FIELD] == [{"key": "copy.jpg", "match": "image", "similarity": 0.984}]
+    link_duplicate(store, "copy.jpg", result)
+    assert len(store["1.jpg"][COPIES_FIELD]) == 1
+    assert link_duplicate({}, "copy.jpg", result) is None
@@ -0,0 +1,67 @@
+import copy
+import io
+import time
+
+import pytest
+
+from exporter import EXPORT_OVERLAP, export_store, write_export
+from importer import import_database
+from search_index import get_address
+from store import PropertyStore
+
+def import_file(path, target):
+    with open(path, "rb") as f:
+        return import_database(f, target.update_many, file_name=path.name, delete_keys=target.delete_many)
+
+@pytest.mark.parametrize("export_format", ["json", "ndjson", "ndjson.gz"])
+def test_export_import_round_trip(tmp_path, store, sample_records, export_format):
+    store.update_many(sample_records)
+    path = tmp_path / f"export.{export_format}"
+    export_store(store, path, export_format)
+
+    target = PropertyStore(tmp_path / "target.sqlite3")
+    report = import_file(path, target)
+    assert (report.imported, report.rejected) == (len(sample_records), 0)
+    assert dict(target.items()) == dict(store.items())
+    target.close()
+
+def test_delta_export_carries_updates_and_deletions(tmp_path, store, sample_records):
+    store.update_many(sample_records)
+    target = PropertyStore(tmp_path / "target.sqlite3")
+    version = export_store(store, tmp_path / "full.ndjson", "ndjson")
+    import_file(tmp_path / "full.ndjson", target)
+
+    deleted, updated = list(sample_records)[:2]
+    del store[deleted]
+    changed = copy.deepcopy(sample_records[updated])
+    get_address(changed)["building_name"] = "Changed Tower"
+    store[updated] = changed
+    export_store(store, tmp_path / "delta.ndjson", "ndjson", since=version)
+    report = import_file(tmp_path / "delta.ndjson", target)
+
+    assert report.deleted == 1
+    assert deleted not in target
+    assert get_address(target[updated])["building_name"] == "Changed Tower"
+    assert sorted(target) == sorted(store)
+    target.close()
+
+def test_delta_export_includes_late_commits_with_older_timestamps(tmp_path, store, sample_records, monkeypatch):
+    first, late = list(sample_records)[:2]
+    now = time.time()
+    # The exported record was stamped after the one a slower writer commits later
+    monkeypatch.setattr(time, "time", lambda: now)
+    store[first] = sample_records[first]
+    version = export_store(store, tmp_path / "delta1.ndjson", "ndjson", since=0.0)
+    monkeypatch.setattr(time, "time", lambda: now - EXPORT_OVERLAP / 2)
+    store[late] = sample_records[late]
+    monkeypatch.undo()
+
+    target = PropertyStore(tmp_path / "target.sqlite3")
+    export_store(store, tmp_path / "delta2.ndjson", "ndjson", since=version)
+    import_file(tmp_path / "delta2.ndjson", target)
+    assert late in target
+    target.close()
+
+def test_json_format_rejects_deletions():
+    with pytest.raises(ValueError):
+        write_export(io.BytesIO(), iter([]), "json", ["gone"])
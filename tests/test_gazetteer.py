@@ -0,0 +1,65 @@
+import pytest
+
+from gazetteer import Gazetteer, get_gazetteer
+from normalize import normalize_record
+
+@pytest.fixture(scope="module")
+def gazetteer() -> Gazetteer:
+    return get_gazetteer()
+
+@pytest.mark.parametrize("value, district", [
+    ("Dist-Latur", "Latur"),
+    ("Mumbai Suburban", "Mumbai City / Suburban"),
+    ("Registration District and Sub-district Mumbai City & Mumbai Suburban", "Mumbai City / Suburban"),
+    ("Chhatrapati Sambhajinagar", "Aurangabad"),
+    ("Dharashiv", "Osmanabad"),
+    ("Poona", "Pune"),
+    # Cities outside the district named inside them
+    ("Navi Mumbai", None),
+    ("New Bombay", None),
+    ("Pimpri-Chinchwad", None),
+    ("Thane/Palghar", None),
+    ("n/a", None),
+])
+def test_district_aliases(gazetteer, value, district):
+    assert gazetteer.district(value) == district
+
+@pytest.mark.parametrize("value, city", [
+    ("Pimpri Chinchwad", "Pimpri-Chinchwad"),
+    ("Pimpri-Chinchwad Municipal Corporation", "Pimpri-Chinchwad"),
+    ("New Bombay", "Navi Mumbai"),
+    ("Bombay", "Mumbai"),
+])
+def test_city_aliases(gazetteer, value, city):
+    assert gazetteer.city(value) == city
+
+def test_city_in_district_field_is_left_alone(gazetteer):
+    for value in ["Navi Mumbai", "New Bombay"]:
+        address = gazetteer.normalize_address({"district_and_or_sub_district": value, "city": value})
+        assert address["district_and_or_sub_district"] == value
+        assert address["city"] == "Navi Mumbai"
+
+def test_district_inferred_from_city(gazetteer):
+    address = gazetteer.normalize_address({"district_and_or_sub_district": "n/a", "city": "Pimpri Chinchwad"})
+    assert address == {"district_and_or_sub_district": "Pune", "city": "Pimpri-Chinchwad"}
+    # Navi Mumbai spans Thane and Raigad, so it implies no district
+    assert gazetteer.infer({"district_and_or_sub_district": "n/a", "city": "Navi Mumbai"}) == {}
+
+def test_taluka_and_district_inferred_from_village(gazetteer):
+    assert gazetteer.infer({"village": "Mouje Bhamburda", "taluka": "n/a"}) == {
+        "taluka": "Pune City", "district_and_or_sub_district": "Pune"}
+    assert gazetteer.infer({"village": "Kaular Khurd"}) == {"taluka": "Vasai", "district_and_or_sub_district": "Palghar"}
+    # A village in another district than the one given implies nothing
+    assert gazetteer.infer({"village": "Bhamburda", "district_and_or_sub_district": "Thane"}) == {}
+
+def test_ambiguous_names_infer_nothing(gazetteer):
+    # Khed is a taluka of both Pune and Ratnagiri
+    assert gazetteer.infer({"taluka": "Khed"}) == {}
+    assert gazetteer.infer({"taluka": "Khed", "pin_code": "410 505"}) == {"district_and_or_sub_district": "Pune"}
+
+def test_normalize_record_applies_gazetteer():
+    record = normalize_record({"property_details": {"address": {
+        "village": "Mouje Bhamburda", "taluka": "n/a", "district_and_or_sub_district": "N/A", "city": "Poona"}}})
+    address = record["property_details"]["address"]
+    assert (address["taluka"], address["district_and_or_sub_district"], address["city"]) == ("Pune City", "Pune", "Pune")
+    assert record["derived"]["district"] == "Pune"
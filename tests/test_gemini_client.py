@@ -0,0 +1,118 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_client import BASE_DELAY, INITIAL_CONCURRENCY, RateLimitedClient
+
+# API error as raised by google.genai: an HTTP status in .code and the response headers
+class FakeAPIError(Exception):
+    def __init__(self, code, retry_after=None):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+# Stands in for genai.Client: generate_content raises or returns the scripted
+# outcomes in order, then succeeds
+class FakeClient:
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.models = self
+
+    def generate_content(self, *, model, contents, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(text="ok", usage_metadata=SimpleNamespace(total_token_count=10))
+
+# Clock that only moves when the client sleeps, recording every sleep
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def make_client(outcomes=(), **kwargs):
+    fake, clock = FakeClient(outcomes), FakeClock()
+    client = RateLimitedClient(fake, clock=clock, sleep=clock.sleep, rng=random.Random(0), **kwargs)
+    return client, fake, clock
+
+def generate(client):
+    return client.models.generate_content(model="test-model", contents=["notice text"])
+
+def test_retries_throttled_calls_and_halves_concurrency():
+    client, fake, clock = make_client([FakeAPIError(429), FakeAPIError(429)])
+    assert generate(client).text == "ok"
+    assert fake.calls == 3
+    stats = client.stats()
+    assert (stats["calls"], stats["succeeded"], stats["failed"]) == (1, 1, 0)
+    assert (stats["retries"], stats["throttled"], stats["server_errors"]) == (2, 2, 0)
+    # Halved twice from the initial limit, then one additive step for the success
+    assert client.concurrency.limit == pytest.approx(INITIAL_CONCURRENCY / 4 + 1)
+    # Full-jitter backoff stays within BASE_DELAY * 2^attempt
+    assert len(clock.sleeps) == 2
+    assert all(delay <= BASE_DELAY * 2 ** attempt for attempt, delay in enumerate(clock.sleeps))
+
+def test_retries_server_errors_without_reducing_concurrency():
+    client, fake, _ = make_client([FakeAPIError(503), FakeAPIError(500), FakeAPIError(502)])
+    generate(client)
+    stats = client.stats()
+    assert fake.calls == 4
+    assert (stats["retries"], stats["server_errors"], stats["throttled"]) == (3, 3, 0)
+    assert client.concurrency.limit > INITIAL_CONCURRENCY
+
+def test_waits_at_least_retry_after():
+    client, _, clock = make_client([FakeAPIError(429, retry_after=30), FakeAPIError(503, retry_after=7)])
+    generate(client)
+    assert clock.sleeps == [30.0, 7.0]
+
+@pytest.mark.parametrize("error", [FakeAPIError(400), FakeAPIError(403), FakeAPIError(404), ValueError("bad request")])
+def test_raises_non_retryable_errors_immediately(error):
+    client, fake, clock = make_client([error])
+    with pytest.raises(type(error)):
+        generate(client)
+    stats = client.stats()
+    assert fake.calls == 1
+    assert clock.sleeps == []
+    assert (stats["failed"], stats["retries"], stats["throttled"], stats["server_errors"]) == (1, 0, 0, 0)
+    assert client.concurrency.in_flight == 0
+
+def test_gives_up_after_max_retries():
+    client, fake, clock = make_client([FakeAPIError(503)] * 10, max_retries=2)
+    with pytest.raises(FakeAPIError):
+        generate(client)
+    stats = client.stats()
+    assert fake.calls == 3
+    assert len(clock.sleeps) == 2
+    assert (stats["retries"], stats["failed"], stats["succeeded"]) == (2, 1, 0)
+
+def test_concurrency_recovers_after_throttling():
+    client, _, _ = make_client([FakeAPIError(429)] * 3, requests_per_minute=1000, max_concurrency=6)
+    generate(client)
+    # Halved to the floor of 1, then one additive step for the success
+    assert client.concurrency.limit == pytest.approx(2.0)
+    for _ in range(30):
+        generate(client)
+    # Grows back past the initial limit, but never beyond the maximum
+    assert client.concurrency.limit > INITIAL_CONCURRENCY
+    for _ in range(100):
+        generate(client)
+    assert client.concurrency.limit == 6
+
+def test_request_limit_delays_calls_beyond_the_quota():
+    client, fake, clock = make_client(requests_per_minute=2)
+    for _ in range(3):
+        generate(client)
+    assert fake.calls == 3
+    # The third request waits for the bucket to refill: half a minute at 2 per minute
+    assert client.stats()["wait_seconds"] == pytest.approx(30.0)
+    assert sum(clock.sleeps) == pytest.approx(30.0)
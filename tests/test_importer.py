@@ -0,0 +1,49 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from importer import DatabaseImportError, JsonObjectReader, import_database
+
+def run_import(data: bytes, file_name: str = "", **kwargs):
+    written, deleted = {}, []
+    report = import_database(io.BytesIO(data), lambda batch: written.update(batch), file_name=file_name,
+                             delete_keys=deleted.extend, **kwargs)
+    return report, written, deleted
+
+def ndjson(*entries) -> bytes:
+    return "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+
+def test_json_object_is_read_across_chunk_boundaries():
+    document = {"a.jpg": {"text": "braces { } and \"quotes\", मुंबई"}, "b.jpg": [1, 23456, None], "c.jpg": 12.5}
+    data = json.dumps(document, ensure_ascii=False).encode("utf-8")
+    for chunk_size in (1, 3, 7, len(data)):
+        assert dict(JsonObjectReader(io.BytesIO(data), chunk_size=chunk_size)) == document
+
+@pytest.mark.parametrize("data", [b"[1, 2]", b'{"a.jpg": {}', b'{"a.jpg": {} "b.jpg": {}}', b"{1: {}}"])
+def test_malformed_json_document_is_rejected(data):
+    with pytest.raises(DatabaseImportError):
+        run_import(data)
+
+def test_invalid_records_are_reported_and_skipped(sample_records):
+    good = dict(list(sample_records.items())[:2])
+    data = json.dumps({**good, "bad.jpg": {"address": "not an address"}, "worse.jpg": 7}).encode("utf-8")
+    report, written, deleted = run_import(data, batch_size=1)
+    assert set(written) == set(good)
+    assert (report.imported, report.rejected) == (2, 2)
+    assert [key for key, message in report.errors] == ["bad.jpg", "worse.jpg"]
+
+def test_ndjson_tombstones_delete_records(sample_records):
+    key, record = next(iter(sample_records.items()))
+    data = ndjson({"key": key, "record": record}, {"key": "gone.jpg", "deleted": True}, {"record": {}}, {"key": 5})
+    report, written, deleted = run_import(gzip.compress(data), "delta.ndjson.gz")
+    assert list(written) == [key] and deleted == ["gone.jpg"]
+    assert (report.imported, report.deleted, report.rejected) == (1, 1, 2)
+    assert [key for key, message in report.errors] == ["line 3", "line 4"]
+
+def test_tombstones_are_ignored_without_delete_keys():
+    written = {}
+    report = import_database(io.BytesIO(ndjson({"key": "gone.jpg", "deleted": True})), written.update,
+                             file_name="delta.ndjson")
+    assert (report.imported, report.deleted, written) == (0, 0, {})
@@ -0,0 +1,84 @@
+import pytest
+
+import jobs
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, api_key_id
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+    yield queue
+    queue.close()
+
+def statuses(queue, batch):
+    return [job["status"] for job in queue.jobs(batch)]
+
+def test_jobs_are_claimed_once_in_order(queue):
+    batch = queue.new_batch_id()
+    ids = queue.enqueue(batch, [("1.jpg", b"one"), ("2.jpg", b"two")], {"model": "m"})
+    first = queue.claim("w1")
+    second = queue.claim("w2")
+    assert (first.id, first.name, first.image, first.options, first.attempts) == (ids[0], "1.jpg", b"one", {"model": "m"}, 1)
+    assert second.id == ids[1]
+    assert queue.claim("w3") is None
+    assert statuses(queue, batch) == [RUNNING, RUNNING]
+
+def test_results_are_collected_incrementally(queue):
+    batch = queue.new_batch_id()
+    ids = queue.enqueue(batch, [("1.jpg", b"one"), ("2.jpg", b"two")])
+    queue.complete(queue.claim("w").id, {"n": 1})
+    done = [job for job in queue.jobs(batch) if job["status"] == DONE]
+    assert [job["id"] for job in done] == ids[:1] and done[0]["result"] is None
+    assert queue.results([ids[0]]) == {ids[0]: {"n": 1}}
+
+    queue.complete(queue.claim("w").id, {"n": 2})
+    assert [job["id"] for job in queue.jobs(batch, after_id=ids[0])] == ids[1:]
+    assert queue.results(ids) == {ids[0]: {"n": 1}, ids[1]: {"n": 2}}
+
+def test_expired_lease_is_reclaimed(queue):
+    batch = queue.new_batch_id()
+    [job_id] = queue.enqueue(batch, [("1.jpg", b"one")])
+    assert queue.claim("crashed", lease_seconds=-1).id == job_id
+    job = queue.claim("w2")
+    assert (job.id, job.attempts) == (job_id, 2)
+    assert queue.claim("w3") is None
+
+def test_expired_lease_out_of_attempts_fails(queue):
+    batch = queue.new_batch_id()
+    queue.enqueue(batch, [("1.jpg", b"one")], max_attempts=1)
+    queue.claim("crashed", lease_seconds=-1)
+    assert queue.claim("w2") is None
+    assert statuses(queue, batch) == [FAILED]
+
+def test_failed_job_is_retried_until_out_of_attempts(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "RETRY_DELAY", 0.0)
+    batch = queue.new_batch_id()
+    [job_id] = queue.enqueue(batch, [("1.jpg", b"one")], max_attempts=2)
+    assert queue.fail(queue.claim("w").id, "rate limited") == QUEUED
+    assert queue.fail(queue.claim("w").id, "rate limited") == FAILED
+    assert queue.claim("w") is None
+    assert queue.counts(batch)[FAILED] == 1
+
+    assert queue.retry_failed(batch) == 1
+    assert queue.claim("w").attempts == 1
+
+def test_failed_job_waits_before_retry(queue):
+    batch = queue.new_batch_id()
+    queue.enqueue(batch, [("1.jpg", b"one")])
+    queue.fail(queue.claim("w").id, "timeout")
+    assert queue.claim("w") is None
+    assert statuses(queue, batch) == [QUEUED]
+
+def test_workers_only_claim_jobs_of_their_key(queue):
+    batch = queue.new_batch_id()
+    key_a, key_b = api_key_id("key-a"), api_key_id("key-b")
+    [a_job] = queue.enqueue(batch, [("a.jpg", b"a")], key_id=key_a)
+    [any_job] = queue.enqueue(batch, [("any.jpg", b"any")])
+    assert queue.claim("wb", key_id=key_b).id == any_job
+    assert queue.claim("wb", key_id=key_b) is None
+    assert queue.claim("wa", key_id=key_a).id == a_job
+
+    queue.heartbeat("wa", key_id=key_a)
+    assert queue.live_workers(key_id=key_a) == ["wa"]
+    assert queue.live_workers(key_id=key_b) == []
+    queue.remove_worker("wa")
+    assert queue.live_workers() == []
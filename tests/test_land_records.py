@@ -0,0 +1,34 @@
+import pytest
+
+from land_records import LandParcel, ParcelIndex, parse_land_identifiers
+
+@pytest.mark.parametrize("text, expected", [
+    ("112", [LandParcel("survey", "112")]),
+    ("S. No. 112, H. No. 1,2", [LandParcel("survey", "112", "", ("1", "2"))]),
+    ("CTS 459/89B", [LandParcel("city_survey", "459", "89B")]),
+    ("Survey No. 533/107 to 109", [LandParcel("survey", "533", str(n)) for n in range(107, 110)]),
+    ("Gat No. 45, Plot No. 4", [LandParcel("gat", "45"), LandParcel("plot", "4")]),
+])
+def test_parse_land_identifiers(text, expected):
+    assert parse_land_identifiers(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    # A bare number is only a survey number when nothing in the text names a scheme
+    ("Flat 5 on S.No.12", [LandParcel("survey", "12")]),
+    ("Building 7, CTS 459", [LandParcel("city_survey", "459")]),
+    # Flat / shop numbers are never land identifiers
+    ("S.No. 12, Flat 5", [LandParcel("survey", "12")]),
+    ("12, Shop No. 3", [LandParcel("survey", "12")]),
+    ("Flat No. 5", []),
+])
+def test_numbers_outside_land_identifiers_are_ignored(text, expected):
+    assert parse_land_identifiers(text) == expected
+
+def test_bare_number_uses_field_scheme():
+    assert parse_land_identifiers("45", "gat") == [LandParcel("gat", "45")]
+
+def test_parcel_index_search(sample_records):
+    index = ParcelIndex.build(sample_records)
+    assert index.search("CTS 459/89B Pune") == ["1.jpg"]
+    assert index.search("CTS 459/89B Nagpur") == []
+    assert index.search("Flat 5 Andheri") == []
@@ -0,0 +1,35 @@
+import threading
+
+from overlay import OverlayDatabase, OverlayIndex
+from search_index import AddressIndex
+from trigram_index import TrigramIndex
+
+def overlay_index(index_type, base, additions):
+    view = OverlayDatabase(base)
+    view.update(additions)
+    local = index_type.build(dict(additions))
+    return OverlayIndex(index_type.build(base), local, view, threading.RLock())
+
+def test_overlay_view_hides_deleted_and_replaced_records(sample_records):
+    view = OverlayDatabase(sample_records)
+    first, second = list(sample_records)[:2]
+    del view[first]
+    view["new.jpg"] = sample_records[second]
+    assert first not in view and "new.jpg" in view
+    assert len(view) == len(sample_records)
+    view.revert()
+    assert list(view) == list(sample_records)
+
+def test_local_bm25_scores_are_comparable_with_base(sample_records):
+    # The same record scores lower in a one-record local index than in the base
+    # (its terms are less rare there), so raw scores would rank the copy below it
+    index = overlay_index(AddressIndex, sample_records, {"copy.jpg": sample_records["4.jpg"]})
+    results = dict(index.search("Kashi Building Andheri", top_n=3))
+    assert results["copy.jpg"] == results["4.jpg"] == 1.0
+
+def test_absolute_scores_are_merged_unchanged(sample_records):
+    index = overlay_index(TrigramIndex, sample_records, {"copy.jpg": sample_records["2.jpg"]})
+    base = TrigramIndex.build(sample_records).search("Firdaus Apartment")
+    merged = index.search("Firdaus Apartment")
+    assert [result for result in merged if result[0] == "2.jpg"] == [result for result in base if result[0] == "2.jpg"]
+    assert {result[0] for result in merged} >= {"2.jpg", "copy.jpg"}
@@ -0,0 +1,43 @@
+import pytest
+
+from search_index import AddressIndex
+from snapshot import Snapshot, SnapshotError, build_indexes, load_store_indexes, save_store_snapshot
+
+INDEX_TYPES = {"search_index": AddressIndex}
+
+def test_snapshot_round_trip(tmp_path, store, sample_records):
+    store.update_many(sample_records)
+    path = tmp_path / "como.snapshot"
+    save_store_snapshot(store, build_indexes(store, INDEX_TYPES), path)
+
+    with Snapshot(path) as snapshot:
+        assert snapshot.keys() == list(store)
+        assert list(snapshot.index_names()) == ["search_index"]
+        assert len(snapshot.load_index("search_index")) == len(sample_records)
+
+def test_stale_snapshot_is_caught_up(tmp_path, store, sample_records):
+    keys = list(sample_records)
+    store.update_many({key: sample_records[key] for key in keys[:3]})
+    path = tmp_path / "como.snapshot"
+    save_store_snapshot(store, build_indexes(store, INDEX_TYPES), path)
+
+    del store[keys[0]]
+    store.update_many({key: sample_records[key] for key in keys[3:]})
+    index = load_store_indexes(store, INDEX_TYPES, path)["search_index"]
+    assert keys[0] not in index
+    assert all(key in index for key in keys[1:])
+
+def test_corrupt_snapshot_is_rebuilt(tmp_path, store, sample_records):
+    store.update_many(sample_records)
+    path = tmp_path / "como.snapshot"
+    save_store_snapshot(store, build_indexes(store, INDEX_TYPES), path)
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with Snapshot(path) as snapshot, pytest.raises(SnapshotError):
+        snapshot.load_index("search_index")
+    index = load_store_indexes(store, INDEX_TYPES, path)["search_index"]
+    assert len(index) == len(sample_records)
+    with Snapshot(path) as snapshot:
+        assert len(snapshot.load_index("search_index")) == len(sample_records)
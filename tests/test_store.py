@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+# Most query parameters this SQLite build accepts (32766 by default, larger in some builds)
+def variable_limit():
+    conn = sqlite3.connect(":memory:")
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) if hasattr(conn, "getlimit") else 32766
+    conn.close()
+    return limit
+
+def fill(store, sample_records, copies):
+    records = {f"{n:03d}-{key}": record for n in range(copies) for key, record in sample_records.items()}
+    store.update_many(records)
+    return list(records)
+
+def test_summaries_pages_through_all_records(store, sample_records):
+    keys = fill(store, sample_records, 4)
+    pages = [store.summaries(limit=6, offset=offset) for offset in range(0, len(keys), 6)]
+    assert all(total == len(keys) for rows, total in pages)
+    assert [row["key"] for rows, total in pages for row in rows] == keys
+
+    rows, total = store.summaries(limit=3, sort_by="added", descending=True)
+    assert [row["key"] for row in rows] == keys[::-1][:3]
+
+def test_summaries_filters_and_text(store, sample_records):
+    keys = fill(store, sample_records, 2)
+    mumbai = [key for key in keys if store.summaries(1, text=key)[0][0]["city"] == "Mumbai"]
+    rows, total = store.summaries(limit=100, city="Mumbai")
+    assert [row["key"] for row in rows] == mumbai and total == len(mumbai)
+    rows, total = store.summaries(limit=100, text="KASHI")
+    assert total == 2 and all("Kashi" in row["address"] for row in rows)
+    with pytest.raises(ValueError):
+        store.summaries(limit=10, sort_by="payload")
+
+def test_summaries_excludes_more_keys_than_sqlite_parameters(store, sample_records):
+    keys = fill(store, sample_records, 2)
+    hidden = set(keys[::2])
+    exclude = hidden | {f"missing-{n}" for n in range(variable_limit())}
+    rows, total = store.summaries(limit=100, exclude=exclude)
+    assert [row["key"] for row in rows] == [key for key in keys if key not in hidden]
+    assert total == len(keys) - len(hidden)
+    # Exclusions don't carry over to the next call
+    assert store.summaries(limit=100)[1] == len(keys)
+
+def test_query_filters_by_indexed_columns(store, sample_records):
+    store.update_many(sample_records)
+    assert set(store.query(city="Mumbai")) == {"2.jpg", "3.jpg", "4.jpg"}
+    assert len(store.query(limit=2)) == 2
+    with pytest.raises(ValueError):
+        store.query(address="Kashi")
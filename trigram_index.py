@@ -0,0 +1,168 @@
+import re
+from typing import Any, Dict, List, Mapping, Set, Tuple
+
+from search_index import field_text, get_address
+
+# Name fields that OCR and translation spell in many different ways
+NAME_FIELDS = [
+    "building_name",
+    "society_or_complex_name",
+    "locality_or_area_or_neighbourhood",
+    "sub_locality_or_city_divsion",
+    "village",
+]
+
+# Legal / directional abbreviations expanded before comparison
+ABBREVIATIONS = {
+    "chs": "cooperative housing society",
+    "chsl": "cooperative housing society limited",
+    "coop": "cooperative",
+    "hsg": "housing",
+    "hsng": "housing",
+    "soc": "society",
+    "ltd": "limited",
+    "pvt": "private",
+    "bldg": "building",
+    "apt": "apartment",
+    "apts": "apartments",
+    "vlg": "village",
+    "vil": "village",
+    "w": "west",
+    "e": "east",
+    "n": "north",
+    "s": "south",
+    "pashchim": "west",
+    "purva": "east",
+}
+
+# Words that appear in so many names that they only add noise to similarity
+GENERIC_WORDS = {
+    "cooperative", "housing", "society", "limited", "private", "premises",
+    "village", "mouje", "mauje", "mouza", "mauza", "the", "of", "and",
+}
+
+# Romanisation variants of the same Marathi sounds, folded to one spelling
+TRANSLITERATIONS = [
+    (re.compile(r"aa"), "a"),
+    (re.compile(r"ee"), "i"),
+    (re.compile(r"oo"), "u"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"(?<=[bdgjkt])h"), ""),
+    (re.compile(r"([a-z])\1"), r"\1"),
+]
+
+# Candidates scoring below this similarity are not returned
+MIN_SIMILARITY = 0.3
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+_QUERY_SPLIT_RE = re.compile(r"[,;\n]")
+
+# Normalise a name: expand abbreviations, drop generic words and fold transliteration variants
+def normalize_name(value: str) -> str:
+    value = value.lower().replace("co-op", "coop").replace("co op", "coop").replace("co-operative", "cooperative")
+    words = []
+    for word in _NON_ALNUM_RE.split(value):
+        if not word:
+            continue
+        for expanded in ABBREVIATIONS.get(word, word).split():
+            if expanded in GENERIC_WORDS:
+                continue
+            for pattern, replacement in TRANSLITERATIONS:
+                expanded = pattern.sub(replacement, expanded)
+            words.append(expanded)
+    return " ".join(words)
+
+# Padded character trigrams of each word, as in PostgreSQL's pg_trgm
+def trigrams(normalized: str) -> Set[str]:
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+# Character-trigram index over building / society / locality / village names.
+# Each distinct normalised name is indexed once and shared by every record using it.
+class TrigramIndex:
+    def __init__(self, fields: List[str] = NAME_FIELDS):
+        self.fields = fields
+        self.gram_postings: Dict[str, Set[str]] = {}
+        self.name_grams: Dict[str, int] = {}
+        self.name_records: Dict[str, Set[Tuple[str, str]]] = {}
+        self.doc_names: Dict[str, List[Tuple[str, str]]] = {}
+
+    @classmethod
+    def build(cls, data: Mapping[str, Any]) -> "TrigramIndex":
+        index = cls()
+        for key, record in data.items():
+            index.add(key, record)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_names)
+
+    def add(self, key: str, record: Mapping[str, Any]):
+        if key in self.doc_names:
+            self.remove(key)
+        address = get_address(record) or {}
+        names = []
+        for field in self.fields:
+            name = normalize_name(field_text(address.get(field)))
+            if not name:
+                continue
+            names.append((field, name))
+            if name not in self.name_records:
+                grams = trigrams(name)
+                self.name_grams[name] = len(grams)
+                self.name_records[name] = set()
+                for gram in grams:
+                    self.gram_postings.setdefault(gram, set()).add(name)
+            self.name_records[name].add((key, field))
+        self.doc_names[key] = names
+
+    def remove(self, key: str):
+        for field, name in self.doc_names.pop(key, []):
+            records = self.name_records.get(name)
+            if records is None:
+                continue
+            records.discard((key, field))
+            if records:
+                continue
+            del self.name_records[name]
+            del self.name_grams[name]
+            for gram in trigrams(name):
+                postings = self.gram_postings.get(gram)
+                if postings is not None:
+                    postings.discard(name)
+                    if not postings:
+                        del self.gram_postings[gram]
+
+    # Jaccard similarity of the query trigrams against every name sharing a trigram
+    def _similar_names(self, query_grams: Set[str], min_similarity: float) -> Dict[str, float]:
+        shared: Dict[str, int] = {}
+        for gram in query_grams:
+            for name in self.gram_postings.get(gram, ()):
+                shared[name] = shared.get(name, 0) + 1
+
+        similar = {}
+        for name, count in shared.items():
+            similarity = count / (len(query_grams) + self.name_grams[name] - count)
+            if similarity >= min_similarity:
+                similar[name] = similarity
+        return similar
+
+    # Similarity-ranked (key, field, similarity) candidates, one per record, best first.
+    # Comma separated parts of an address query are matched separately.
+    def search(self, query: str, top_n: int = 10, min_similarity: float = MIN_SIMILARITY) -> List[Tuple[str, str, float]]:
+        best: Dict[str, Tuple[str, float]] = {}
+        for part in _QUERY_SPLIT_RE.split(query):
+            query_grams = trigrams(normalize_name(part))
+            if not query_grams:
+                continue
+            for name, similarity in self._similar_names(query_grams, min_similarity).items():
+                for key, field in self.name_records[name]:
+                    if key not in best or similarity > best[key][1]:
+                        best[key] = (field, similarity)
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1][1], item[0]))
+        return [(key, field, round(similarity, 4)) for key, (field, similarity) in ranked[:top_n]]
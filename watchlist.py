@@ -0,0 +1,275 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple, Union
+
+from entity_resolution import (
+    BlockKey, PropertyFeatures, areas_conflict, blocking_keys, name_similarity, record_features, shares_parcel, units_conflict
+)
+from search_index import ADDRESS_FIELD_ORDER, field_text
+from store import DEFAULT_DB_PATH
+
+DEFAULT_WATCHLIST_PATH = DEFAULT_DB_PATH.with_name("watchlist.sqlite3")
+
+# Notices scoring below this against a watched property raise no alert
+ALERT_THRESHOLD = 0.6
+
+# Score factor when only one of the watched property and the notice names a unit,
+# e.g. a notice about the whole building or plot a watched flat is in
+PARTIAL_UNIT_FACTOR = 0.8
+
+# Alert states
+NEW = "new"
+REVIEWED = "reviewed"
+ALERT_STATES = [NEW, REVIEWED]
+
+# A client property being monitored; address holds Address fields
+class WatchedProperty(NamedTuple):
+    id: int
+    client: str
+    label: str
+    address: Dict[str, str]
+    created_at: float
+
+# A notice that matched a watched property
+class Alert(NamedTuple):
+    id: int
+    watch_id: int
+    client: str
+    label: str
+    notice_key: str
+    score: float
+    # Why the notice matched: "parcel", "name" and / or "unit"
+    reasons: List[str]
+    status: str
+    created_at: float
+
+# A watched property's address in the shape of a notice record, so it goes through
+# the same feature extraction as the notices it is matched against
+def watch_record(address: Mapping[str, Any]) -> Dict[str, Any]:
+    return {"property_details": {"address": {field: field_text(address.get(field)) or "n/a" for field in ADDRESS_FIELD_ORDER}}}
+
+# How well a notice matches a watched property, with the reasons. A shared land
+# parcel is a certain match and names score by similarity; differing PINs, districts
+# or unit numbers rule a match out.
+def watch_score(watch: PropertyFeatures, notice: PropertyFeatures) -> Tuple[float, List[str]]:
+    if areas_conflict(watch, notice) or units_conflict(watch, notice):
+        return 0.0, []
+    reasons = []
+    score = 0.0
+    if shares_parcel(watch, notice):
+        score = 1.0
+        reasons.append("parcel")
+    similarity = name_similarity(watch, notice)
+    if similarity >= ALERT_THRESHOLD:
+        score = max(score, similarity)
+        reasons.append("name")
+    # units_conflict already ruled out differing numbers for a unit kind named by both
+    if set(dict(watch.units)) & set(dict(notice.units)):
+        reasons.append("unit")
+    elif watch.units or notice.units:
+        score *= PARTIAL_UNIT_FACTOR
+    return score, reasons
+
+# Reverse search index: watched properties keyed by their blocking keys, so a new
+# notice is only scored against the watches sharing one of its keys. Matching costs
+# the number of new notices times a handful of candidates, not watchlist x database.
+class WatchIndex:
+    def __init__(self):
+        self.blocks: Dict[BlockKey, Set[int]] = {}
+        self.features: Dict[int, PropertyFeatures] = {}
+
+    @classmethod
+    def build(cls, watches: Iterable[WatchedProperty]) -> "WatchIndex":
+        index = cls()
+        for watch in watches:
+            index.add(watch.id, watch.address)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def add(self, watch_id: int, address: Mapping[str, Any]):
+        features = record_features(watch_record(address))
+        self.features[watch_id] = features
+        for block in blocking_keys(features, unqualified=True):
+            self.blocks.setdefault(block, set()).add(watch_id)
+
+    def remove(self, watch_id: int):
+        features = self.features.pop(watch_id, None)
+        if features is None:
+            return
+        for block in blocking_keys(features, unqualified=True):
+            members = self.blocks.get(block)
+            if members is not None:
+                members.discard(watch_id)
+                if not members:
+                    del self.blocks[block]
+
+    # (watch id, score, reasons) for every watch the notice matches, best first
+    def match(self, record: Mapping[str, Any], threshold: float = ALERT_THRESHOLD) -> List[Tuple[int, float, List[str]]]:
+        features = record_features(record)
+        candidates: Set[int] = set()
+        for block in blocking_keys(features, unqualified=True):
+            candidates |= self.blocks.get(block, set())
+        matches = []
+        for watch_id in candidates:
+            score, reasons = watch_score(self.features[watch_id], features)
+            if score >= threshold:
+                matches.append((watch_id, round(score, 4), reasons))
+        return sorted(matches, key=lambda match: (-match[1], match[0]))
+
+# Watched client properties and the alerts raised for them, in SQLite so the app,
+# background workers and ingest runs share them. Each process matches new notices
+# with its own WatchIndex, rebuilt when another process changes the watchlist.
+class Watchlist:
+    def __init__(self, path: Union[str, Path] = DEFAULT_WATCHLIST_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS watched (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                client TEXT NOT NULL,
+                label TEXT NOT NULL,
+                address TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                watch_id INTEGER NOT NULL,
+                notice_key TEXT NOT NULL,
+                score REAL NOT NULL,
+                reasons TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (watch_id, notice_key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS alerts_status ON alerts (status, created_at)")
+        # Bumped on every change to the watched properties, so other processes know to rebuild
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('version', '0')")
+        self._conn.commit()
+        self._version: Optional[str] = None
+        self.index = WatchIndex()
+
+    def _stored_version(self) -> str:
+        return self._conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+
+    def _sync(self):
+        version = self._stored_version()
+        if version != self._version:
+            self.index = WatchIndex.build(self._watched())
+            self._version = version
+
+    # Bump the version after a change made through this instance. The index was
+    # updated in place, so it stays current unless another process changed it too.
+    def _bump_version(self, previous: str):
+        version = str(int(previous) + 1)
+        self._conn.execute("UPDATE meta SET value = ? WHERE name = 'version'", (version,))
+        if previous == self._version:
+            self._version = version
+
+    def _watched(self, client: Optional[str] = None) -> List[WatchedProperty]:
+        query = "SELECT id, client, label, address, created_at FROM watched" + (" WHERE client = ?" if client else "") + " ORDER BY id"
+        rows = self._conn.execute(query, (client,) if client else ()).fetchall()
+        return [WatchedProperty(row[0], row[1], row[2], json.loads(row[3]), row[4]) for row in rows]
+
+    # Register client properties, as (client, label, address) tuples. Returns their ids.
+    def add_many(self, properties: Iterable[Tuple[str, str, Mapping[str, Any]]]) -> List[int]:
+        now = time.time()
+        ids = []
+        with self._lock:
+            previous = self._stored_version()
+            for client, label, address in properties:
+                address = {field: field_text(address.get(field)) for field in ADDRESS_FIELD_ORDER if field_text(address.get(field))}
+                cursor = self._conn.execute("INSERT INTO watched (client, label, address, created_at) VALUES (?, ?, ?, ?)",
+                                            (client, label, json.dumps(address, ensure_ascii=False), now))
+                ids.append(cursor.lastrowid)
+                self.index.add(cursor.lastrowid, address)
+            self._bump_version(previous)
+            self._conn.commit()
+        return ids
+
+    def add(self, client: str, label: str, address: Mapping[str, Any]) -> int:
+        return self.add_many([(client, label, address)])[0]
+
+    # Stop watching properties; their alerts are deleted with them
+    def remove(self, watch_ids: Iterable[int]):
+        watch_ids = list(watch_ids)
+        with self._lock:
+            previous = self._stored_version()
+            for watch_id in watch_ids:
+                self._conn.execute("DELETE FROM watched WHERE id = ?", (watch_id,))
+                self._conn.execute("DELETE FROM alerts WHERE watch_id = ?", (watch_id,))
+                self.index.remove(watch_id)
+            self._bump_version(previous)
+            self._conn.commit()
+
+    def watched(self, client: Optional[str] = None) -> List[WatchedProperty]:
+        with self._lock:
+            return self._watched(client)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM watched").fetchone()[0]
+
+    # Match newly written notices against the watchlist and record an alert for each
+    # match. A notice that is processed again updates its alerts' scores but keeps
+    # their status. Returns the number of matches.
+    def check_many(self, records: Iterable[Tuple[str, Mapping[str, Any]]]) -> int:
+        now = time.time()
+        matched = 0
+        with self._lock:
+            self._sync()
+            if not len(self.index):
+                return 0
+            for key, record in records:
+                for watch_id, score, reasons in self.index.match(record):
+                    self._conn.execute(
+                        "INSERT INTO alerts (watch_id, notice_key, score, reasons, status, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(watch_id, notice_key) DO UPDATE SET "
+                        "score = excluded.score, reasons = excluded.reasons, updated_at = excluded.updated_at",
+                        (watch_id, key, score, json.dumps(reasons), NEW, now, now)
+                    )
+                    matched += 1
+            self._conn.commit()
+        return matched
+
+    def check(self, key: str, record: Mapping[str, Any]) -> int:
+        return self.check_many([(key, record)])
+
+    # Alerts, newest first, optionally only those in one state
+    def alerts(self, status: Optional[str] = None, limit: int = 200, offset: int = 0) -> List[Alert]:
+        query = ("SELECT alerts.id, watch_id, client, label, notice_key, score, reasons, status, alerts.created_at "
+                 "FROM alerts JOIN watched ON watched.id = alerts.watch_id" + (" WHERE status = ?" if status else "") +
+                 " ORDER BY alerts.created_at DESC, alerts.id DESC LIMIT ? OFFSET ?")
+        params = (status, limit, offset) if status else (limit, offset)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [Alert(row[0], row[1], row[2], row[3], row[4], row[5], json.loads(row[6]), row[7], row[8]) for row in rows]
+
+    def alert_counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM alerts GROUP BY status").fetchall()
+        counts = {state: 0 for state in ALERT_STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def set_status(self, alert_ids: Iterable[int], status: str):
+        with self._lock:
+            self._conn.executemany("UPDATE alerts SET status = ?, updated_at = ? WHERE id = ?",
+                                   [(status, time.time(), alert_id) for alert_id in alert_ids])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
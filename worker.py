@@ -0,0 +1,163 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from dedup import DEFAULT_DEDUP_PATH, DUPLICATE_OF_FIELD, DuplicateIndex, is_duplicate, keep_copies, link_duplicate
+from jobs import DEFAULT_JOBS_PATH, JobQueue, api_key_id
+from normalize import normalize_record
+from pipeline import DEFAULT_MODEL_ID, DEFAULT_PIPELINE_MODE, process_notice
+from preprocess import ImagePreprocessor, PreprocessOptions
+from result_cache import ResultCache
+from store import DEFAULT_DB_PATH, PropertyStore
+from watchlist import DEFAULT_WATCHLIST_PATH, Watchlist
+
+# Seconds between queue polls when there is nothing to do
+POLL_INTERVAL = 2.0
+
+# Notices one worker process keeps in flight (one thread each)
+DEFAULT_THREADS = 4
+
+# Job options understood by the worker, as enqueued by the Upload tab:
+#   model_id, mode, use_cache, preprocess (PreprocessOptions fields, or None to send images as they are),
+#   dedup (link copies of notices already in the database instead of extracting them again)
+def job_preprocessor(options: Dict[str, Any], executor: ProcessPoolExecutor) -> Optional[ImagePreprocessor]:
+    settings = options.get("preprocess")
+    if settings is None:
+        return None
+    return ImagePreprocessor(PreprocessOptions(**settings), executor=executor)
+
+# Claims and processes jobs until stop is set. Each finished notice is written to
+# the store before its job is marked done, so a crash never loses a paid-for result
+# without the job being retried. A notice found to copy an existing record is linked
+# to it (dedup.link_duplicate) rather than stored, and the job's result says so.
+# New notices are matched against the watchlist, if given, once they are stored.
+# key_id (jobs.api_key_id of the client's key) limits the worker to the jobs queued
+# under that key, so every session's notices are processed on its own quota.
+class Worker:
+    def __init__(self, queue: JobQueue, store: PropertyStore, client: Any, cache: Optional[ResultCache] = None,
+                 executor: Optional[ProcessPoolExecutor] = None, worker_id: Optional[str] = None,
+                 log: Callable[[str], None] = print, dedup: Optional[DuplicateIndex] = None,
+                 watchlist: Optional[Watchlist] = None, key_id: Optional[str] = None):
+        self.queue = queue
+        self.store = store
+        self.client = client
+        self.cache = cache
+        self.executor = executor
+        self.dedup = dedup
+        self.watchlist = watchlist
+        self.key_id = key_id
+        self.id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.log = log
+        self.stop = threading.Event()
+        self._lock = threading.Lock()
+        self.jobs_done = 0
+
+    # Process one job if one is ready. Returns False if the queue had nothing to run.
+    def run_once(self, thread_id: str) -> bool:
+        job = self.queue.claim(thread_id, key_id=self.key_id)
+        if job is None:
+            return False
+        options = job.options
+        try:
+            result = process_notice(self.client, options.get("model_id", DEFAULT_MODEL_ID), job.image,
+                                    self.cache if options.get("use_cache", True) else None,
+                                    job_preprocessor(options, self.executor) if self.executor else None,
+                                    options.get("mode", DEFAULT_PIPELINE_MODE),
+                                    self.dedup if options.get("dedup", True) else None, job.name)
+            if is_duplicate(result):
+                record = result
+                link_duplicate(self.store, job.name, result)
+            else:
+                record = keep_copies(self.store, job.name, normalize_record(result))
+                self.store[job.name] = record
+                if self.watchlist is not None:
+                    self.watchlist.check(job.name, record)
+        except Exception as e:
+            status = self.queue.fail(job.id, str(e))
+            self.log(f"{job.name}: attempt {job.attempts} failed ({status}): {e}")
+            return True
+        self.queue.complete(job.id, record)
+        with self._lock:
+            self.jobs_done += 1
+        self.log(f"{job.name}: duplicate of {record[DUPLICATE_OF_FIELD]}" if is_duplicate(record) else f"{job.name}: done")
+        return True
+
+    def _loop(self, thread_id: str):
+        while not self.stop.is_set():
+            try:
+                worked = self.run_once(thread_id)
+            except Exception as e:
+                self.log(f"Queue error: {e}")
+                worked = False
+            if not worked:
+                self.stop.wait(POLL_INTERVAL)
+
+    # Run threads workers until stop is set, checking in with the queue while idle
+    def run(self, threads: int = DEFAULT_THREADS):
+        workers = [threading.Thread(target=self._loop, args=(f"{self.id}/{i}",), daemon=True) for i in range(max(1, threads))]
+        for thread in workers:
+            thread.start()
+        try:
+            while not self.stop.is_set():
+                self.queue.heartbeat(self.id, self.jobs_done, self.key_id)
+                self.stop.wait(POLL_INTERVAL * 5)
+        finally:
+            for thread in workers:
+                thread.join()
+            self.queue.remove_worker(self.id)
+
+# Command line entry point. Start as many workers as needed, on one machine or
+# several sharing the files; they all drain the same queue:
+#   GEMINI_API_KEY=... python worker.py --threads 4
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Process queued notices from the job queue.")
+    parser.add_argument("--jobs", default=str(DEFAULT_JOBS_PATH), help="SQLite job queue")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite property store to write to")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY"),
+                        help="Gemini API key (default: $GEMINI_API_KEY or $GOOGLE_API_KEY)")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="Notices processed at once")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse or store cached pipeline results")
+    parser.add_argument("--dedup", default=str(DEFAULT_DEDUP_PATH), help="SQLite fingerprints of notices already processed")
+    parser.add_argument("--watchlist", default=str(DEFAULT_WATCHLIST_PATH), help="SQLite watchlist to raise alerts in")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("a Gemini API key is required (--api-key or $GEMINI_API_KEY)")
+
+    from google import genai
+    from gemini_client import RateLimitedClient
+
+    queue = JobQueue(args.jobs)
+    store = PropertyStore(args.db)
+    cache = None if args.no_cache else ResultCache()
+    dedup = DuplicateIndex(args.dedup, exists=store.__contains__)
+    watchlist = Watchlist(args.watchlist)
+    executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    worker = Worker(queue, store, RateLimitedClient(genai.Client(api_key=args.api_key)), cache, executor,
+                    dedup=dedup, watchlist=watchlist, key_id=api_key_id(args.api_key))
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop.set())
+
+    print(f"Worker {worker.id} processing {args.jobs} with {args.threads} threads", flush=True)
+    try:
+        worker.run(args.threads)
+    finally:
+        executor.shutdown()
+        if cache is not None:
+            cache.close()
+        dedup.close()
+        watchlist.close()
+        store.close()
+        queue.close()
+    print(f"Worker {worker.id} stopped after {worker.jobs_done} jobs", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())